@@ -0,0 +1,110 @@
+"""
+Arranque en caliente: instantánea en disco de las estructuras en memoria
+
+Cada worker arma desde SQLite, al arrancar o en sus primeras peticiones, el
+calendario de tarifas (matriz de sumas prefijas), el resumen de habitaciones
+por tipo y el filtro de Bloom de revocaciones. En un despliegue escalonado
+todos los workers nuevos lo hacen a la vez. Para evitarlo, el worker que se
+cierra guarda esas estructuras en un directorio y el siguiente las retoma:
+
+- Cada arreglo va en su propio `.npy`, que se abre con `np.load(mmap_mode=...)`:
+  no se lee ni se copia al arrancar, y los workers de la misma máquina
+  comparten sus páginas a través de la caché del sistema operativo. Los de
+  sólo lectura se abren en modo "r"; los que siguen cambiando (el filtro de
+  revocaciones) en modo "c", copia al escribir: sólo las páginas que el
+  worker modifica dejan de estar compartidas.
+- `manifiesto.json` describe la generación: versión del formato, los datos
+  pequeños y las marcas de agua que permiten decidir qué sigue vigente. Se
+  escribe al final y por reemplazo atómico; los arreglos llevan la
+  generación en el nombre, así que nunca se ve una instantánea a medias y
+  un worker que todavía tiene mapeada la anterior no se ve afectado.
+
+Qué partes se retoman y cómo se ponen al día lo decide quien llama (ver
+`retomar_estado_en_memoria` en hotel_booking_system.py); este módulo sólo
+guarda y abre.
+"""
+import glob
+import json
+import os
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+VERSION_FORMATO = 1
+MANIFIESTO = "manifiesto.json"
+
+def _generacion_actual(directorio: str) -> int:
+    try:
+        with open(os.path.join(directorio, MANIFIESTO), "r", encoding="utf-8") as f:
+            return int(json.load(f).get("generacion", 0))
+    except (OSError, ValueError):
+        return 0
+
+def guardar_estado(directorio: str, datos: dict, arreglos: Dict[str, np.ndarray]) -> int:
+    """
+    Escribir una generación nueva de la instantánea
+
+    Quien llama debe impedir que dos procesos guarden a la vez (por ejemplo
+    con un bloqueo de archivo).
+
+    Args:
+        datos: Datos pequeños, serializables en JSON
+        arreglos: Arreglos de numpy por nombre (cada uno a su `.npy`)
+
+    Returns:
+        Número de la generación escrita
+    """
+    os.makedirs(directorio, exist_ok=True)
+    generacion = _generacion_actual(directorio) + 1
+    archivos = {}
+    for nombre, arreglo in arreglos.items():
+        archivo = f"{nombre}-{generacion}.npy"
+        temporal = os.path.join(directorio, archivo + ".tmp")
+        with open(temporal, "wb") as f:
+            np.save(f, np.ascontiguousarray(arreglo), allow_pickle=False)
+        os.replace(temporal, os.path.join(directorio, archivo))
+        archivos[nombre] = archivo
+
+    manifiesto = {"version_formato": VERSION_FORMATO, "generacion": generacion, "arreglos": archivos, **datos}
+    temporal = os.path.join(directorio, MANIFIESTO + ".tmp")
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, os.path.join(directorio, MANIFIESTO))
+
+    # Generaciones anteriores: en POSIX borrar un archivo mapeado no afecta a quien lo usa
+    vigentes = set(archivos.values())
+    for ruta in glob.glob(os.path.join(directorio, "*.npy")):
+        if os.path.basename(ruta) not in vigentes:
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+    return generacion
+
+def abrir_estado(directorio: str,
+                 copia_al_escribir: Iterable[str] = ()) -> Optional[Tuple[dict, Dict[str, np.ndarray]]]:
+    """
+    Abrir la última generación: (manifiesto, arreglos mapeados en memoria)
+
+    Los arreglos de `copia_al_escribir` se abren en modo "c" y el resto en
+    modo "r" (de sólo lectura).
+
+    Returns:
+        None si no hay instantánea, es de otra versión del formato o está dañada
+    """
+    try:
+        with open(os.path.join(directorio, MANIFIESTO), "r", encoding="utf-8") as f:
+            manifiesto = json.load(f)
+        if manifiesto.get("version_formato") != VERSION_FORMATO:
+            return None
+        copia_al_escribir = set(copia_al_escribir)
+        arreglos = {
+            nombre: np.load(os.path.join(directorio, archivo), allow_pickle=False,
+                            mmap_mode="c" if nombre in copia_al_escribir else "r")
+            for nombre, archivo in manifiesto["arreglos"].items()
+        }
+    except (OSError, ValueError, KeyError):
+        return None
+    return manifiesto, arreglos
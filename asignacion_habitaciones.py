@@ -0,0 +1,301 @@
+"""
+Optimizador nocturno de asignación de habitaciones
+
+Las reservas por tipo (o las que llegan en orden aleatorio) dejan huecos de
+una noche entre estancias que nadie puede comprar. Este proceso reasigna
+`habitacion_id` dentro de cada tipo para las estancias del horizonte:
+
+- Barrido por fecha de entrada (partición de intervalos / coloreado de un
+  grafo de intervalos): cada estancia va a una habitación ya libre ese día,
+  así que nunca se crean solapamientos
+- Entre las candidatas se prefiere, en este orden: no dejar huecos cortos
+  (menos de `--hueco-minimo` noches) antes o después, no mover al huésped
+  y el ajuste más apretado (la habitación que quedó libre más tarde)
+- Se respeta la capacidad de cada habitación
+- Las estancias ya empezadas y las que entran después del horizonte quedan
+  fijas en su habitación
+
+Cada paso evalúa todas las habitaciones del tipo con numpy, así que decenas
+de miles de estancias se reasignan en segundos.
+
+Uso:
+    python asignacion_habitaciones.py --db hotel_booking.db --dias 90 --salida reasignaciones.csv
+    python asignacion_habitaciones.py --db hotel_booking.db --salida reasignaciones.json --aplicar
+"""
+import argparse
+import csv
+import json
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+from typing import Dict, List
+
+import numpy as np
+
+import hotel_booking_system
+from fechas import a_dia, texto_dia
+
+# Un hueco de menos noches que esto entre dos estancias no se puede vender
+HUECO_MINIMO = 2
+# Reintentos si otra escritura cambia las reservas mientras se calcula
+REINTENTOS = 3
+
+SIN_LIMITE = 2 ** 40
+
+# ==================== CARGA ====================
+
+def cargar_habitaciones(cursor) -> Dict[str, np.ndarray]:
+    cursor.execute("SELECT id, numero, tipo, capacidad, disponible FROM habitaciones ORDER BY id")
+    filas = cursor.fetchall()
+    ids, numeros, tipos, capacidades, habilitadas = zip(*filas) if filas else ((),) * 5
+    return {
+        "id": np.array(ids, dtype=np.int64),
+        "numero": np.array(numeros, dtype=object),
+        "tipo": np.array(tipos, dtype=object),
+        "capacidad": np.array(capacidades, dtype=np.int64),
+        "habilitada": np.array(habilitadas, dtype=bool),
+    }
+
+def cargar_estancias(cursor, desde: date) -> Dict[str, np.ndarray]:
+    """Reservas activas que terminan después de `desde` (fechas como número de día)"""
+    # El R*Tree sólo contiene reservas activas y acota fecha_fin sin recorrer el histórico
+    cursor.execute("""
+        SELECT r.id, r.habitacion_id, r.huespedes, r.fecha_inicio, r.fecha_fin
+        FROM reservas_intervalos ri
+        JOIN reservas r ON r.id = ri.id
+        WHERE ri.fecha_fin > ?
+        ORDER BY r.id
+    """, (a_dia(desde),))
+    filas = cursor.fetchall()
+    ids, habitaciones, huespedes, inicios, fines = zip(*filas) if filas else ((),) * 5
+    return {
+        "id": np.array(ids, dtype=np.int64),
+        "habitacion_id": np.array(habitaciones, dtype=np.int64),
+        "huespedes": np.array(huespedes, dtype=np.int64),
+        "inicio": np.array(inicios, dtype=np.int64),
+        "fin": np.array(fines, dtype=np.int64),
+    }
+
+# ==================== ASIGNACIÓN ====================
+
+def asignar_tipo(inicio: np.ndarray, fin: np.ndarray, huespedes: np.ndarray, actual: np.ndarray,
+                 fija: np.ndarray, capacidad: np.ndarray, habilitada: np.ndarray,
+                 hueco_minimo: int = HUECO_MINIMO):
+    """
+    Reasignar las estancias de un tipo
+
+    Las habitaciones se indican por su posición (0..R-1) dentro del tipo.
+
+    Returns:
+        (nueva habitación de cada estancia, máscara de estancias que no
+        cupieron en ninguna habitación)
+    """
+    total_habitaciones = len(capacidad)
+    posiciones = np.arange(total_habitaciones)
+    nueva = actual.copy()
+    sin_asignar = np.zeros(len(inicio), dtype=bool)
+
+    # Entradas fijas pendientes de cada habitación, en orden: una estancia movible
+    # sólo cabe si termina antes de la siguiente fija de esa habitación
+    fijas_por_habitacion: List[List[int]] = [[] for _ in range(total_habitaciones)]
+    for i in np.flatnonzero(fija)[np.argsort(inicio[fija], kind="stable")]:
+        fijas_por_habitacion[actual[i]].append(int(inicio[i]))
+    siguiente_fija = np.array([f[0] if f else SIN_LIMITE for f in fijas_por_habitacion], dtype=np.int64)
+    punteros = [0] * total_habitaciones
+
+    libre_desde = np.full(total_habitaciones, -SIN_LIMITE, dtype=np.int64)
+
+    # Por entrada; a igual entrada, primero las fijas, luego más huéspedes y más noches
+    orden = np.lexsort((inicio - fin, -huespedes, ~fija, inicio))
+    for i in orden.tolist():
+        entrada, salida = inicio[i], fin[i]
+        if fija[i]:
+            h = actual[i]
+            libre_desde[h] = max(libre_desde[h], salida)
+            punteros[h] += 1
+            pendientes = fijas_por_habitacion[h]
+            siguiente_fija[h] = pendientes[punteros[h]] if punteros[h] < len(pendientes) else SIN_LIMITE
+            continue
+
+        candidatas = ((libre_desde <= entrada) & (siguiente_fija >= salida)
+                      & (capacidad >= huespedes[i]) & habilitada)
+        if not candidatas.any():
+            sin_asignar[i] = True
+            continue
+
+        antes = entrada - libre_desde
+        despues = siguiente_fija - salida
+        huecos_cortos = (((antes > 0) & (antes < hueco_minimo)).astype(np.int64)
+                         + ((despues > 0) & (despues < hueco_minimo)))
+        puntaje = (huecos_cortos << 44) + ((posiciones != actual[i]).astype(np.int64) << 42) \
+            + np.minimum(antes, SIN_LIMITE)
+        puntaje[~candidatas] = np.iinfo(np.int64).max
+        h = int(np.argmin(puntaje))
+        nueva[i] = h
+        libre_desde[h] = salida
+
+    return nueva, sin_asignar
+
+def medir_huecos(habitacion: np.ndarray, inicio: np.ndarray, fin: np.ndarray,
+                 desde: int, hasta: int, hueco_minimo: int = HUECO_MINIMO) -> Dict[str, int]:
+    """Huecos cortos entre estancias consecutivas de una misma habitación dentro del horizonte"""
+    orden = np.lexsort((inicio, habitacion))
+    habitacion, inicio, fin = habitacion[orden], inicio[orden], fin[orden]
+    misma = habitacion[1:] == habitacion[:-1]
+    huecos = inicio[1:] - fin[:-1]
+    cortos = misma & (huecos > 0) & (huecos < hueco_minimo) & (fin[:-1] >= desde) & (fin[:-1] < hasta)
+    en_horizonte = (inicio < hasta) & (fin > desde)
+    return {
+        "huecos_cortos": int(cortos.sum()),
+        "noches_en_huecos_cortos": int(huecos[cortos].sum()),
+        "habitaciones_ocupadas": int(len(np.unique(habitacion[en_horizonte]))),
+    }
+
+def optimizar(cursor, desde: date, dias: int, hueco_minimo: int = HUECO_MINIMO) -> dict:
+    """
+    Calcular la nueva asignación de las estancias que entran en [desde, desde + dias)
+
+    Returns:
+        Diccionario con las reasignaciones (`cambios`), las estancias que no
+        cupieron (`sin_asignar`; su tipo se deja sin cambios) y las métricas
+        antes y después
+    """
+    habitaciones = cargar_habitaciones(cursor)
+    estancias = cargar_estancias(cursor, desde)
+    primer_dia = a_dia(desde)
+    ultimo_dia = primer_dia + dias
+
+    # Las habitaciones se cargan ordenadas por id: la posición sale de una búsqueda binaria
+    actual_global = np.searchsorted(habitaciones["id"], estancias["habitacion_id"])
+    nueva_global = actual_global.copy()
+    sin_asignar = np.zeros(len(actual_global), dtype=bool)
+    fija = (estancias["inicio"] < primer_dia) | (estancias["inicio"] >= ultimo_dia)
+
+    tipo_estancia = habitaciones["tipo"][actual_global] if len(actual_global) else np.zeros(0, dtype=object)
+    for tipo in np.unique(habitaciones["tipo"]):
+        habitaciones_tipo = np.flatnonzero(habitaciones["tipo"] == tipo)
+        estancias_tipo = np.flatnonzero(tipo_estancia == tipo)
+        if not len(estancias_tipo):
+            continue
+        local = np.searchsorted(habitaciones_tipo, actual_global[estancias_tipo])
+        nueva_local, sin_asignar_tipo = asignar_tipo(
+            estancias["inicio"][estancias_tipo], estancias["fin"][estancias_tipo],
+            estancias["huespedes"][estancias_tipo], local, fija[estancias_tipo],
+            habitaciones["capacidad"][habitaciones_tipo], habitaciones["habilitada"][habitaciones_tipo],
+            hueco_minimo
+        )
+        if sin_asignar_tipo.any():
+            # Capacidades o estancias fijas impiden recolocar todo: el tipo se deja como está
+            sin_asignar[estancias_tipo] = sin_asignar_tipo
+            continue
+        nueva_global[estancias_tipo] = habitaciones_tipo[nueva_local]
+
+    movidas = np.flatnonzero(nueva_global != actual_global)
+    cambios = [
+        {
+            "reserva_id": int(estancias["id"][i]),
+            "tipo": habitaciones["tipo"][actual_global[i]],
+            "fecha_inicio": texto_dia(int(estancias["inicio"][i])),
+            "fecha_fin": texto_dia(int(estancias["fin"][i])),
+            "habitacion_anterior": int(habitaciones["id"][actual_global[i]]),
+            "numero_anterior": habitaciones["numero"][actual_global[i]],
+            "habitacion_nueva": int(habitaciones["id"][nueva_global[i]]),
+            "numero_nuevo": habitaciones["numero"][nueva_global[i]],
+        }
+        for i in movidas.tolist()
+    ]
+    return {
+        "estancias": int((~fija).sum()),
+        "cambios": cambios,
+        "sin_asignar": estancias["id"][sin_asignar].tolist(),
+        "antes": medir_huecos(actual_global, estancias["inicio"], estancias["fin"], primer_dia, ultimo_dia, hueco_minimo),
+        "despues": medir_huecos(nueva_global, estancias["inicio"], estancias["fin"], primer_dia, ultimo_dia, hueco_minimo),
+    }
+
+def optimizar_y_aplicar(conn: sqlite3.Connection, desde: date, dias: int, hueco_minimo: int = HUECO_MINIMO,
+                        aplicar: bool = False) -> dict:
+    """
+    Calcular sobre una instantánea de lectura y, si se pide, aplicar los cambios
+
+    El cálculo se hace fuera de la transacción de escritura para no bloquear
+    a la API. Antes de escribir se compara `version_datos`: si otra escritura
+    cambió las reservas entretanto, se vuelve a calcular.
+    """
+    cursor = conn.cursor()
+    for _ in range(REINTENTOS):
+        cursor.execute("BEGIN")
+        version = hotel_booking_system.leer_version_datos(cursor)
+        resultado = optimizar(cursor, desde, dias, hueco_minimo)
+        cursor.execute("COMMIT")
+        if not aplicar or not resultado["cambios"]:
+            return resultado
+
+        cursor.execute("BEGIN IMMEDIATE")
+        if hotel_booking_system.leer_version_datos(cursor) != version:
+            cursor.execute("ROLLBACK")
+            continue
+        cursor.executemany(
+            "UPDATE reservas SET habitacion_id = ? WHERE id = ?",
+            [(c["habitacion_nueva"], c["reserva_id"]) for c in resultado["cambios"]]
+        )
+        cursor.execute("COMMIT")
+        return resultado
+    raise RuntimeError("Las reservas cambiaron durante el cálculo; vuelve a intentarlo")
+
+# ==================== SALIDA ====================
+
+COLUMNAS_CAMBIOS = ["reserva_id", "tipo", "fecha_inicio", "fecha_fin",
+                    "habitacion_anterior", "numero_anterior", "habitacion_nueva", "numero_nuevo"]
+
+def escribir_cambios(resultado: dict, salida: str):
+    if salida.endswith(".json"):
+        with open(salida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+    else:
+        with open(salida, "w", newline="", encoding="utf-8") as f:
+            escritor = csv.DictWriter(f, fieldnames=COLUMNAS_CAMBIOS)
+            escritor.writeheader()
+            escritor.writerows(resultado["cambios"])
+
+# ==================== CLI ====================
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Reasignar habitaciones para minimizar huecos cortos")
+    parser.add_argument("--db", default="hotel_booking.db")
+    parser.add_argument("--desde", type=date.fromisoformat, default=None,
+                        help="Primer día del horizonte (por defecto, hoy)")
+    parser.add_argument("--dias", type=int, default=90, help="Días del horizonte")
+    parser.add_argument("--hueco-minimo", type=int, default=HUECO_MINIMO,
+                        help="Noches mínimas para que un hueco sea vendible")
+    parser.add_argument("--salida", default="reasignaciones.csv",
+                        help="Archivo de cambios (.csv o .json)")
+    parser.add_argument("--aplicar", action="store_true", help="Escribir la nueva asignación en la base de datos")
+    args = parser.parse_args(argv)
+
+    desde = args.desde or date.today()
+    conn = sqlite3.connect(args.db, isolation_level=None, timeout=hotel_booking_system.BUSY_TIMEOUT_SEGUNDOS)
+    try:
+        inicio = time.perf_counter()
+        resultado = optimizar_y_aplicar(conn, desde, args.dias, args.hueco_minimo, args.aplicar)
+    except (sqlite3.OperationalError, RuntimeError) as e:
+        print(f"❌ {e}")
+        return 1
+    finally:
+        conn.close()
+    duracion = time.perf_counter() - inicio
+
+    escribir_cambios(resultado, args.salida)
+    antes, despues = resultado["antes"], resultado["despues"]
+    print(f"🛏️  {resultado['estancias']} estancias entre {desde} y {desde + timedelta(days=args.dias)} ({duracion:.2f}s)")
+    print(f"   Huecos cortos:        {antes['huecos_cortos']} → {despues['huecos_cortos']}")
+    print(f"   Noches en huecos:     {antes['noches_en_huecos_cortos']} → {despues['noches_en_huecos_cortos']}")
+    print(f"   Habitaciones usadas:  {antes['habitaciones_ocupadas']} → {despues['habitaciones_ocupadas']}")
+    print(f"   Reasignaciones:       {len(resultado['cambios'])}")
+    if resultado["sin_asignar"]:
+        print(f"⚠️  {len(resultado['sin_asignar'])} estancias no cupieron: sus tipos se dejan sin cambios")
+    print(f"{'✅ Aplicado' if args.aplicar else '💾 Sin aplicar'}: cambios en {args.salida}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
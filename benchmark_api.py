@@ -0,0 +1,415 @@
+"""
+Suite de benchmarks en proceso para la API del Sistema de Reservas de Hotel
+
+Ejecuta `hotel_booking_system.app` directamente a través de un transporte ASGI
+(httpx.ASGITransport): sin sockets y sin uvicorn, de modo que lo que se mide es
+el costo del propio núcleo de reservas.
+
+Uso:
+    python benchmark_api.py ejecutar --datasets xs s --salida bench.json
+    python benchmark_api.py ejecutar --salida nuevo.json --comparar bench.json --umbral 0.15
+    python benchmark_api.py comparar bench.json nuevo.json --umbral 0.15
+    python benchmark_api.py ejecutar --datasets s --formatos json msgpack
+
+Con `--formatos json msgpack` /buscar y /mis-reservas se miden también en
+MessagePack (negociacion.py): el informe compara bytes y CPU por petición,
+codificación del servidor y decodificación del cliente incluidas.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import time
+from contextlib import closing
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+import httpx
+
+import generador_datos
+import hotel_booking_system
+from negociacion import TIPO_MSGPACK, msgpack
+
+# ==================== CONFIGURACIÓN ====================
+
+DATASETS = {
+    "xs": {"habitaciones": 10, "reservas": 100},
+    "s": {"habitaciones": 100, "reservas": 10_000},
+    "m": {"habitaciones": 1_000, "reservas": 100_000},
+    "l": {"habitaciones": 10_000, "reservas": 1_000_000},
+}
+
+ENDPOINTS = ["/login", "/buscar", "/reservar", "/pagar", "/mis-reservas"]
+
+# Formatos de respuesta medidos y endpoints de lectura que se repiten en cada formato extra
+FORMATOS = ["json", "msgpack"]
+ENDPOINTS_NEGOCIADOS = ["/buscar", "/mis-reservas"]
+
+# Métricas que se comparan contra la línea base (mayor = peor)
+METRICAS_COMPARADAS = ["p50_ms", "p95_ms"]
+
+# Primer usuario generado por generador_datos
+EMAIL_BENCHMARK = "usuario1@hotel.com"
+PASSWORD_BENCHMARK = generador_datos.PASSWORD_USUARIOS
+RESERVAS_POR_USUARIO = 20
+
+# ==================== DATASETS ====================
+
+def ruta_dataset(directorio: str, nombre: str) -> str:
+    config = DATASETS[nombre]
+    return os.path.join(directorio, f"bench_{config['habitaciones']}h_{config['reservas']}r.db")
+
+def preparar_dataset(nombre: str, directorio: str, reconstruir: bool = False) -> str:
+    """Construir (o reutilizar) la base de datos del dataset y devolver una copia de trabajo"""
+    os.makedirs(directorio, exist_ok=True)
+    ruta = ruta_dataset(directorio, nombre)
+
+    if reconstruir and os.path.exists(ruta):
+        os.remove(ruta)
+
+    if not os.path.exists(ruta):
+        config = DATASETS[nombre]
+        print(f"🏗️  Construyendo dataset '{nombre}' ({config['habitaciones']} habitaciones, "
+              f"{config['reservas']} reservas)...")
+        tiempos = generador_datos.generar_base_datos(
+            ruta, config["habitaciones"], max(1, config["reservas"] // RESERVAS_POR_USUARIO), 0,
+            config["reservas"], verbose=False
+        )
+        print(f"   Listo en {tiempos['total']:.1f}s")
+
+    # El benchmark escribe (login, reservar, pagar): se trabaja sobre una copia
+    copia = ruta.replace(".db", ".trabajo.db")
+    eliminar_base_datos(copia)
+    shutil.copyfile(ruta, copia)
+    return copia
+
+def eliminar_base_datos(ruta: str):
+    """Borrar la base de datos junto con sus archivos WAL, memoria compartida, bloqueo e instantánea de arranque"""
+    for sufijo in ("", "-wal", "-shm", ".lock", ".arranque.lock"):
+        if os.path.exists(ruta + sufijo):
+            os.remove(ruta + sufijo)
+    shutil.rmtree(ruta + ".arranque", ignore_errors=True)
+
+# ==================== MEDICIÓN ====================
+
+def resumir_latencias(latencias: List[float], errores: int, duracion: float) -> Dict:
+    ordenadas = sorted(latencias)
+
+    def percentil(p: float) -> float:
+        if not ordenadas:
+            return 0.0
+        indice = min(len(ordenadas) - 1, int(round(p / 100 * (len(ordenadas) - 1))))
+        return ordenadas[indice]
+
+    return {
+        "n": len(latencias),
+        "errores": errores,
+        "media_ms": round(statistics.fmean(latencias), 4) if latencias else 0.0,
+        "p50_ms": round(percentil(50), 4),
+        "p95_ms": round(percentil(95), 4),
+        "p99_ms": round(percentil(99), 4),
+        "max_ms": round(ordenadas[-1], 4) if ordenadas else 0.0,
+        "rps": round(len(latencias) / duracion, 2) if duracion > 0 else 0.0,
+    }
+
+def decodificar(respuesta: httpx.Response):
+    """Cuerpo de la respuesta, en JSON o en MessagePack según su Content-Type"""
+    if respuesta.headers.get("content-type", "").startswith(TIPO_MSGPACK):
+        return msgpack.unpackb(respuesta.content)
+    return respuesta.json()
+
+async def medir(nombre: str, peticiones, iteraciones: int, calentamiento: int, concurrencia: int = 1) -> Dict:
+    """
+    Ejecutar `peticiones(i)` y medir la latencia de cada llamada
+
+    Además de la latencia se registran los bytes medios del cuerpo y el
+    tiempo de CPU del proceso por petición (servidor y cliente, que
+    decodifica cada respuesta fuera de la latencia medida).
+
+    Args:
+        peticiones: Función asíncrona que recibe el índice y devuelve la respuesta httpx
+        concurrencia: Número de clientes simultáneos que se reparten las iteraciones
+    """
+    for i in range(calentamiento):
+        await peticiones(i)
+
+    latencias = []
+    errores = 0
+    total_bytes = 0
+    indices = iter(range(calentamiento, calentamiento + iteraciones))
+
+    async def cliente():
+        nonlocal errores, total_bytes
+        for i in indices:
+            inicio = time.perf_counter()
+            respuesta = await peticiones(i)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            total_bytes += len(respuesta.content)
+            if respuesta.status_code >= 300:
+                errores += 1
+            else:
+                decodificar(respuesta)
+
+    inicio_total = time.perf_counter()
+    inicio_cpu = time.process_time()
+    await asyncio.gather(*(cliente() for _ in range(concurrencia)))
+    cpu = time.process_time() - inicio_cpu
+    duracion = time.perf_counter() - inicio_total
+
+    resumen = resumir_latencias(latencias, errores, duracion)
+    resumen["bytes_media"] = round(total_bytes / len(latencias), 1) if latencias else 0.0
+    resumen["cpu_ms"] = round(cpu * 1000 / len(latencias), 4) if latencias else 0.0
+    print(f"   {nombre:<22} p50={resumen['p50_ms']:>8.3f}ms  p95={resumen['p95_ms']:>8.3f}ms  "
+          f"rps={resumen['rps']:>9.1f}  cpu={resumen['cpu_ms']:>7.3f}ms  bytes={resumen['bytes_media']:>9.0f}  "
+          f"errores={errores}")
+    return resumen
+
+async def ejecutar_dataset(nombre: str, ruta: str, iteraciones: int, calentamiento: int,
+                           concurrencia: int = 1, semilla: int = 7, formatos: List[str] = ("json",)) -> Dict:
+    """Medir todos los endpoints sobre la base de datos indicada"""
+    app = hotel_booking_system.app
+    hotel_booking_system.DATABASE = ruta
+
+    with closing(sqlite3.connect(ruta)) as conn:
+        total_habitaciones = conn.execute("SELECT COUNT(*) FROM habitaciones").fetchone()[0]
+        ids_habitaciones = [f[0] for f in conn.execute("SELECT id FROM habitaciones WHERE capacidad >= 1 ORDER BY id")]
+
+    resultados = {}
+    transporte = httpx.ASGITransport(app=app)
+    # El lifespan de la app: migraciones, tareas de fondo y calentamiento
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transporte, base_url="http://benchmark") as cliente:
+            # Medir el worker ya calentado, como lo vería el balanceador
+            while (await cliente.get("/readyz")).status_code != 200:
+                await asyncio.sleep(0.05)
+
+            credenciales = {"email": EMAIL_BENCHMARK, "password": PASSWORD_BENCHMARK}
+
+            async def login(i):
+                return await cliente.post("/login", json=credenciales)
+
+            resultados["/login"] = await medir("/login", login, iteraciones, calentamiento, concurrencia)
+
+            token = (await login(0)).json()["token"]
+            headers = {"Authorization": f"Bearer {token}"}
+
+            tipos = [None, "simple", "doble", "suite"]
+
+            def busqueda(formato: str):
+                # Misma semilla en cada formato: se repiten exactamente las mismas búsquedas
+                rng = random.Random(semilla)
+
+                async def buscar(i):
+                    inicio = date.today() + timedelta(days=rng.randint(1, 180))
+                    cuerpo = {
+                        "fecha_inicio": str(inicio),
+                        "fecha_fin": str(inicio + timedelta(days=rng.randint(1, 7))),
+                        "tipo_habitacion": rng.choice(tipos),
+                        "huespedes": 1,
+                    }
+                    if formato == "msgpack":
+                        return await cliente.post("/buscar", content=msgpack.packb(cuerpo), headers={
+                            "Content-Type": TIPO_MSGPACK, "Accept": TIPO_MSGPACK
+                        })
+                    return await cliente.post("/buscar", json=cuerpo)
+
+                return buscar
+
+            resultados["/buscar"] = await medir("/buscar", busqueda("json"), iteraciones, calentamiento, concurrencia)
+
+            # Ventanas lejanas y disjuntas: cada reserva del benchmark es válida
+            base_reservas = date.today() + timedelta(days=3 * 365)
+            reservas_creadas = []
+
+            async def reservar(i):
+                inicio = base_reservas + timedelta(days=(i // len(ids_habitaciones)) * 3)
+                respuesta = await cliente.post("/reservar", headers=headers, json={
+                    "habitacion_id": ids_habitaciones[i % len(ids_habitaciones)],
+                    "fecha_inicio": str(inicio),
+                    "fecha_fin": str(inicio + timedelta(days=2)),
+                    "huespedes": 1,
+                })
+                if respuesta.status_code == 200:
+                    reservas_creadas.append(respuesta.json()["reserva_id"])
+                return respuesta
+
+            resultados["/reservar"] = await medir("/reservar", reservar, iteraciones, calentamiento, concurrencia)
+
+            async def pagar(i):
+                return await cliente.post("/pagar", headers=headers, json={
+                    "reserva_id": reservas_creadas[i % len(reservas_creadas)],
+                    "metodo_pago": "tarjeta_credito",
+                    "numero_tarjeta": "4532123456789012",
+                    "cvv": "123",
+                    "nombre_titular": "Usuario Benchmark",
+                })
+
+            resultados["/pagar"] = await medir("/pagar", pagar, iteraciones, calentamiento, concurrencia)
+
+            async def mis_reservas(i):
+                return await cliente.get("/mis-reservas", headers=headers)
+
+            resultados["/mis-reservas"] = await medir("/mis-reservas", mis_reservas, iteraciones, calentamiento, concurrencia)
+
+            # Las lecturas en los demás formatos, sobre el mismo estado de la base de datos
+            for formato in formatos:
+                if formato == "json":
+                    continue
+
+                async def mis_reservas_msgpack(i):
+                    return await cliente.get("/mis-reservas", headers={**headers, "Accept": TIPO_MSGPACK})
+
+                peticiones = {"/buscar": busqueda(formato), "/mis-reservas": mis_reservas_msgpack}
+                for endpoint in ENDPOINTS_NEGOCIADOS:
+                    etiqueta = f"{endpoint} [{formato}]"
+                    resultados[etiqueta] = await medir(etiqueta, peticiones[endpoint], iteraciones, calentamiento,
+                                                       concurrencia)
+
+    return {
+        "habitaciones": total_habitaciones,
+        "reservas": DATASETS[nombre]["reservas"],
+        "endpoints": resultados,
+    }
+
+# ==================== COMPARACIÓN ====================
+
+def reportar_formatos(resultados: Dict):
+    """Bytes y CPU por petición de cada formato frente a JSON"""
+    for dataset, datos in resultados.items():
+        for etiqueta, metricas in datos["endpoints"].items():
+            endpoint, _, formato = etiqueta.partition(" [")
+            json_base = datos["endpoints"].get(endpoint)
+            if not formato or not json_base:
+                continue
+            ahorro_bytes = 1 - metricas["bytes_media"] / json_base["bytes_media"] if json_base["bytes_media"] else 0.0
+            ahorro_cpu = 1 - metricas["cpu_ms"] / json_base["cpu_ms"] if json_base["cpu_ms"] else 0.0
+            print(f"   {dataset} {endpoint:<14} {formato.rstrip(']'):<8} bytes {ahorro_bytes * 100:+6.1f}% menos  "
+                  f"cpu {ahorro_cpu * 100:+6.1f}% menos  (p50 {json_base['p50_ms']:.3f} → {metricas['p50_ms']:.3f} ms)")
+
+def comparar_resultados(base: Dict, actual: Dict, umbral: float) -> List[str]:
+    """
+    Comparar dos ejecuciones y devolver las regresiones encontradas
+
+    Una métrica regresa cuando actual > base × (1 + umbral). Sólo se comparan
+    datasets y endpoints presentes en ambas ejecuciones.
+    """
+    regresiones = []
+    for dataset, datos_base in base.get("resultados", {}).items():
+        datos_actual = actual.get("resultados", {}).get(dataset)
+        if not datos_actual:
+            continue
+        for endpoint, metricas_base in datos_base["endpoints"].items():
+            metricas_actual = datos_actual["endpoints"].get(endpoint)
+            if not metricas_actual:
+                continue
+            for metrica in METRICAS_COMPARADAS:
+                valor_base = metricas_base.get(metrica, 0.0)
+                valor_actual = metricas_actual.get(metrica, 0.0)
+                if valor_base > 0 and valor_actual > valor_base * (1 + umbral):
+                    regresiones.append(
+                        f"{dataset} {endpoint} {metrica}: {valor_base:.3f} → {valor_actual:.3f} "
+                        f"(+{(valor_actual / valor_base - 1) * 100:.1f}%)"
+                    )
+            if metricas_actual.get("errores", 0) > metricas_base.get("errores", 0):
+                regresiones.append(
+                    f"{dataset} {endpoint} errores: {metricas_base.get('errores', 0)} → {metricas_actual['errores']}"
+                )
+    return regresiones
+
+def reportar_comparacion(base: Dict, actual: Dict, umbral: float) -> int:
+    regresiones = comparar_resultados(base, actual, umbral)
+    if regresiones:
+        print(f"\n❌ {len(regresiones)} regresiones por encima del {umbral * 100:.0f}%:")
+        for regresion in regresiones:
+            print(f"   • {regresion}")
+        return 1
+    print(f"\n✅ Sin regresiones por encima del {umbral * 100:.0f}%")
+    return 0
+
+# ==================== CLI ====================
+
+def ejecutar(args) -> int:
+    resultados = {}
+    for nombre in args.datasets:
+        ruta = preparar_dataset(nombre, args.directorio_datos, args.reconstruir)
+        print(f"\n📊 Dataset '{nombre}'")
+        try:
+            resultados[nombre] = asyncio.run(
+                ejecutar_dataset(nombre, ruta, args.iteraciones, args.calentamiento, args.concurrencia,
+                                 formatos=args.formatos)
+            )
+        finally:
+            eliminar_base_datos(ruta)
+
+    salida = {
+        "version": 1,
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "entorno": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "plataforma": platform.platform(),
+        },
+        "parametros": {
+            "iteraciones": args.iteraciones,
+            "calentamiento": args.calentamiento,
+            "concurrencia": args.concurrencia,
+            "formatos": args.formatos,
+        },
+        "resultados": resultados,
+    }
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(salida, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Resultados guardados en {args.salida}")
+    if len(args.formatos) > 1:
+        print("\n📦 Formatos frente a JSON")
+        reportar_formatos(resultados)
+
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            return reportar_comparacion(json.load(f), salida, args.umbral)
+    return 0
+
+def comparar(args) -> int:
+    with open(args.base, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.actual, "r", encoding="utf-8") as f:
+        actual = json.load(f)
+    return reportar_comparacion(base, actual, args.umbral)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark en proceso de la API de reservas")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    p_ejecutar = subparsers.add_parser("ejecutar", help="Medir los endpoints y guardar resultados en JSON")
+    p_ejecutar.add_argument("--datasets", nargs="+", choices=list(DATASETS), default=["xs", "s"])
+    p_ejecutar.add_argument("--iteraciones", type=int, default=200)
+    p_ejecutar.add_argument("--calentamiento", type=int, default=20)
+    p_ejecutar.add_argument("--concurrencia", type=int, default=1, help="Clientes simultáneos por endpoint")
+    p_ejecutar.add_argument("--formatos", nargs="+", choices=FORMATOS, default=["json"],
+                            help="Formatos de respuesta a medir en /buscar y /mis-reservas")
+    p_ejecutar.add_argument("--salida", default="benchmark_resultados.json")
+    p_ejecutar.add_argument("--directorio-datos", default="benchmark_datos")
+    p_ejecutar.add_argument("--reconstruir", action="store_true", help="Regenerar las bases de datos")
+    p_ejecutar.add_argument("--comparar", help="JSON de línea base contra el que comparar")
+    p_ejecutar.add_argument("--umbral", type=float, default=0.10, help="Regresión tolerada (0.10 = 10%%)")
+    p_ejecutar.set_defaults(funcion=ejecutar)
+
+    p_comparar = subparsers.add_parser("comparar", help="Comparar dos archivos de resultados")
+    p_comparar.add_argument("base")
+    p_comparar.add_argument("actual")
+    p_comparar.add_argument("--umbral", type=float, default=0.10)
+    p_comparar.set_defaults(funcion=comparar)
+
+    args = parser.parse_args(argv)
+    if "msgpack" in getattr(args, "formatos", []) and msgpack is None:
+        parser.error("--formatos msgpack requiere msgpack (pip install msgpack)")
+    return args.funcion(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""
+Selección de campos de las respuestas (`fields=`)
+
+Los clientes móviles y las integraciones sólo necesitan algunos campos de
+cada habitación de /buscar o de cada reserva de /mis-reservas (por ejemplo
+`fields=id,precio_total`). Los campos se validan contra el modelo pydantic
+que describe el elemento de la respuesta; los de un submodelo se piden con
+punto (`habitacion.numero`).
+
+`seleccionar_campos` devuelve la selección en el orden del modelo y sin
+duplicados, así que pedir los mismos campos en otro orden da la misma tupla:
+cada endpoint cachea por tupla lo que se deriva de ella (columnas del SELECT,
+expresión SQL, función que arma cada fila) y la reutiliza en las peticiones
+siguientes.
+"""
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel
+
+def _submodelo(anotacion) -> Optional[Type[BaseModel]]:
+    if isinstance(anotacion, type) and issubclass(anotacion, BaseModel):
+        return anotacion
+    return None
+
+@lru_cache(maxsize=None)
+def campos_validos(modelo: Type[BaseModel]) -> Tuple[str, ...]:
+    """Campos seleccionables en el orden del modelo: cada campo y, tras un submodelo, sus 'padre.hijo'"""
+    campos = []
+    for nombre, campo in modelo.model_fields.items():
+        campos.append(nombre)
+        submodelo = _submodelo(campo.annotation)
+        if submodelo is not None:
+            campos.extend(f"{nombre}.{hijo}" for hijo in submodelo.model_fields)
+    return tuple(campos)
+
+def seleccionar_campos(modelo: Type[BaseModel], fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """
+    Campos pedidos en `fields` (separados por comas), validados contra `modelo`
+
+    Returns:
+        Tupla en el orden del modelo, o None si no se pidió una selección (o
+        se pidieron todos los campos): la respuesta completa de siempre
+
+    Raises:
+        ValueError: si hay campos desconocidos o la lista está vacía
+    """
+    if fields is None:
+        return None
+    pedidos = {campo.strip() for campo in fields.split(",") if campo.strip()}
+    if not pedidos:
+        raise ValueError("fields no puede estar vacío")
+    validos = campos_validos(modelo)
+    desconocidos = pedidos - set(validos)
+    if desconocidos:
+        raise ValueError(f"Campos desconocidos: {', '.join(sorted(desconocidos))}. "
+                         f"Válidos: {', '.join(validos)}")
+    # Un submodelo pedido entero incluye sus campos
+    seleccion = tuple(
+        campo for campo in validos
+        if campo in pedidos and campo.partition(".")[0] not in pedidos - {campo}
+    )
+    if set(seleccion) >= set(modelo.model_fields):
+        return None
+    return seleccion
+
+@lru_cache(maxsize=256)
+def agrupar_campos(campos: Tuple[str, ...]) -> Dict[str, Optional[List[str]]]:
+    """{campo: None} para los campos enteros y {padre: [hijos]} para los de submodelos, en orden"""
+    grupos: Dict[str, Optional[List[str]]] = {}
+    for campo in campos:
+        padre, _, hijo = campo.partition(".")
+        if hijo:
+            grupos.setdefault(padre, []).append(hijo)
+        else:
+            grupos[padre] = None
+    return grupos
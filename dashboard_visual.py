@@ -6,6 +6,9 @@ import numpy as np
 from datetime import datetime
 import os
 from metricas_testing import MetricasTesting
+from registro import obtener_registro
+
+registro = obtener_registro(__name__)
 
 class DashboardVisual:
     """Dashboard visual con matplotlib para métricas de testing"""
@@ -54,7 +57,7 @@ class DashboardVisual:
     def generar_dashboard_completo(self, archivo_salida: str = "dashboard_metricas.png"):
         """Generar dashboard completo con todos los gráficos"""
         if not self.sistema.historico:
-            print("❌ No hay datos históricos para generar dashboard")
+            registro.warning("No hay datos históricos para generar dashboard")
             return
         
         # Crear figura con subplots
@@ -112,7 +115,7 @@ class DashboardVisual:
         
         # Guardar
         plt.savefig(archivo_salida, dpi=150, bbox_inches='tight')
-        print(f"✅ Dashboard guardado en: {archivo_salida}")
+        registro.info("Dashboard guardado", extra={"archivo": archivo_salida})
         
         # Mostrar
         plt.show()
@@ -570,13 +573,15 @@ class DashboardVisual:
         with open(archivo_salida, 'w', encoding='utf-8') as f:
             f.write(html)
         
-        print(f"✅ Reporte HTML guardado en: {archivo_salida}")
+        registro.info("Reporte HTML guardado", extra={"archivo": archivo_salida})
         return archivo_salida
 
 
 if __name__ == "__main__":
     from metricas_testing import MetricasTesting, crear_metricas_ejemplo
+    from registro import configurar_registro
     
+    configurar_registro(formato_por_defecto="texto")
     print("📊 Generando Dashboard Visual\n")
     
     # Cargar o crear datos
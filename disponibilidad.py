@@ -0,0 +1,95 @@
+"""
+Fechas alternativas para búsquedas sin resultados
+
+Si nadie tiene libre [inicio, inicio + noches), el huésped suele reintentar
+moviendo las fechas a mano. En vez de repetir la búsqueda por cada
+desplazamiento, se lee una sola vez la ocupación de las habitaciones
+candidatas en [inicio - N, inicio + noches + N) y se arma una matriz
+habitación × noche. Con la suma acumulada de cada fila, las noches ocupadas
+de cualquier ventana son
+
+    ocupadas[h, s : s + noches].sum() = acumulada[h, s + noches] - acumulada[h, s]
+
+así que todas las ventanas de la misma duración se evalúan en una pasada.
+Las fechas son números de día (ver fechas.py).
+"""
+from typing import List
+
+import numpy as np
+
+def cargar_ocupacion(cursor, habitacion_ids: np.ndarray, desde: int, hasta: int) -> np.ndarray:
+    """
+    Matriz booleana (habitación × noche) de las noches ocupadas en [desde, hasta)
+
+    Las reservas se leen del R*Tree `reservas_intervalos`, que sólo contiene
+    las activas. `habitacion_ids` debe venir ordenado.
+    """
+    ocupadas = np.zeros((len(habitacion_ids), hasta - desde + 1), dtype=np.int64)
+    cursor.execute("""
+        SELECT habitacion_min, fecha_inicio, fecha_fin FROM reservas_intervalos
+        WHERE fecha_inicio < ? AND fecha_fin > ?
+    """, (hasta, desde))
+    filas = cursor.fetchall()
+    if filas and len(habitacion_ids):
+        habitaciones, inicios, fines = (np.array(columna, dtype=np.int64) for columna in zip(*filas))
+        posiciones = np.minimum(np.searchsorted(habitacion_ids, habitaciones), len(habitacion_ids) - 1)
+        propias = habitacion_ids[posiciones] == habitaciones
+        # +1 al entrar y -1 al salir, recortado al rango; la suma acumulada da la ocupación
+        np.add.at(ocupadas, (posiciones[propias], np.maximum(inicios[propias], desde) - desde), 1)
+        np.add.at(ocupadas, (posiciones[propias], np.minimum(fines[propias], hasta) - desde), -1)
+    return np.cumsum(ocupadas, axis=1)[:, :-1] > 0
+
+def ventanas_libres(ocupadas: np.ndarray, noches: int) -> np.ndarray:
+    """
+    Habitaciones libres en cada ventana de `noches` noches
+
+    Returns:
+        Matriz booleana (habitación × inicio de ventana): True si la habitación
+        está libre todas las noches de [inicio, inicio + noches)
+    """
+    acumulada = np.zeros((ocupadas.shape[0], ocupadas.shape[1] + 1), dtype=np.int64)
+    np.cumsum(ocupadas, axis=1, out=acumulada[:, 1:])
+    return (acumulada[:, noches:] - acumulada[:, :-noches]) == 0
+
+def desplazamientos_cercanos(inicio: int, noches: int, dias: int, primer_dia: int,
+                             libres: np.ndarray, desde: int) -> List[int]:
+    """
+    Desplazamientos (±días) con alguna habitación libre, del más cercano al más lejano
+
+    A igual distancia se prefiere adelantar la estancia. Nunca se proponen
+    ventanas que empiecen antes de `primer_dia`.
+    """
+    candidatos = []
+    for desplazamiento in sorted(range(-dias, dias + 1), key=lambda d: (abs(d), d)):
+        nuevo_inicio = inicio + desplazamiento
+        if desplazamiento == 0 or nuevo_inicio < primer_dia:
+            continue
+        columna = nuevo_inicio - desde
+        if 0 <= columna < libres.shape[1] and libres[:, columna].any():
+            candidatos.append(desplazamiento)
+    return candidatos
+
+def alternativas(cursor, habitacion_ids: np.ndarray, inicio: int, noches: int, dias: int,
+                 primer_dia: int) -> List[dict]:
+    """
+    Ventanas de la misma duración a ±`dias` días con alguna habitación libre
+
+    Returns:
+        Lista ordenada por cercanía de {"desplazamiento", "inicio", "habitaciones"}
+        con los ids (array) de las habitaciones libres toda la ventana
+    """
+    if len(habitacion_ids) == 0 or dias <= 0:
+        return []
+    desde = max(inicio - dias, primer_dia)
+    hasta = inicio + dias + noches
+    if hasta - desde < noches:
+        return []
+    libres = ventanas_libres(cargar_ocupacion(cursor, habitacion_ids, desde, hasta), noches)
+    return [
+        {
+            "desplazamiento": desplazamiento,
+            "inicio": inicio + desplazamiento,
+            "habitaciones": habitacion_ids[libres[:, inicio + desplazamiento - desde]],
+        }
+        for desplazamiento in desplazamientos_cercanos(inicio, noches, dias, primer_dia, libres, desde)
+    ]
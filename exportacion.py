@@ -0,0 +1,247 @@
+"""
+Instantáneas en línea y exportación por bloques de los datos de reservas
+
+Copiar `hotel_booking.db` a mano mientras la API escribe bloquea a los
+escritores o produce un archivo a medias. Aquí:
+
+- `crear_instantanea` usa la API de backup de SQLite en pasos de N páginas:
+  entre paso y paso el origen queda libre, así que las escrituras sólo se
+  pausan un instante. Si otra conexión modifica el origen, SQLite reinicia la
+  copia, de modo que el resultado siempre es consistente. Se escribe en un
+  temporal que sólo reemplaza al destino cuando está completo.
+- `exportar_csv` / `exportar_parquet` recorren una tabla con `fetchmany` y
+  producen el archivo por bloques, sin cargarla entera en memoria. Las
+  columnas secretas (`password_hash`) nunca se exportan y `sesiones` no es
+  exportable. Las fechas de estancia (números de día, ver fechas.py) salen
+  como 'YYYY-MM-DD' en CSV y como `date32` en Parquet.
+
+Parquet requiere `pyarrow` (opcional).
+
+Uso:
+    python exportacion.py instantanea --db hotel_booking.db --destino copia.db
+    python exportacion.py exportar --db hotel_booking.db --tabla reservas --formato csv --salida reservas.csv
+"""
+import argparse
+import csv
+import io
+import os
+import sqlite3
+import sys
+import time
+from typing import Callable, Iterator, Optional
+from urllib.request import pathname2url
+
+from fechas import sql_dia_a_texto
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet es opcional
+    pa = None
+    pq = None
+
+PAGINAS_POR_PASO = 1024
+TAMANO_BLOQUE = 10_000
+
+# Columnas exportables de cada tabla y su tipo (para el esquema Parquet)
+TABLAS_EXPORTABLES = {
+    "reservas": [
+        ("id", "int"), ("usuario_id", "int"), ("habitacion_id", "int"),
+        ("fecha_inicio", "dia"), ("fecha_fin", "dia"), ("huespedes", "int"),
+        ("precio_total", "float"), ("estado", "str"), ("fecha_reserva", "str"),
+    ],
+    "pagos": [
+        ("id", "int"), ("reserva_id", "int"), ("monto", "float"), ("metodo_pago", "str"),
+        ("ultimos_4_digitos", "str"), ("estado", "str"), ("fecha_pago", "str"),
+        ("codigo_transaccion", "str"),
+    ],
+    "usuarios": [
+        ("id", "int"), ("email", "str"), ("nombre", "str"), ("apellido", "str"),
+        ("telefono", "str"), ("fecha_registro", "str"), ("activo", "int"),
+    ],
+}
+
+FORMATOS = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# ==================== INSTANTÁNEAS ====================
+
+def crear_instantanea(origen: str, destino: str, paginas_por_paso: int = PAGINAS_POR_PASO,
+                      pausa: float = 0.0, progreso: Optional[Callable[[int, int, int], None]] = None) -> dict:
+    """
+    Copiar `origen` en `destino` con la API de backup en pasos incrementales
+
+    Args:
+        paginas_por_paso: Páginas copiadas por paso; entre pasos el origen queda libre
+        pausa: Segundos de espera entre pasos (cede aún más tiempo a los escritores)
+        progreso: Función (estado, restantes, total) llamada tras cada paso
+
+    Returns:
+        Diccionario con el destino, su tamaño en bytes y la duración
+    """
+    temporal = destino + ".tmp"
+    if os.path.exists(temporal):
+        os.remove(temporal)
+
+    inicio = time.perf_counter()
+    fuente = sqlite3.connect(f"file:{pathname2url(os.path.abspath(origen))}?mode=ro", uri=True)
+    copia = sqlite3.connect(temporal)
+    try:
+        fuente.backup(copia, pages=paginas_por_paso, progress=progreso, sleep=pausa)
+        # La copia es un archivo suelto: sin WAL ni archivos -wal/-shm al lado
+        copia.execute("PRAGMA journal_mode = DELETE")
+    except Exception:
+        copia.close()
+        os.remove(temporal)
+        raise
+    finally:
+        fuente.close()
+    copia.close()
+
+    os.replace(temporal, destino)
+    return {
+        "destino": destino,
+        "bytes": os.path.getsize(destino),
+        "segundos": round(time.perf_counter() - inicio, 3),
+    }
+
+# ==================== EXPORTACIÓN ====================
+
+def abrir_lectura(ruta: str) -> sqlite3.Connection:
+    """Conexión de sólo lectura usable desde los hilos que consumen el streaming"""
+    conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(ruta))}?mode=ro", uri=True,
+                           check_same_thread=False)
+    conn.execute("PRAGMA query_only = 1")
+    return conn
+
+def _consultar(conn: sqlite3.Connection, tabla: str, dias_como_texto: bool) -> sqlite3.Cursor:
+    if tabla not in TABLAS_EXPORTABLES:
+        raise ValueError(f"Tabla no exportable: {tabla}")
+    columnas = ", ".join(
+        f"{sql_dia_a_texto(nombre)} AS {nombre}" if tipo == "dia" and dias_como_texto else nombre
+        for nombre, tipo in TABLAS_EXPORTABLES[tabla]
+    )
+    # Una sola sentencia: toda la exportación lee la misma versión de la tabla
+    return conn.execute(f"SELECT {columnas} FROM {tabla} ORDER BY id")
+
+def exportar_csv(conn: sqlite3.Connection, tabla: str, tamano_bloque: int = TAMANO_BLOQUE) -> Iterator[bytes]:
+    """Producir la tabla como CSV (UTF-8), un bloque de filas cada vez"""
+    cursor = _consultar(conn, tabla, dias_como_texto=True)
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow([nombre for nombre, _ in TABLAS_EXPORTABLES[tabla]])
+    while True:
+        filas = cursor.fetchmany(tamano_bloque)
+        if filas:
+            escritor.writerows(filas)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        if not filas:
+            break
+
+class _SalidaPorBloques(io.RawIOBase):
+    """Archivo de sólo escritura que acumula bytes hasta que se recogen"""
+
+    def __init__(self):
+        self.bloques = []
+        self.posicion = 0
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self.bloques.append(bytes(datos))
+        self.posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self.posicion
+
+    def recoger(self) -> bytes:
+        datos = b"".join(self.bloques)
+        self.bloques = []
+        return datos
+
+def exportar_parquet(conn: sqlite3.Connection, tabla: str, tamano_bloque: int = TAMANO_BLOQUE) -> Iterator[bytes]:
+    """Producir la tabla como Parquet, un row group por bloque de filas"""
+    if pa is None:
+        raise RuntimeError("La exportación Parquet requiere pyarrow (pip install pyarrow)")
+    # date32 también cuenta días desde 1970-01-01: los enteros se guardan tal cual
+    tipos = {"int": pa.int64(), "float": pa.float64(), "str": pa.string(), "dia": pa.date32()}
+    columnas = TABLAS_EXPORTABLES[tabla]
+    esquema = pa.schema([(nombre, tipos[tipo]) for nombre, tipo in columnas])
+
+    cursor = _consultar(conn, tabla, dias_como_texto=False)
+    salida = _SalidaPorBloques()
+    with pq.ParquetWriter(salida, esquema) as escritor:
+        while True:
+            filas = cursor.fetchmany(tamano_bloque)
+            if not filas:
+                break
+            valores = list(zip(*filas))
+            escritor.write_table(pa.table(
+                [pa.array(valores[i], type=tipos[tipo]) for i, (_, tipo) in enumerate(columnas)],
+                schema=esquema
+            ))
+            yield salida.recoger()
+    yield salida.recoger()
+
+def exportar(ruta: str, tabla: str, formato: str = "csv", tamano_bloque: int = TAMANO_BLOQUE) -> Iterator[bytes]:
+    """Abrir una conexión propia y exportar; la conexión se cierra al terminar (o abandonar) el iterador"""
+    if tabla not in TABLAS_EXPORTABLES:
+        raise ValueError(f"Tabla no exportable: {tabla}")
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no soportado: {formato}")
+    if formato == "parquet" and pa is None:
+        raise RuntimeError("La exportación Parquet requiere pyarrow (pip install pyarrow)")
+
+    def generar():
+        conn = abrir_lectura(ruta)
+        try:
+            exportador = exportar_csv if formato == "csv" else exportar_parquet
+            yield from exportador(conn, tabla, tamano_bloque)
+        finally:
+            conn.close()
+    return generar()
+
+# ==================== CLI ====================
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Instantáneas y exportación de la base de datos de reservas")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    instantanea = subparsers.add_parser("instantanea", help="Copia consistente con la API de backup")
+    instantanea.add_argument("--db", default="hotel_booking.db")
+    instantanea.add_argument("--destino", required=True)
+    instantanea.add_argument("--paginas-por-paso", type=int, default=PAGINAS_POR_PASO)
+    instantanea.add_argument("--pausa", type=float, default=0.0, help="Segundos entre pasos")
+
+    exportacion = subparsers.add_parser("exportar", help="Exportar una tabla por bloques")
+    exportacion.add_argument("--db", default="hotel_booking.db")
+    exportacion.add_argument("--tabla", choices=sorted(TABLAS_EXPORTABLES), required=True)
+    exportacion.add_argument("--formato", choices=sorted(FORMATOS), default="csv")
+    exportacion.add_argument("--salida", required=True)
+    exportacion.add_argument("--tamano-bloque", type=int, default=TAMANO_BLOQUE)
+
+    args = parser.parse_args(argv)
+    try:
+        if args.comando == "instantanea":
+            resultado = crear_instantanea(args.db, args.destino, args.paginas_por_paso, args.pausa)
+            print(f"✅ Instantánea en {resultado['destino']} "
+                  f"({resultado['bytes'] / 1e6:.1f} MB, {resultado['segundos']:.2f}s)")
+        else:
+            inicio = time.perf_counter()
+            with open(args.salida, "wb") as f:
+                for bloque in exportar(args.db, args.tabla, args.formato, args.tamano_bloque):
+                    f.write(bloque)
+            print(f"✅ {args.tabla} exportada a {args.salida} ({time.perf_counter() - inicio:.2f}s)")
+    except (sqlite3.Error, RuntimeError, ValueError) as e:
+        print(f"❌ {e}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
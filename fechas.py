@@ -0,0 +1,49 @@
+"""
+Codificación entera de fechas
+
+Las fechas de estancia (`reservas.fecha_inicio`/`fecha_fin`, `tarifas`,
+`inventario_tipo` y `ocupacion_diaria`) se guardan como número de día desde
+1970-01-01, y `sesiones.fecha_expiracion` como segundos epoch (UTC). Así:
+
+- Los índices son más pequeños (un entero de 2-4 bytes frente a 10 de texto)
+- Los predicados de solapamiento comparan enteros
+- Un día sirve directamente como posición en un arreglo (día - origen)
+
+El mismo número de día es el que usa numpy para `datetime64[D]` y Arrow/Parquet
+para `date32`, así que no hace falta convertir al cruzar esas fronteras. Hacia
+fuera (respuestas JSON, CSV) las fechas se siguen mostrando como 'YYYY-MM-DD'.
+"""
+import time
+from datetime import date, datetime
+
+EPOCA = date(1970, 1, 1)
+ORDINAL_EPOCA = EPOCA.toordinal()
+
+# julianday('1970-01-01'): resta para pasar de texto a número de día en SQL
+DIA_JULIANO_EPOCA = 2440587.5
+
+def a_dia(fecha: date) -> int:
+    return fecha.toordinal() - ORDINAL_EPOCA
+
+def desde_dia(dia: int) -> date:
+    return date.fromordinal(dia + ORDINAL_EPOCA)
+
+def texto_dia(dia: int) -> str:
+    return desde_dia(dia).isoformat()
+
+def dia_hoy() -> int:
+    return a_dia(date.today())
+
+def a_epoch(momento: datetime) -> int:
+    return int(momento.timestamp())
+
+def ahora_epoch() -> int:
+    return int(time.time())
+
+def sql_texto_a_dia(columna: str) -> str:
+    """Expresión SQL que convierte una columna 'YYYY-MM-DD' en número de día"""
+    return f"CAST(julianday({columna}) - {DIA_JULIANO_EPOCA} AS INTEGER)"
+
+def sql_dia_a_texto(columna: str) -> str:
+    """Expresión SQL que convierte un número de día en 'YYYY-MM-DD'"""
+    return f"date({columna} * 86400, 'unixepoch')"
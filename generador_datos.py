@@ -0,0 +1,394 @@
+"""
+Generador y cargador masivo de datos sintéticos para el Sistema de Reservas
+
+Construye un `hotel_booking.db` con el esquema de la aplicación y un volumen
+configurable de habitaciones, usuarios, sesiones, reservas y pagos. Las fechas
+siguen una distribución estacional (temporada alta en verano y diciembre).
+
+La carga usa `executemany` por lotes dentro de una única transacción, PRAGMAs
+de carga masiva y creación diferida de índices, y se escribe en un archivo
+temporal que sólo reemplaza al destino cuando está completo.
+
+Uso:
+    python generador_datos.py --habitaciones 10000 --usuarios 50000 --reservas 1000000 \\
+        --salida hotel_booking.db --forzar
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from datetime import date
+from itertools import islice
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+import hotel_booking_system
+
+# Todos los usuarios generados comparten esta contraseña
+PASSWORD_USUARIOS = "password123"
+
+TAMANO_LOTE = 50_000
+
+# Composición del catálogo: (tipo, proporción, capacidades posibles, precio base)
+COMPOSICION_HABITACIONES = [
+    ('simple', 0.30, [1], 50.0),
+    ('doble', 0.50, [2], 80.0),
+    ('suite', 0.20, [3, 4], 140.0),
+]
+
+DESCRIPCIONES = {
+    'simple': ['Habitación individual con cama simple', 'Habitación individual premium'],
+    'doble': ['Habitación doble con dos camas individuales', 'Habitación doble con cama matrimonial',
+              'Habitación doble con vista al jardín', 'Habitación doble deluxe'],
+    'suite': ['Suite junior con balcón', 'Suite familiar con dos habitaciones',
+              'Suite presidencial con sala y jacuzzi'],
+}
+
+NOMBRES = ['Juan', 'María', 'Carlos', 'Ana', 'Luis', 'Laura', 'Andrés', 'Sofía', 'Jorge', 'Valentina']
+APELLIDOS = ['Pérez', 'Gómez', 'Rodríguez', 'López', 'Martínez', 'García', 'Torres', 'Ramírez']
+METODOS_PAGO = ['tarjeta_credito', 'tarjeta_debito']
+
+ESTANCIA_MEDIA = 2.0      # noches adicionales a la primera (Poisson)
+OCUPACION_OBJETIVO = 0.70
+FRACCION_HISTORIA = 0.6   # proporción del horizonte que queda en el pasado
+
+PRAGMAS_CARGA = [
+    "PRAGMA journal_mode = OFF",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA locking_mode = EXCLUSIVE",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -262144",
+]
+
+# ==================== DISTRIBUCIONES ====================
+
+def factor_estacional(dia_del_anio: np.ndarray) -> np.ndarray:
+    """
+    Demanda relativa por día del año (1.0 = media)
+
+    Pico principal a mediados de julio y secundario en diciembre, con un valle
+    en febrero y en octubre.
+    """
+    angulo = 2 * np.pi * (dia_del_anio - 196) / 365.25
+    return 1.0 + 0.30 * np.cos(angulo) + 0.15 * np.cos(2 * angulo)
+
+def a_numero_dia(dias: np.ndarray) -> np.ndarray:
+    """datetime64[D] ya cuenta días desde 1970-01-01: el mismo número que guarda la aplicación"""
+    return dias.astype(np.int64)
+
+# Los timestamps se insertan como segundos epoch y SQLite los formatea como
+# 'YYYY-MM-DD HH:MM:SS', el mismo formato que CURRENT_TIMESTAMP
+TIMESTAMP_SQL = "datetime(?, 'unixepoch')"
+
+def a_epoch(segundos: np.ndarray) -> np.ndarray:
+    return segundos.astype('datetime64[s]').astype(np.int64)
+
+def generar_habitaciones(rng: np.random.Generator, total: int) -> Dict[str, np.ndarray]:
+    proporciones = np.array([c[1] for c in COMPOSICION_HABITACIONES])
+    indice_tipo = rng.choice(len(COMPOSICION_HABITACIONES), size=total, p=proporciones)
+
+    tipos = np.array([c[0] for c in COMPOSICION_HABITACIONES], dtype=object)[indice_tipo]
+    capacidades = np.empty(total, dtype=np.int64)
+    precios = np.empty(total, dtype=np.float64)
+    descripciones = np.empty(total, dtype=object)
+    for i, (tipo, _, opciones, precio_base) in enumerate(COMPOSICION_HABITACIONES):
+        mascara = indice_tipo == i
+        cantidad = int(mascara.sum())
+        capacidades[mascara] = rng.choice(opciones, size=cantidad)
+        # Precio escalonado de 5 en 5 por encima del precio base
+        precios[mascara] = precio_base + 5.0 * rng.integers(0, 5, size=cantidad)
+        descripciones[mascara] = np.array(DESCRIPCIONES[tipo], dtype=object)[
+            rng.integers(0, len(DESCRIPCIONES[tipo]), size=cantidad)
+        ]
+
+    # Numeración por pisos de 100 habitaciones: 101, 102, ..., 1001, ...
+    indices = np.arange(total)
+    numeros = [f"{p}{n:02d}" for p, n in zip((indices // 100 + 1).tolist(), (indices % 100 + 1).tolist())]
+
+    return {
+        "numero": numeros,
+        "tipo": tipos,
+        "capacidad": capacidades,
+        "precio_noche": precios,
+        "descripcion": descripciones,
+    }
+
+def generar_reservas(rng: np.random.Generator, total: int, habitaciones: Dict[str, np.ndarray],
+                     total_usuarios: int, hoy: np.datetime64) -> Dict[str, np.ndarray]:
+    """
+    Generar estancias sin solapamiento por habitación
+
+    Cada habitación recibe una secuencia de estancias separadas por huecos.
+    Los huecos se acortan en temporada alta: en una primera pasada se estima la
+    fecha de cada estancia con huecos medios y en la segunda se sortean los
+    huecos según el factor estacional de esa fecha.
+    """
+    total_habitaciones = len(habitaciones["numero"])
+    habitacion_idx = np.sort(rng.integers(0, total_habitaciones, size=total))
+    noches = 1 + np.minimum(rng.poisson(ESTANCIA_MEDIA, size=total), 13)
+
+    hueco_medio = (1 + ESTANCIA_MEDIA) * (1 / OCUPACION_OBJETIVO - 1)
+    estancias_por_habitacion = total / max(1, total_habitaciones)
+    horizonte = int(np.ceil(estancias_por_habitacion * (1 + ESTANCIA_MEDIA + hueco_medio))) + 1
+    inicio_horizonte = hoy - np.timedelta64(int(horizonte * FRACCION_HISTORIA), 'D')
+
+    # Posición de la primera estancia de cada habitación dentro del arreglo ordenado
+    primeras = np.searchsorted(habitacion_idx, np.arange(total_habitaciones))
+    conteos = np.bincount(habitacion_idx, minlength=total_habitaciones)
+
+    def inicios_desde(huecos: np.ndarray) -> np.ndarray:
+        paso = noches + huecos
+        acumulado = np.cumsum(paso) - paso
+        # Reiniciar la suma acumulada al comienzo de cada habitación
+        base = np.repeat(acumulado[np.minimum(primeras, total - 1)], conteos)
+        return acumulado - base + np.repeat(rng.integers(0, 4, size=total_habitaciones), conteos)
+
+    provisional = inicios_desde(np.full(total, int(round(hueco_medio))))
+    dia_del_anio = ((inicio_horizonte + provisional.astype('timedelta64[D]'))
+                    - inicio_horizonte.astype('datetime64[Y]')).astype(np.int64) % 365
+    media_huecos = hueco_medio / factor_estacional(dia_del_anio) ** 2
+    huecos = rng.geometric(1 / (1 + media_huecos)) - 1
+
+    inicios = inicio_horizonte + inicios_desde(huecos).astype('timedelta64[D]')
+    fines = inicios + noches.astype('timedelta64[D]')
+
+    # Estados: el pasado está confirmado (salvo cancelaciones), el futuro mezcla pendientes
+    sorteo = rng.random(total)
+    futuro = fines > hoy
+    estados = np.where(sorteo < 0.08, 'cancelada', 'confirmada').astype(object)
+    estados[futuro & (sorteo >= 0.10) & (sorteo < 0.40)] = 'pendiente'
+
+    capacidades = habitaciones["capacidad"][habitacion_idx]
+    huespedes = 1 + (rng.random(total) * capacidades).astype(np.int64)
+
+    # Antelación de la reserva: exponencial con media de 30 días
+    antelacion = (rng.exponential(30 * 86400, size=total)).astype('timedelta64[s]')
+    fecha_reserva = inicios.astype('datetime64[s]') - antelacion
+
+    return {
+        "usuario_id": 1 + rng.integers(0, total_usuarios, size=total),
+        "habitacion_id": habitacion_idx + 1,
+        "fecha_inicio": a_numero_dia(inicios),
+        "fecha_fin": a_numero_dia(fines),
+        "huespedes": huespedes,
+        "precio_total": habitaciones["precio_noche"][habitacion_idx] * noches,
+        "estado": estados,
+        "fecha_reserva": a_epoch(fecha_reserva),
+    }
+
+def tokens_hex(rng: np.random.Generator, total: int, bytes_por_token: int, prefijo: str = "",
+               mayusculas: bool = False) -> np.ndarray:
+    crudo = rng.bytes(total * bytes_por_token).hex()
+    if mayusculas:
+        crudo = crudo.upper()
+    ancho = 2 * bytes_por_token
+    # Ordenados: el índice UNIQUE se llena por el final en vez de en posiciones aleatorias
+    return np.array(sorted(prefijo + crudo[i:i + ancho] for i in range(0, total * ancho, ancho)), dtype=object)
+
+# ==================== CARGA ====================
+
+def insertar_por_lotes(cursor, sentencia: str, filas: Iterable[tuple], tamano_lote: int = TAMANO_LOTE) -> int:
+    """Insertar filas con `executemany` en lotes de `tamano_lote`"""
+    total = 0
+    filas = iter(filas)
+    while True:
+        lote = list(islice(filas, tamano_lote))
+        if not lote:
+            return total
+        cursor.executemany(sentencia, lote)
+        total += len(lote)
+
+def columnas(datos: Dict[str, np.ndarray], nombres) -> Iterable[tuple]:
+    """Combinar columnas de numpy en tuplas de tipos nativos de Python"""
+    return zip(*(datos[n].tolist() if isinstance(datos[n], np.ndarray) else datos[n] for n in nombres))
+
+def generar_base_datos(salida: str, habitaciones: int, usuarios: int, sesiones: int, reservas: int,
+                       pagos: Optional[int] = None, semilla: int = 42, forzar: bool = False,
+                       verbose: bool = True) -> Dict[str, float]:
+    """
+    Construir una base de datos sintética completa
+
+    Args:
+        pagos: Número de pagos a generar. Por defecto, uno por reserva confirmada.
+
+    Returns:
+        Diccionario con las filas cargadas y los tiempos de cada fase
+    """
+    if os.path.exists(salida) and not forzar:
+        raise FileExistsError(f"{salida} ya existe (usa forzar=True / --forzar para reemplazarlo)")
+    if reservas and (habitaciones <= 0 or usuarios <= 0):
+        raise ValueError("Se necesitan habitaciones y usuarios para generar reservas")
+    if sesiones and usuarios <= 0:
+        raise ValueError("Se necesitan usuarios para generar sesiones")
+
+    def log(mensaje):
+        if verbose:
+            print(mensaje)
+
+    rng = np.random.default_rng(semilla)
+    hoy = np.datetime64(date.today(), 'D')
+    ahora = np.datetime64('now', 's')
+    tiempos = {}
+
+    temporal = salida + ".tmp"
+    if os.path.exists(temporal):
+        os.remove(temporal)
+
+    inicio_total = time.perf_counter()
+    conn = sqlite3.connect(temporal, isolation_level=None)
+    try:
+        cursor = conn.cursor()
+        for pragma in PRAGMAS_CARGA:
+            cursor.execute(pragma)
+        hotel_booking_system.crear_tablas(cursor)
+        cursor.execute("BEGIN")
+
+        # Habitaciones
+        inicio = time.perf_counter()
+        datos_habitaciones = generar_habitaciones(rng, habitaciones)
+        insertar_por_lotes(
+            cursor,
+            "INSERT INTO habitaciones (id, numero, tipo, capacidad, precio_noche, descripcion) VALUES (?, ?, ?, ?, ?, ?)",
+            ((i + 1, *fila) for i, fila in enumerate(columnas(
+                datos_habitaciones, ["numero", "tipo", "capacidad", "precio_noche", "descripcion"])))
+        )
+        tiempos["habitaciones"] = time.perf_counter() - inicio
+        log(f"🏨 {habitaciones} habitaciones ({tiempos['habitaciones']:.2f}s)")
+
+        # Usuarios
+        inicio = time.perf_counter()
+        password_hash = hotel_booking_system.hash_password(PASSWORD_USUARIOS)
+        nombres = np.array(NOMBRES, dtype=object)[rng.integers(0, len(NOMBRES), size=usuarios)].tolist()
+        apellidos = np.array(APELLIDOS, dtype=object)[rng.integers(0, len(APELLIDOS), size=usuarios)].tolist()
+        telefonos = (3000000000 + rng.integers(0, 99999999, size=usuarios)).tolist()
+        insertar_por_lotes(
+            cursor,
+            """INSERT INTO usuarios (id, email, password_hash, nombre, apellido, telefono)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            ((i + 1, f"usuario{i + 1}@hotel.com", password_hash, nombres[i], apellidos[i], f"+57 {telefonos[i]}")
+             for i in range(usuarios))
+        )
+        tiempos["usuarios"] = time.perf_counter() - inicio
+        log(f"👤 {usuarios} usuarios ({tiempos['usuarios']:.2f}s)")
+
+        # Sesiones: creadas en los últimos 14 días con 7 días de validez
+        inicio = time.perf_counter()
+        if sesiones:
+            creacion = ahora - rng.integers(0, 14 * 86400, size=sesiones).astype('timedelta64[s]')
+            datos_sesiones = {
+                "usuario_id": 1 + rng.integers(0, usuarios, size=sesiones),
+                "token": tokens_hex(rng, sesiones, 24),
+                "fecha_creacion": a_epoch(creacion),
+                "fecha_expiracion": a_epoch(creacion + np.timedelta64(7 * 86400, 's')),
+            }
+            insertar_por_lotes(
+                cursor,
+                f"""INSERT INTO sesiones (usuario_id, token, fecha_creacion, fecha_expiracion)
+                    VALUES (?, ?, {TIMESTAMP_SQL}, ?)""",
+                columnas(datos_sesiones, ["usuario_id", "token", "fecha_creacion", "fecha_expiracion"])
+            )
+        tiempos["sesiones"] = time.perf_counter() - inicio
+        log(f"🔑 {sesiones} sesiones ({tiempos['sesiones']:.2f}s)")
+
+        # Reservas
+        inicio = time.perf_counter()
+        confirmadas = np.zeros(0, dtype=np.int64)
+        if reservas:
+            datos_reservas = generar_reservas(rng, reservas, datos_habitaciones, usuarios, hoy)
+            insertar_por_lotes(
+                cursor,
+                f"""INSERT INTO reservas (id, usuario_id, habitacion_id, fecha_inicio, fecha_fin, huespedes,
+                                         precio_total, estado, fecha_reserva)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, {TIMESTAMP_SQL})""",
+                ((i + 1, *fila) for i, fila in enumerate(columnas(
+                    datos_reservas, ["usuario_id", "habitacion_id", "fecha_inicio", "fecha_fin", "huespedes",
+                                     "precio_total", "estado", "fecha_reserva"])))
+            )
+            confirmadas = np.flatnonzero(datos_reservas["estado"] == 'confirmada')
+        tiempos["reservas"] = time.perf_counter() - inicio
+        log(f"📅 {reservas} reservas ({tiempos['reservas']:.2f}s)")
+
+        # Pagos: uno por reserva confirmada (o un subconjunto si se pide menos)
+        inicio = time.perf_counter()
+        total_pagos = len(confirmadas) if pagos is None else min(pagos, len(confirmadas))
+        if pagos is not None and pagos > len(confirmadas):
+            log(f"⚠️ Sólo hay {len(confirmadas)} reservas confirmadas: se generan {total_pagos} pagos")
+        if total_pagos:
+            seleccion = np.sort(rng.choice(confirmadas, size=total_pagos, replace=False))
+            fecha_reserva = datos_reservas["fecha_reserva"][seleccion]
+            datos_pagos = {
+                "reserva_id": seleccion + 1,
+                "monto": datos_reservas["precio_total"][seleccion],
+                "metodo_pago": np.array(METODOS_PAGO, dtype=object)[rng.integers(0, len(METODOS_PAGO), size=total_pagos)],
+                "ultimos_4_digitos": np.array([f"{n:04d}" for n in rng.integers(0, 10000, size=total_pagos).tolist()], dtype=object),
+                "fecha_pago": fecha_reserva + rng.integers(60, 3600, size=total_pagos),
+                "codigo_transaccion": tokens_hex(rng, total_pagos, 8, prefijo="TXN-", mayusculas=True),
+            }
+            insertar_por_lotes(
+                cursor,
+                f"""INSERT INTO pagos (reserva_id, monto, metodo_pago, ultimos_4_digitos, estado, fecha_pago, codigo_transaccion)
+                    VALUES (?, ?, ?, ?, 'aprobado', {TIMESTAMP_SQL}, ?)""",
+                columnas(datos_pagos, ["reserva_id", "monto", "metodo_pago", "ultimos_4_digitos",
+                                       "fecha_pago", "codigo_transaccion"])
+            )
+        tiempos["pagos"] = time.perf_counter() - inicio
+        log(f"💳 {total_pagos} pagos ({tiempos['pagos']:.2f}s)")
+
+        cursor.execute("COMMIT")
+
+        # Índices diferidos: construirlos una vez sobre datos ya cargados es más barato
+        inicio = time.perf_counter()
+        hotel_booking_system.crear_indices(cursor)
+        # Las migraciones (triggers y tablas derivadas) también se aplican después de la carga
+        cursor.execute("BEGIN")
+        hotel_booking_system.aplicar_migraciones(cursor)
+        cursor.execute("COMMIT")
+        cursor.execute("ANALYZE")
+        tiempos["indices"] = time.perf_counter() - inicio
+        log(f"🗂️  Índices y estadísticas ({tiempos['indices']:.2f}s)")
+
+        cursor.execute("PRAGMA journal_mode = DELETE")
+    except Exception:
+        conn.close()
+        os.remove(temporal)
+        raise
+    conn.close()
+
+    # Un -wal que quedara de la base reemplazada se aplicaría sobre la nueva al abrirla
+    for sufijo in ("-wal", "-shm"):
+        try:
+            os.remove(salida + sufijo)
+        except FileNotFoundError:
+            pass
+    os.replace(temporal, salida)
+    tiempos["total"] = time.perf_counter() - inicio_total
+    log(f"✅ Base de datos generada: {salida} ({tiempos['total']:.2f}s)")
+    return tiempos
+
+# ==================== CLI ====================
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Generar una base de datos sintética de gran volumen")
+    parser.add_argument("--salida", default="hotel_booking.db")
+    parser.add_argument("--habitaciones", type=int, default=1_000)
+    parser.add_argument("--usuarios", type=int, default=10_000)
+    parser.add_argument("--sesiones", type=int, default=10_000)
+    parser.add_argument("--reservas", type=int, default=100_000)
+    parser.add_argument("--pagos", type=int, default=None,
+                        help="Pagos a generar (por defecto, uno por reserva confirmada)")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--forzar", action="store_true", help="Reemplazar la base de datos si ya existe")
+    args = parser.parse_args(argv)
+
+    try:
+        generar_base_datos(args.salida, args.habitaciones, args.usuarios, args.sesiones, args.reservas,
+                           args.pagos, args.semilla, args.forzar)
+    except (FileExistsError, ValueError) as e:
+        print(f"❌ {e}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Combinaciones de habitaciones para grupos
+
+Un grupo de 9 no cabe en ninguna habitación, pero sí en una suite y dos
+dobles. Elegir la combinación más barata (o con menos habitaciones) que
+sume al menos `huespedes` plazas es una mochila acotada de cobertura:
+
+- Las habitaciones libres con la misma capacidad y el mismo costo son
+  intercambiables y forman una clase con `m` unidades. En un hotel de miles
+  de habitaciones casi idénticas hay unas pocas decenas de clases.
+- Cada clase se descompone en paquetes de 1, 2, 4, ... unidades (división
+  binaria), así cualquier cantidad 0..m es suma de paquetes y la mochila
+  0/1 resultante tiene O(Σ log m) objetos en lugar de m.
+- dp[c] = costo mínimo para cubrir c plazas, con c truncado en `huespedes`
+  (sobrar plazas está permitido). Cada objeto se aplica vectorizado sobre
+  todo dp, y se guarda de dónde viene cada mejora para reconstruir la
+  combinación.
+
+El costo es un entero (ver `costos_combinacion`), así que no hay empates
+por redondeo.
+"""
+from typing import Optional
+
+import numpy as np
+
+INFINITO = np.iinfo(np.int64).max // 4
+
+# Peso de la cantidad de habitaciones frente a los centavos y viceversa
+_PESO_HABITACION_EN_PRECIO = 1 << 10
+_PESO_HABITACION_PRIORITARIA = 1 << 40
+
+def costos_combinacion(totales_centavos: np.ndarray, criterio: str) -> np.ndarray:
+    """
+    Costo entero por habitación según el criterio
+
+    - "precio": minimizar el total y, a igual total, usar menos habitaciones
+    - "habitaciones": minimizar las habitaciones y, a igual número, el total
+    """
+    totales_centavos = np.asarray(totales_centavos, dtype=np.int64)
+    if criterio == "habitaciones":
+        return totales_centavos + _PESO_HABITACION_PRIORITARIA
+    return totales_centavos * _PESO_HABITACION_EN_PRECIO + 1
+
+def combinacion_optima(capacidades: np.ndarray, costos: np.ndarray, huespedes: int) -> Optional[np.ndarray]:
+    """
+    Habitaciones de costo total mínimo cuya capacidad suma al menos `huespedes`
+
+    Args:
+        capacidades: Capacidad de cada habitación libre
+        costos: Costo entero (> 0) de cada habitación
+
+    Returns:
+        Índices (en los arreglos de entrada) de las habitaciones elegidas, o
+        None si ni todas juntas alcanzan
+    """
+    capacidades = np.asarray(capacidades, dtype=np.int64)
+    costos = np.asarray(costos, dtype=np.int64)
+    if huespedes <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if capacidades.sum() < huespedes:
+        return None
+
+    # Clases de habitaciones intercambiables y sus unidades
+    claves = np.stack([capacidades, costos], axis=1)
+    clases, clase_de, unidades = np.unique(claves, axis=0, return_inverse=True, return_counts=True)
+    clase_de = clase_de.ravel()
+
+    # División binaria: paquetes (clase, cantidad)
+    paquetes = []
+    for clase, disponibles in enumerate(unidades.tolist()):
+        cantidad = 1
+        while disponibles > 0:
+            tomar = min(cantidad, disponibles)
+            paquetes.append((clase, tomar))
+            disponibles -= tomar
+            cantidad *= 2
+
+    dp = np.full(huespedes + 1, INFINITO, dtype=np.int64)
+    dp[0] = 0
+    origenes = np.full((len(paquetes), huespedes + 1), -1, dtype=np.int32)
+    for i, (clase, cantidad) in enumerate(paquetes):
+        plazas = int(clases[clase, 0]) * cantidad
+        costo = int(clases[clase, 1]) * cantidad
+        candidato = np.where(dp < INFINITO, dp + costo, INFINITO)
+        nuevo = dp.copy()
+
+        # Destinos por debajo del tope: vienen exactamente de destino - plazas
+        destinos = np.arange(min(plazas, huespedes), huespedes)
+        if len(destinos):
+            mejora = candidato[destinos - plazas] < dp[destinos]
+            nuevo[destinos[mejora]] = candidato[destinos[mejora] - plazas]
+            origenes[i, destinos[mejora]] = destinos[mejora] - plazas
+        # El tope (todas las plazas cubiertas) acepta cualquier origen que llegue
+        primero = max(0, huespedes - plazas)
+        origen = primero + int(np.argmin(candidato[primero:]))
+        if candidato[origen] < dp[huespedes]:
+            nuevo[huespedes] = candidato[origen]
+            origenes[i, huespedes] = origen
+        dp = nuevo
+
+    if dp[huespedes] >= INFINITO:
+        return None
+
+    # Reconstrucción: de la última etapa a la primera
+    por_clase = np.zeros(len(clases), dtype=np.int64)
+    plazas_cubiertas = huespedes
+    for i in range(len(paquetes) - 1, -1, -1):
+        origen = origenes[i, plazas_cubiertas]
+        if origen >= 0:
+            por_clase[paquetes[i][0]] += paquetes[i][1]
+            plazas_cubiertas = int(origen)
+
+    # De cada clase, las primeras habitaciones en el orden de entrada
+    elegidas = []
+    for clase in np.flatnonzero(por_clase):
+        elegidas.append(np.flatnonzero(clase_de == clase)[:por_clase[clase]])
+    return np.sort(np.concatenate(elegidas))
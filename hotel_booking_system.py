@@ -1,16 +1,61 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, EmailStr, Field
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, TypeAdapter
 from datetime import datetime, date, timedelta
-from typing import Optional, List
+from typing import Optional, List, Literal
 import sqlite3
 import hashlib
 import secrets
+import base64
 import json
-from contextlib import contextmanager
+import os
+import asyncio
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from functools import lru_cache
+from operator import itemgetter
+from urllib.request import pathname2url
 
-app = FastAPI(title="Hotel Booking System", version="1.0.0")
+import httpx
+import numpy as np
+
+from arranque import abrir_estado, guardar_estado
+from campos import seleccionar_campos
+from fechas import a_dia, a_epoch, ahora_epoch, desde_dia, dia_hoy, sql_texto_a_dia, texto_dia
+from disponibilidad import alternativas
+from grupos import combinacion_optima, costos_combinacion
+from exportacion import FORMATOS, TABLAS_EXPORTABLES, crear_instantanea, exportar
+from importacion import FORMATOS_IMPORTACION, LectorRegistros, validar_lote
+from inventario import disponibilidad_tipos, reconstruir_inventario, registrar_noches, vendidas_maximas
+from negociacion import ConversorDocumentos, RespuestaNegociada, RutaNegociada, TIPO_MSGPACK, formato_respuesta
+from ocupacion import indicadores, reconstruir_ocupacion, registrar_ocupacion
+from pasarela_pagos import (ClientePasarela, ErrorPasarela, Pasarela, PasarelaInstantanea, PasarelaSimulada,
+                            ResultadoCobro)
+from proyecciones import (hay_eventos_pendientes, historial_usuario, proyectar, reconstruir_historial,
+                          sql_estado_reserva)
+from registro import configurar_registro, obtener_registro
+from suscripciones import IndiceSuscripciones, Suscripcion
+from tarifas import CalendarioTarifas, MotorTarifas, a_centavos
+from tokens_firmados import FirmadorTokens, RegistroRevocaciones, claves_revocacion
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+registro = obtener_registro(__name__)
+
+# JSON o MessagePack según Accept / Content-Type (ver negociacion.py)
+app = FastAPI(title="Hotel Booking System", version="1.0.0", default_response_class=RespuestaNegociada)
+app.router.route_class = RutaNegociada
 
 # Configurar CORS
 app.add_middleware(
@@ -36,18 +81,80 @@ class UserLogin(BaseModel):
     email: EmailStr
     password: str
 
+# Tamaño de página de /buscar cuando se pide orden o paginación sin `limite`
+LIMITE_BUSQUEDA_DEFECTO = 50
+LIMITE_BUSQUEDA_MAXIMO = 500
+# Búsquedas vacías: cuántas fechas alternativas proponer y a cuántos días como máximo
+ALTERNATIVAS_MAXIMAS = 3
+DIAS_FLEXIBLES_MAXIMO = 30
+
 class BusquedaHabitaciones(BaseModel):
     fecha_inicio: date
     fecha_fin: date
     tipo_habitacion: Optional[str] = None
     huespedes: Optional[int] = 1
+    # Precio por noche (promedio de la estancia, con tarifas aplicadas)
+    precio_min: Optional[float] = Field(default=None, ge=0)
+    precio_max: Optional[float] = Field(default=None, ge=0)
+    # Con orden, limite o cursor la respuesta se pagina (orden por defecto: precio)
+    orden: Optional[Literal["precio", "capacidad"]] = None
+    descendente: bool = False
+    limite: Optional[int] = Field(default=None, ge=1, le=LIMITE_BUSQUEDA_MAXIMO)
+    cursor: Optional[str] = None
+    # Si no hay resultados, proponer ventanas de la misma duración a ±N días
+    dias_flexibles: int = Field(default=0, ge=0, le=DIAS_FLEXIBLES_MAXIMO)
+
+# Elementos de las respuestas de /buscar y /mis-reservas: definen los campos que admite `fields=`
+class HabitacionDisponible(BaseModel):
+    id: int
+    numero: str
+    tipo: str
+    capacidad: int
+    precio_noche: float
+    precio_total: float
+    noches: int
+    descripcion: Optional[str] = None
+
+class HabitacionReservada(BaseModel):
+    numero: Optional[str] = None
+    tipo: Optional[str] = None
+    descripcion: Optional[str] = None
+
+class ReservaHistorial(BaseModel):
+    id: int
+    fecha_inicio: date
+    fecha_fin: date
+    huespedes: int
+    precio_total: float
+    estado: str
+    habitacion: HabitacionReservada
 
 class ReservaCreate(BaseModel):
-    habitacion_id: int
+    # Una habitación concreta o un tipo (se asigna la primera habitación libre)
+    habitacion_id: Optional[int] = None
+    tipo_habitacion: Optional[str] = None
     fecha_inicio: date
     fecha_fin: date
     huespedes: int
     
+# Reservas de grupo: varias habitaciones para un mismo grupo de huéspedes
+MAX_HUESPEDES_GRUPO = 100
+MAX_HABITACIONES_GRUPO = 50
+
+class BusquedaGrupo(BaseModel):
+    fecha_inicio: date
+    fecha_fin: date
+    huespedes: int = Field(ge=1, le=MAX_HUESPEDES_GRUPO)
+    tipo_habitacion: Optional[str] = None
+    # "precio": la combinación más barata; "habitaciones": la de menos habitaciones
+    criterio: Literal["precio", "habitaciones"] = "precio"
+
+class ReservaGrupoCreate(BaseModel):
+    habitacion_ids: List[int] = Field(min_length=1, max_length=MAX_HABITACIONES_GRUPO)
+    fecha_inicio: date
+    fecha_fin: date
+    huespedes: int = Field(ge=1, le=MAX_HUESPEDES_GRUPO)
+
 class PagoSimulado(BaseModel):
     reserva_id: int
     metodo_pago: str
@@ -55,13 +162,42 @@ class PagoSimulado(BaseModel):
     cvv: str
     nombre_titular: str
 
+class TarifaCreate(BaseModel):
+    nombre: str
+    fecha_inicio: date
+    fecha_fin: date
+    tipo: Optional[str] = None
+    habitacion_id: Optional[int] = None
+    precio_noche: Optional[float] = Field(default=None, gt=0)
+    multiplicador: Optional[float] = Field(default=None, gt=0)
+    prioridad: int = 0
+
+# Filas de /admin/importar/*; en NDJSON un número o un teléfono pueden llegar como número JSON
+class UsuarioImportado(UserRegister):
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+    activo: bool = True
+
+class HabitacionImportada(BaseModel):
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+    numero: str = Field(min_length=1)
+    tipo: str = Field(min_length=1)
+    capacidad: int = Field(ge=1)
+    precio_noche: float = Field(gt=0)
+    descripcion: Optional[str] = None
+    disponible: bool = True
+
 # ==================== BASE DE DATOS ====================
 
-DATABASE = "hotel_booking.db"
+DATABASE = os.environ.get("HOTEL_DATABASE", "hotel_booking.db")
+
+# Espera máxima ante el bloqueo de escritura de otro proceso/worker
+BUSY_TIMEOUT_SEGUNDOS = float(os.environ.get("HOTEL_BUSY_TIMEOUT", "5"))
+# Reintentos de una transacción de escritura que recibe SQLITE_BUSY
+REINTENTOS_ESCRITURA = int(os.environ.get("HOTEL_REINTENTOS_ESCRITURA", "5"))
 
 @contextmanager
 def get_db():
-    conn = sqlite3.connect(DATABASE)
+    conn = sqlite3.connect(DATABASE, timeout=BUSY_TIMEOUT_SEGUNDOS)
     conn.row_factory = sqlite3.Row
     try:
         yield conn
@@ -72,82 +208,668 @@ def get_db():
     finally:
         conn.close()
 
+# ==================== CONEXIONES DE SÓLO LECTURA ====================
+
+# Conexiones de lectura por worker; se dimensiona aparte del camino de escritura
+POOL_LECTURA_TAMANO = int(os.environ.get("HOTEL_POOL_LECTURA", "8"))
+
+def _en_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+class PoolLectura:
+    """
+    Pool de conexiones SQLite de sólo lectura
+
+    Las conexiones se abren con `mode=ro` y `PRAGMA query_only`, en modo
+    autocommit: nunca abren transacciones de escritura ni hacen commit, y en
+    WAL leen la última versión confirmada sin competir con el escritor.
+    """
+
+    def __init__(self, ruta: str, tamano: int):
+        self.ruta = ruta
+        self.tamano = tamano
+        self.libres = queue.LifoQueue()
+        self.creadas = 0
+        self.lock = threading.Lock()
+
+    def _abrir(self) -> sqlite3.Connection:
+        uri = f"file:{pathname2url(os.path.abspath(self.ruta))}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, timeout=BUSY_TIMEOUT_SEGUNDOS,
+                               isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA query_only = 1")
+        return conn
+
+    @contextmanager
+    def conexion(self):
+        try:
+            conn = self.libres.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                crear = self.creadas < self.tamano
+                if crear:
+                    self.creadas += 1
+            if crear:
+                conn = self._abrir()
+            else:
+                # En el event loop no se espera: las conexiones las tienen hilos de
+                # asyncio.to_thread y esperarlas aquí detendría todas las peticiones
+                espera = 0 if _en_event_loop() else BUSY_TIMEOUT_SEGUNDOS
+                try:
+                    conn = self.libres.get(timeout=espera) if espera else self.libres.get_nowait()
+                except queue.Empty:
+                    raise HTTPException(status_code=503, detail="Servidor ocupado, intenta de nuevo")
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self.libres.put(conn)
+
+    def calentar(self, preparar):
+        """
+        Abrir las conexiones que faltan hasta `tamano` y pasar cada una por `preparar(conn)`
+
+        Cada conexión tiene su propia caché de sentencias compiladas y su
+        caché de páginas: `preparar` ejecuta en ella las consultas frecuentes.
+        """
+        with self.lock:
+            nuevas = self.tamano - self.creadas
+            self.creadas = self.tamano
+        conexiones = []
+        try:
+            for _ in range(nuevas):
+                conexiones.append(self._abrir())
+            for conn in conexiones:
+                preparar(conn)
+        finally:
+            with self.lock:
+                self.creadas -= nuevas - len(conexiones)
+            for conn in conexiones:
+                self.libres.put(conn)
+
+    def cerrar(self):
+        while True:
+            try:
+                self.libres.get_nowait().close()
+            except queue.Empty:
+                break
+        self.creadas = 0
+
+_pool_lectura: Optional[PoolLectura] = None
+
+def pool_lectura() -> PoolLectura:
+    global _pool_lectura
+    if _pool_lectura is None or _pool_lectura.ruta != DATABASE:
+        if _pool_lectura is not None:
+            _pool_lectura.cerrar()
+        _pool_lectura = PoolLectura(DATABASE, POOL_LECTURA_TAMANO)
+    return _pool_lectura
+
+@contextmanager
+def get_db_lectura():
+    """Conexión de sólo lectura del pool (sin commit)"""
+    with pool_lectura().conexion() as conn:
+        yield conn
+
+ESQUEMA_TABLAS = [
+    # Tabla 1: Usuarios
+    """
+    CREATE TABLE IF NOT EXISTS usuarios (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        nombre TEXT NOT NULL,
+        apellido TEXT NOT NULL,
+        telefono TEXT,
+        fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        activo BOOLEAN DEFAULT 1
+    )
+    """,
+    # Tabla 2: Sesiones
+    """
+    CREATE TABLE IF NOT EXISTS sesiones (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL,
+        token TEXT UNIQUE NOT NULL,
+        fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        fecha_expiracion INTEGER NOT NULL,  -- segundos epoch (UTC)
+        activa BOOLEAN DEFAULT 1,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios(id)
+    )
+    """,
+    # Tabla 3: Habitaciones
+    """
+    CREATE TABLE IF NOT EXISTS habitaciones (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        numero TEXT UNIQUE NOT NULL,
+        tipo TEXT NOT NULL,
+        capacidad INTEGER NOT NULL,
+        precio_noche REAL NOT NULL,
+        descripcion TEXT,
+        disponible BOOLEAN DEFAULT 1
+    )
+    """,
+    # Tabla 4: Reservas
+    """
+    CREATE TABLE IF NOT EXISTS reservas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL,
+        habitacion_id INTEGER NOT NULL,
+        fecha_inicio INTEGER NOT NULL,  -- número de día desde 1970-01-01 (ver fechas.py)
+        fecha_fin INTEGER NOT NULL,
+        huespedes INTEGER NOT NULL,
+        precio_total REAL NOT NULL,
+        estado TEXT DEFAULT 'pendiente',
+        fecha_reserva TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios(id),
+        FOREIGN KEY (habitacion_id) REFERENCES habitaciones(id)
+    )
+    """,
+    # Tabla 5: Pagos
+    """
+    CREATE TABLE IF NOT EXISTS pagos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        reserva_id INTEGER NOT NULL,
+        monto REAL NOT NULL,
+        metodo_pago TEXT NOT NULL,
+        ultimos_4_digitos TEXT,
+        estado TEXT DEFAULT 'procesando',
+        fecha_pago TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        codigo_transaccion TEXT UNIQUE,
+        FOREIGN KEY (reserva_id) REFERENCES reservas(id)
+    )
+    """,
+]
+
+# Centavos de precio_noche como `a_centavos` (round de Python: a medio centavo exacto, al par).
+# La ruta SQL de /buscar paginado ordena, filtra y compara el cursor con esta clave, la misma
+# que usa el calendario de tarifas para los totales
+CENTAVOS_PRECIO_SQL = (
+    "(CAST(ROUND(precio_noche * 100) AS INTEGER)"
+    " - (precio_noche * 100 - CAST(precio_noche * 100 AS INTEGER) = 0.5"
+    " AND CAST(ROUND(precio_noche * 100) AS INTEGER) % 2 = 1))"
+)
+
+# Índices secundarios: se crean aparte para que la carga masiva pueda diferirlos
+ESQUEMA_INDICES = [
+    "CREATE INDEX IF NOT EXISTS idx_reservas_habitacion ON reservas(habitacion_id, fecha_inicio, fecha_fin)",
+    "CREATE INDEX IF NOT EXISTS idx_reservas_usuario ON reservas(usuario_id, fecha_reserva)",
+    "CREATE INDEX IF NOT EXISTS idx_sesiones_usuario ON sesiones(usuario_id)",
+    "CREATE INDEX IF NOT EXISTS idx_pagos_reserva ON pagos(reserva_id)",
+    # Recorridos ordenados de /buscar paginado: con LIMIT, SQLite se detiene tras la página
+    f"CREATE INDEX IF NOT EXISTS idx_habitaciones_centavos ON habitaciones(disponible, {CENTAVOS_PRECIO_SQL})",
+    "CREATE INDEX IF NOT EXISTS idx_habitaciones_capacidad ON habitaciones(disponible, capacidad)",
+]
+
+def crear_tablas(cursor):
+    for sentencia in ESQUEMA_TABLAS:
+        cursor.execute(sentencia)
+
+def crear_indices(cursor):
+    for sentencia in ESQUEMA_INDICES:
+        cursor.execute(sentencia)
+
+# ==================== MIGRACIONES ====================
+
+def _migracion_version_datos(cursor):
+    """
+    Contador global de versión de datos
+
+    Cada cambio en habitaciones o reservas incrementa `version_datos.version`.
+    Los workers comparan ese número con el de sus cachés en memoria para
+    invalidarlas aunque el cambio lo haya hecho otro proceso.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS version_datos (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO version_datos (id, version) VALUES (1, 0)")
+    for tabla in ("habitaciones", "reservas"):
+        for evento in ("INSERT", "UPDATE", "DELETE"):
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_version_{tabla}_{evento.lower()}
+                AFTER {evento} ON {tabla}
+                BEGIN
+                    UPDATE version_datos SET version = version + 1 WHERE id = 1;
+                END
+            """)
+
+def _migracion_tarifas(cursor):
+    """
+    Calendario de tarifas: temporadas y excepciones por tipo o por habitación
+
+    Cada regla cubre [fecha_inicio, fecha_fin) y fija un `precio_noche` o
+    aplica un `multiplicador` al precio base de la habitación. Además se añade
+    `version_catalogo`, que sólo cambia con habitaciones o tarifas, para no
+    reconstruir el calendario con cada reserva.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS tarifas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT NOT NULL,
+            habitacion_id INTEGER,
+            tipo TEXT,
+            fecha_inicio DATE NOT NULL,
+            fecha_fin DATE NOT NULL,
+            precio_noche REAL,
+            multiplicador REAL,
+            prioridad INTEGER DEFAULT 0,
+            FOREIGN KEY (habitacion_id) REFERENCES habitaciones(id)
+        )
+    """)
+    cursor.execute("ALTER TABLE version_datos ADD COLUMN version_catalogo INTEGER NOT NULL DEFAULT 0")
+    for tabla in ("habitaciones", "tarifas"):
+        for evento in ("INSERT", "UPDATE", "DELETE"):
+            # Las tarifas también cambian los precios de /buscar: incrementan ambas versiones
+            incremento_general = ", version = version + 1" if tabla == "tarifas" else ""
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_catalogo_{tabla}_{evento.lower()}
+                AFTER {evento} ON {tabla}
+                BEGIN
+                    UPDATE version_datos SET version_catalogo = version_catalogo + 1{incremento_general} WHERE id = 1;
+                END
+            """)
+
+def _migracion_inventario_tipo(cursor):
+    """
+    Habitaciones vendidas por tipo y noche (ver inventario.py)
+
+    La tabla se mantiene en las mismas transacciones que crean o cancelan
+    reservas. Se rellena a partir de las reservas existentes en
+    `_migracion_fechas_enteras`, cuando las fechas ya son números de día.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS inventario_tipo (
+            tipo TEXT NOT NULL,
+            fecha DATE NOT NULL,
+            vendidas INTEGER NOT NULL,
+            PRIMARY KEY (tipo, fecha)
+        ) WITHOUT ROWID
+    """)
+
+def _migracion_ocupacion_diaria(cursor):
+    """
+    Agregado diario de ocupación e ingresos por tipo (ver ocupacion.py)
+
+    Se mantiene al crear, pagar y cancelar reservas. Como el inventario, se
+    rellena en `_migracion_fechas_enteras`.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ocupacion_diaria (
+            fecha DATE NOT NULL,
+            tipo TEXT NOT NULL,
+            vendidas INTEGER NOT NULL DEFAULT 0,
+            confirmadas INTEGER NOT NULL DEFAULT 0,
+            ingresos INTEGER NOT NULL DEFAULT 0,
+            ingresos_confirmados INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (fecha, tipo)
+        ) WITHOUT ROWID
+    """)
+
+def _migracion_fechas_enteras(cursor):
+    """
+    Fechas de estancia como número de día y vencimientos de sesión como epoch
+
+    SQLite no cambia el tipo declarado de una columna sin reconstruir la tabla,
+    pero tampoco lo necesita: DATE y TIMESTAMP tienen afinidad NUMERIC y
+    guardan enteros como enteros. Se convierten los valores en su sitio (sólo
+    los que aún son texto) y el esquema base ya declara INTEGER para las
+    bases de datos nuevas. Los vencimientos se interpretan en UTC, igual que
+    la comparación anterior con datetime('now').
+
+    Las tablas derivadas (inventario y ocupación) se recalculan al final desde
+    las reservas ya convertidas.
+    """
+    for tabla in ("reservas", "tarifas"):
+        cursor.execute(f"""
+            UPDATE {tabla}
+            SET fecha_inicio = {sql_texto_a_dia("fecha_inicio")}, fecha_fin = {sql_texto_a_dia("fecha_fin")}
+            WHERE typeof(fecha_inicio) = 'text'
+        """)
+    cursor.execute("""
+        UPDATE sesiones SET fecha_expiracion = CAST(strftime('%s', fecha_expiracion) AS INTEGER)
+        WHERE typeof(fecha_expiracion) = 'text'
+    """)
+    reconstruir_inventario(cursor)
+    reconstruir_ocupacion(cursor)
+
+# Estados que ocupan la habitación; sólo esas reservas se reflejan en el R*Tree
+ESTADOS_ACTIVOS_SQL = "('confirmada', 'pendiente')"
+
+def _migracion_intervalos_reservas(cursor):
+    """
+    Índice R*Tree de los intervalos de las reservas activas
+
+    Una B-tree no resuelve bien "fecha_inicio < fin AND fecha_fin > inicio":
+    sólo puede acotar una de las dos columnas. `reservas_intervalos` refleja
+    cada reserva pendiente o confirmada como un rectángulo con la habitación
+    en una dimensión y [fecha_inicio, fecha_fin] en la otra, así que tanto
+    "¿qué habitaciones están ocupadas en estas fechas?" como "¿está libre la
+    habitación X?" son consultas de rango sobre el árbol.
+
+    Los triggers lo mantienen en la misma transacción al insertar, borrar,
+    cambiar de estado, de habitación (reasignación nocturna) o de fechas.
+    """
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS reservas_intervalos USING rtree_i32(
+            id,                                 -- reservas.id
+            habitacion_min, habitacion_max,     -- la habitación (un punto)
+            fecha_inicio, fecha_fin             -- números de día, fin excluido al consultar
+        )
+    """)
+    cursor.execute(f"""
+        INSERT INTO reservas_intervalos (id, habitacion_min, habitacion_max, fecha_inicio, fecha_fin)
+        SELECT id, habitacion_id, habitacion_id, fecha_inicio, fecha_fin
+        FROM reservas WHERE estado IN {ESTADOS_ACTIVOS_SQL}
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_intervalos_insert
+        AFTER INSERT ON reservas
+        WHEN NEW.estado IN {ESTADOS_ACTIVOS_SQL}
+        BEGIN
+            INSERT INTO reservas_intervalos (id, habitacion_min, habitacion_max, fecha_inicio, fecha_fin)
+            VALUES (NEW.id, NEW.habitacion_id, NEW.habitacion_id, NEW.fecha_inicio, NEW.fecha_fin);
+        END
+    """)
+    # Pagar (pendiente → confirmada) no cambia el intervalo: no toca el árbol
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_intervalos_update
+        AFTER UPDATE OF estado, habitacion_id, fecha_inicio, fecha_fin ON reservas
+        WHEN (OLD.estado IN {ESTADOS_ACTIVOS_SQL}) IS NOT (NEW.estado IN {ESTADOS_ACTIVOS_SQL})
+          OR OLD.habitacion_id IS NOT NEW.habitacion_id
+          OR OLD.fecha_inicio IS NOT NEW.fecha_inicio
+          OR OLD.fecha_fin IS NOT NEW.fecha_fin
+        BEGIN
+            DELETE FROM reservas_intervalos WHERE id = OLD.id;
+            INSERT INTO reservas_intervalos (id, habitacion_min, habitacion_max, fecha_inicio, fecha_fin)
+            SELECT NEW.id, NEW.habitacion_id, NEW.habitacion_id, NEW.fecha_inicio, NEW.fecha_fin
+            WHERE NEW.estado IN {ESTADOS_ACTIVOS_SQL};
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_intervalos_delete
+        AFTER DELETE ON reservas
+        BEGIN
+            DELETE FROM reservas_intervalos WHERE id = OLD.id;
+        END
+    """)
+
+# Validez de un token de sesión (opaco o firmado)
+DURACION_SESION = timedelta(days=7)
+
+def _migracion_revocaciones(cursor):
+    """
+    Revocaciones de tokens firmados y secreto compartido (ver tokens_firmados.py)
+
+    `revocaciones` guarda `jti:<jti>` (logout) y `usuario:<id>` (usuario
+    desactivado) hasta que vencen los tokens afectados. Desactivar un usuario
+    lo revoca desde un trigger, venga el UPDATE de donde venga; reactivarlo
+    borra la revocación. `configuracion` guarda un secreto de firma generado
+    aquí para que todos los workers firmen igual si no se define
+    HOTEL_SECRETO_TOKENS.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS revocaciones (
+            clave TEXT PRIMARY KEY,
+            expira INTEGER NOT NULL  -- segundos epoch (UTC)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS configuracion (
+            clave TEXT PRIMARY KEY,
+            valor TEXT NOT NULL
+        )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO configuracion (clave, valor) VALUES ('secreto_tokens', ?)",
+                   (secrets.token_hex(32),))
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_revocar_usuario
+        AFTER UPDATE OF activo ON usuarios
+        WHEN NEW.activo = 0 AND OLD.activo IS NOT 0
+        BEGIN
+            INSERT OR REPLACE INTO revocaciones (clave, expira)
+            VALUES ('usuario:' || NEW.id, CAST(strftime('%s', 'now') AS INTEGER) + {int(DURACION_SESION.total_seconds())});
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_rehabilitar_usuario
+        AFTER UPDATE OF activo ON usuarios
+        WHEN NEW.activo = 1 AND OLD.activo IS NOT 1
+        BEGIN
+            DELETE FROM revocaciones WHERE clave = 'usuario:' || NEW.id;
+        END
+    """)
+
+def _migracion_eventos(cursor):
+    """
+    Registro de eventos y modelo de lectura del historial (ver proyecciones.py)
+
+    Los triggers publican en `eventos` cada cambio de reservas y pagos, y los
+    cambios de habitaciones que se ven en el historial, en la misma
+    transacción que el cambio. `historial_reservas` se rellena aquí desde las
+    reservas existentes.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS eventos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tipo TEXT NOT NULL,
+            usuario_id INTEGER,        -- NULL en eventos de catálogo
+            reserva_id INTEGER,
+            datos TEXT NOT NULL,       -- JSON
+            fecha INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER))  -- segundos epoch (UTC)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_eventos_usuario ON eventos(usuario_id, id)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS proyecciones (
+            nombre TEXT PRIMARY KEY,
+            posicion INTEGER NOT NULL  -- último eventos.id aplicado
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS historial_reservas (
+            usuario_id INTEGER NOT NULL,
+            fecha_reserva TIMESTAMP,
+            reserva_id INTEGER NOT NULL,
+            habitacion_id INTEGER,
+            documento TEXT NOT NULL,  -- elemento de /mis-reservas en JSON
+            PRIMARY KEY (usuario_id, fecha_reserva, reserva_id)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_historial_habitacion ON historial_reservas(habitacion_id)")
+    
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_eventos_reserva_insert
+        AFTER INSERT ON reservas
+        BEGIN
+            INSERT INTO eventos (tipo, usuario_id, reserva_id, datos)
+            VALUES ('reserva_creada', NEW.usuario_id, NEW.id, {sql_estado_reserva("NEW")});
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_eventos_reserva_update
+        AFTER UPDATE OF estado, habitacion_id, fecha_inicio, fecha_fin, huespedes, precio_total ON reservas
+        WHEN OLD.estado IS NOT NEW.estado
+          OR OLD.habitacion_id IS NOT NEW.habitacion_id
+          OR OLD.fecha_inicio IS NOT NEW.fecha_inicio
+          OR OLD.fecha_fin IS NOT NEW.fecha_fin
+          OR OLD.huespedes IS NOT NEW.huespedes
+          OR OLD.precio_total IS NOT NEW.precio_total
+        BEGIN
+            INSERT INTO eventos (tipo, usuario_id, reserva_id, datos)
+            VALUES (
+                CASE WHEN OLD.estado IS NOT NEW.estado THEN 'reserva_' || NEW.estado ELSE 'reserva_modificada' END,
+                NEW.usuario_id, NEW.id, {sql_estado_reserva("NEW")}
+            );
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_eventos_reserva_delete
+        AFTER DELETE ON reservas
+        BEGIN
+            INSERT INTO eventos (tipo, usuario_id, reserva_id, datos)
+            VALUES ('reserva_eliminada', OLD.usuario_id, OLD.id,
+                    json_object('usuario_id', OLD.usuario_id, 'reserva_id', OLD.id));
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_eventos_pago_insert
+        AFTER INSERT ON pagos
+        BEGIN
+            INSERT INTO eventos (tipo, usuario_id, reserva_id, datos)
+            VALUES ('pago_registrado', (SELECT usuario_id FROM reservas WHERE id = NEW.reserva_id), NEW.reserva_id,
+                    json_object('pago_id', NEW.id, 'reserva_id', NEW.reserva_id, 'monto', NEW.monto,
+                                'metodo_pago', NEW.metodo_pago, 'estado', NEW.estado,
+                                'codigo_transaccion', NEW.codigo_transaccion));
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_eventos_habitacion_update
+        AFTER UPDATE OF numero, tipo, descripcion ON habitaciones
+        WHEN OLD.numero IS NOT NEW.numero OR OLD.tipo IS NOT NEW.tipo OR OLD.descripcion IS NOT NEW.descripcion
+        BEGIN
+            INSERT INTO eventos (tipo, datos)
+            VALUES ('habitacion_modificada',
+                    json_object('habitacion_id', NEW.id, 'numero', NEW.numero, 'tipo', NEW.tipo,
+                                'descripcion', NEW.descripcion));
+        END
+    """)
+    reconstruir_historial(cursor)
+
+def _migracion_pagos_asincronos(cursor):
+    """
+    Cobros en segundo plano (ver pasarela_pagos.py)
+
+    Un pago nace 'procesando' y termina 'aprobado', 'rechazado', 'error' o
+    'anulado'; `motivo` explica los tres últimos. Cada cambio de estado se
+    publica como evento `pago_actualizado`.
+    """
+    cursor.execute("ALTER TABLE pagos ADD COLUMN motivo TEXT")
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_eventos_pago_update
+        AFTER UPDATE OF estado ON pagos
+        WHEN OLD.estado IS NOT NEW.estado
+        BEGIN
+            INSERT INTO eventos (tipo, usuario_id, reserva_id, datos)
+            VALUES ('pago_actualizado', (SELECT usuario_id FROM reservas WHERE id = NEW.reserva_id), NEW.reserva_id,
+                    json_object('pago_id', NEW.id, 'reserva_id', NEW.reserva_id, 'estado', NEW.estado,
+                                'codigo_transaccion', NEW.codigo_transaccion, 'motivo', NEW.motivo));
+        END
+    """)
+
+def _migracion_eventos_intervalo_anterior(cursor):
+    """
+    `reserva_modificada` con el intervalo anterior
+
+    Si una reserva cambia de habitación o de fechas, el evento lleva en
+    `anterior` la habitación y las fechas que tenía: las noches que deja
+    libres también cambian la disponibilidad (ver DifusorDisponibilidad).
+    """
+    cursor.execute("DROP TRIGGER IF EXISTS trg_eventos_reserva_update")
+    cursor.execute(f"""
+        CREATE TRIGGER trg_eventos_reserva_update
+        AFTER UPDATE OF estado, habitacion_id, fecha_inicio, fecha_fin, huespedes, precio_total ON reservas
+        WHEN OLD.estado IS NOT NEW.estado
+          OR OLD.habitacion_id IS NOT NEW.habitacion_id
+          OR OLD.fecha_inicio IS NOT NEW.fecha_inicio
+          OR OLD.fecha_fin IS NOT NEW.fecha_fin
+          OR OLD.huespedes IS NOT NEW.huespedes
+          OR OLD.precio_total IS NOT NEW.precio_total
+        BEGIN
+            INSERT INTO eventos (tipo, usuario_id, reserva_id, datos)
+            VALUES (
+                CASE WHEN OLD.estado IS NOT NEW.estado THEN 'reserva_' || NEW.estado ELSE 'reserva_modificada' END,
+                NEW.usuario_id, NEW.id,
+                CASE WHEN OLD.habitacion_id IS NOT NEW.habitacion_id
+                       OR OLD.fecha_inicio IS NOT NEW.fecha_inicio
+                       OR OLD.fecha_fin IS NOT NEW.fecha_fin
+                     THEN json_set({sql_estado_reserva("NEW")}, '$.anterior', json_object(
+                         'habitacion_id', OLD.habitacion_id, 'fecha_inicio', OLD.fecha_inicio,
+                         'fecha_fin', OLD.fecha_fin))
+                     ELSE {sql_estado_reserva("NEW")}
+                END
+            );
+        END
+    """)
+
+def _migracion_indice_precio_centavos(cursor):
+    """
+    Índice de /buscar paginado por precio en centavos
+
+    La ruta SQL ordena por `CENTAVOS_PRECIO_SQL` (ver crear_indices); el índice
+    sobre el precio sin redondear ya no sirve para ese recorrido.
+    """
+    cursor.execute("DROP INDEX IF EXISTS idx_habitaciones_precio")
+
+# La posición en la lista es el número de versión (PRAGMA user_version)
+MIGRACIONES = [
+    _migracion_version_datos,
+    _migracion_tarifas,
+    _migracion_inventario_tipo,
+    _migracion_ocupacion_diaria,
+    _migracion_fechas_enteras,
+    _migracion_intervalos_reservas,
+    _migracion_revocaciones,
+    _migracion_eventos,
+    _migracion_pagos_asincronos,
+    _migracion_eventos_intervalo_anterior,
+    _migracion_indice_precio_centavos,
+]
+
+def aplicar_migraciones(cursor):
+    """Aplicar en orden las migraciones pendientes según PRAGMA user_version"""
+    version_actual = cursor.execute("PRAGMA user_version").fetchone()[0]
+    for numero, migracion in enumerate(MIGRACIONES, start=1):
+        if numero > version_actual:
+            migracion(cursor)
+            cursor.execute(f"PRAGMA user_version = {numero}")
+
+@contextmanager
+def bloqueo_archivo(ruta: str):
+    """Bloqueo exclusivo entre procesos sobre un archivo auxiliar"""
+    with open(ruta, "a+b") as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
 def init_database():
-    """Inicializar base de datos con 5 tablas relacionadas"""
-    with get_db() as conn:
+    """
+    Inicializar base de datos con 5 tablas relacionadas
+
+    Con varios workers (`uvicorn ... --workers N`) todos llaman a esta función
+    al arrancar: un bloqueo de archivo garantiza que sólo uno a la vez crea el
+    esquema y aplica migraciones; los demás encuentran el trabajo hecho.
+    """
+    with bloqueo_archivo(DATABASE + ".lock"), get_db() as conn:
+        # WAL: los lectores no bloquean al escritor ni viceversa (persistente en el archivo)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("BEGIN IMMEDIATE")
         cursor = conn.cursor()
-        
-        # Tabla 1: Usuarios
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS usuarios (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                nombre TEXT NOT NULL,
-                apellido TEXT NOT NULL,
-                telefono TEXT,
-                fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                activo BOOLEAN DEFAULT 1
-            )
-        """)
-        
-        # Tabla 2: Sesiones
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS sesiones (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                usuario_id INTEGER NOT NULL,
-                token TEXT UNIQUE NOT NULL,
-                fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                fecha_expiracion TIMESTAMP NOT NULL,
-                activa BOOLEAN DEFAULT 1,
-                FOREIGN KEY (usuario_id) REFERENCES usuarios(id)
-            )
-        """)
-        
-        # Tabla 3: Habitaciones
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS habitaciones (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                numero TEXT UNIQUE NOT NULL,
-                tipo TEXT NOT NULL,
-                capacidad INTEGER NOT NULL,
-                precio_noche REAL NOT NULL,
-                descripcion TEXT,
-                disponible BOOLEAN DEFAULT 1
-            )
-        """)
-        
-        # Tabla 4: Reservas
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS reservas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                usuario_id INTEGER NOT NULL,
-                habitacion_id INTEGER NOT NULL,
-                fecha_inicio DATE NOT NULL,
-                fecha_fin DATE NOT NULL,
-                huespedes INTEGER NOT NULL,
-                precio_total REAL NOT NULL,
-                estado TEXT DEFAULT 'pendiente',
-                fecha_reserva TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (usuario_id) REFERENCES usuarios(id),
-                FOREIGN KEY (habitacion_id) REFERENCES habitaciones(id)
-            )
-        """)
-        
-        # Tabla 5: Pagos
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS pagos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                reserva_id INTEGER NOT NULL,
-                monto REAL NOT NULL,
-                metodo_pago TEXT NOT NULL,
-                ultimos_4_digitos TEXT,
-                estado TEXT DEFAULT 'procesando',
-                fecha_pago TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                codigo_transaccion TEXT UNIQUE,
-                FOREIGN KEY (reserva_id) REFERENCES reservas(id)
-            )
-        """)
+        crear_tablas(cursor)
+        crear_indices(cursor)
+        aplicar_migraciones(cursor)
         
         # Insertar habitaciones de ejemplo si no existen
         cursor.execute("SELECT COUNT(*) FROM habitaciones")
@@ -169,6 +891,269 @@ def init_database():
                 habitaciones_ejemplo
             )
 
+def es_error_bloqueo(error: sqlite3.OperationalError) -> bool:
+    mensaje = str(error).lower()
+    return "database is locked" in mensaje or "database is busy" in mensaje
+
+def ejecutar_escritura(operacion, *args):
+    """
+    Ejecutar `operacion(cursor, *args)` en una transacción de escritura
+
+    La transacción se abre con BEGIN IMMEDIATE para tomar el bloqueo de
+    escritura desde el principio. Si otro worker lo retiene más allá del
+    busy timeout, la operación completa se reintenta con espera exponencial.
+
+    Bloquea el hilo mientras espera (busy timeout y reintentos): desde el
+    event loop se llama con `await asyncio.to_thread(ejecutar_escritura, ...)`.
+    """
+    for intento in range(REINTENTOS_ESCRITURA + 1):
+        try:
+            with get_db() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                return operacion(conn.cursor(), *args)
+        except sqlite3.OperationalError as e:
+            if not es_error_bloqueo(e) or intento == REINTENTOS_ESCRITURA:
+                raise
+            registro.debug("Escritura reintentada tras bloqueo", extra={
+                "evento": "escritura_reintentada", "operacion": operacion.__name__, "intento": intento + 1
+            })
+            time.sleep(random.uniform(0, 0.01 * 2 ** intento))
+
+# ==================== ESCRITURA AGRUPADA (GROUP COMMIT) ====================
+
+# Con HOTEL_ESCRITURA_AGRUPADA=1 las reservas y pagos concurrentes comparten transacción
+ESCRITURA_AGRUPADA = os.environ.get("HOTEL_ESCRITURA_AGRUPADA", "0") == "1"
+VENTANA_AGRUPACION_MS = float(os.environ.get("HOTEL_VENTANA_ESCRITURA_MS", "2"))
+MAX_LOTE_ESCRITURA = int(os.environ.get("HOTEL_MAX_LOTE_ESCRITURA", "256"))
+
+class ColaEscritura:
+    """
+    Escritor único que aplica por lotes las operaciones de varias peticiones
+
+    Cada petición encola su operación y espera un futuro. El escritor junta
+    lo que llega durante unos milisegundos y lo aplica en una sola transacción
+    (un solo fsync), con un SAVEPOINT por operación: si una falla (409, 404,
+    ...) sólo se deshace la suya y su petición recibe la misma excepción que
+    recibiría sin agrupar. Las operaciones del lote se ejecutan en orden, así
+    que cada una ve las escrituras de las anteriores.
+    """
+
+    def __init__(self, ventana_ms: float = VENTANA_AGRUPACION_MS, max_lote: int = MAX_LOTE_ESCRITURA):
+        self.ventana = ventana_ms / 1000
+        self.max_lote = max_lote
+        self.cola: Optional[asyncio.Queue] = None
+        self.tarea: Optional[asyncio.Task] = None
+        self.loop = None
+        # Lote que se está aplicando (para resolverlo si el escritor se cancela a medias)
+        self.lote = []
+        # Un solo hilo: la transacción no bloquea el event loop mientras se forma el siguiente lote
+        self.ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="escritor")
+
+    async def enviar(self, operacion, *args):
+        loop = asyncio.get_running_loop()
+        if self.tarea is None or self.tarea.done() or self.loop is not loop:
+            self.loop = loop
+            self.cola = asyncio.Queue()
+            self.tarea = loop.create_task(self._escritor())
+        futuro = loop.create_future()
+        self.cola.put_nowait((operacion, args, futuro))
+        return await futuro
+
+    async def _escritor(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # None es la marca de fin de `detener`: se aplica lo encolado antes y se termina
+            primero = await self.cola.get()
+            if primero is None:
+                return
+            lote, terminar = [primero], False
+            await asyncio.sleep(self.ventana)
+            while len(lote) < self.max_lote and not self.cola.empty():
+                item = self.cola.get_nowait()
+                if item is None:
+                    terminar = True
+                    break
+                lote.append(item)
+
+            lote = [item for item in lote if not item[2].cancelled()]
+            self.lote = lote
+            try:
+                resultados = await loop.run_in_executor(self.ejecutor, self._aplicar, lote)
+            except Exception as e:
+                resultados = [(False, e)] * len(lote)
+
+            for (_, _, futuro), (exito, valor) in zip(lote, resultados):
+                if futuro.done():
+                    continue
+                if exito:
+                    futuro.set_result(valor)
+                else:
+                    futuro.set_exception(valor)
+            self.lote = []
+            if terminar:
+                return
+
+    def _aplicar(self, lote):
+        """Aplicar el lote en una transacción; se reintenta completo ante SQLITE_BUSY"""
+        for intento in range(REINTENTOS_ESCRITURA + 1):
+            resultados = []
+            try:
+                with get_db() as conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    cursor = conn.cursor()
+                    for operacion, args, _ in lote:
+                        cursor.execute("SAVEPOINT operacion")
+                        try:
+                            resultados.append((True, operacion(cursor, *args)))
+                        except Exception as e:
+                            cursor.execute("ROLLBACK TO operacion")
+                            resultados.append((False, e))
+                        cursor.execute("RELEASE operacion")
+                return resultados
+            except sqlite3.OperationalError as e:
+                if not es_error_bloqueo(e) or intento == REINTENTOS_ESCRITURA:
+                    raise
+                time.sleep(random.uniform(0, 0.01 * 2 ** intento))
+
+    async def detener(self, espera: float = BUSY_TIMEOUT_SEGUNDOS):
+        """
+        Aplicar lo ya encolado (como mucho `espera` segundos) y parar
+
+        Si el escritor no termina a tiempo se cancela, y las peticiones que
+        aún esperan reciben un error en lugar de quedarse colgadas.
+        """
+        if self.tarea is not None and not self.tarea.done() and self.loop is asyncio.get_running_loop():
+            self.cola.put_nowait(None)
+            await asyncio.wait({self.tarea}, timeout=espera)
+            if not self.tarea.done():
+                self.tarea.cancel()
+                try:
+                    await self.tarea
+                except asyncio.CancelledError:
+                    pass
+            pendientes = list(self.lote)
+            while not self.cola.empty():
+                pendientes.append(self.cola.get_nowait())
+            for item in pendientes:
+                if item is not None and not item[2].done():
+                    item[2].set_exception(RuntimeError("cola de escritura detenida"))
+        self.lote = []
+        self.tarea = None
+
+cola_escritura = ColaEscritura()
+
+async def ejecutar_escritura_agrupable(operacion, *args):
+    """Pasar la operación por la cola de group commit si está activada"""
+    if ESCRITURA_AGRUPADA:
+        return await cola_escritura.enviar(operacion, *args)
+    return await asyncio.to_thread(ejecutar_escritura, operacion, *args)
+
+# ==================== CACHÉ ====================
+
+def leer_version_datos(cursor) -> int:
+    cursor.execute("SELECT version FROM version_datos WHERE id = 1")
+    return cursor.fetchone()[0]
+
+def leer_version_catalogo(cursor) -> int:
+    cursor.execute("SELECT version_catalogo FROM version_datos WHERE id = 1")
+    return cursor.fetchone()[0]
+
+class CacheVersionada:
+    """
+    Caché LRU en memoria del proceso invalidada por `version_datos`
+
+    Antes de cada consulta se lee el contador de la base de datos; si otro
+    worker (u otro endpoint) cambió habitaciones o reservas, la caché se vacía.
+    Con `leer_version=leer_version_catalogo` sólo la invalidan los cambios
+    de habitaciones y tarifas.
+
+    Se usa desde el event loop y desde hilos de `asyncio.to_thread`: el lock
+    protege la versión y el diccionario, pero `calcular()` corre fuera de él.
+    """
+
+    def __init__(self, max_entradas: int = 1024, leer_version=leer_version_datos):
+        self.max_entradas = max_entradas
+        self.leer_version = leer_version
+        self.version = None
+        self.entradas = OrderedDict()
+        self.lock = threading.Lock()
+
+    def obtener(self, cursor, clave, calcular):
+        # La versión se lee antes de calcular: un cambio concurrente invalida en la próxima lectura.
+        # Incluye la ruta: dos bases de datos distintas pueden tener el mismo contador.
+        version = (DATABASE, self.leer_version(cursor))
+        with self.lock:
+            if version != self.version:
+                self.entradas.clear()
+                self.version = version
+            if clave in self.entradas:
+                self.entradas.move_to_end(clave)
+                return self.entradas[clave]
+
+        valor = calcular()
+        with self.lock:
+            # Otro hilo pudo invalidar mientras se calculaba: no se guarda un valor de otra versión
+            if version == self.version:
+                self.entradas[clave] = valor
+                if len(self.entradas) > self.max_entradas:
+                    self.entradas.popitem(last=False)
+        return valor
+
+    def precargar(self, version: int, entradas: dict):
+        """Sembrar la caché con valores ya calculados para esa versión (la que devuelve leer_version)"""
+        with self.lock:
+            self.entradas.clear()
+            self.entradas.update(entradas)
+            self.version = (DATABASE, version)
+
+cache_busquedas = CacheVersionada()
+cache_catalogo = CacheVersionada(max_entradas=16, leer_version=leer_version_catalogo)
+motor_tarifas = MotorTarifas()
+
+def calendario_tarifas(cursor) -> CalendarioTarifas:
+    return motor_tarifas.obtener(cursor, DATABASE, leer_version_catalogo(cursor))
+
+def resumen_tipos(cursor) -> dict:
+    """Habitaciones habilitadas por tipo (cantidad, capacidad máxima e ids)"""
+    def calcular():
+        cursor.execute("SELECT id, tipo, capacidad FROM habitaciones WHERE disponible = 1 ORDER BY tipo, id")
+        resumen = {}
+        for habitacion_id, tipo, capacidad in cursor.fetchall():
+            datos = resumen.setdefault(tipo, {"habitaciones": 0, "capacidad_maxima": 0, "ids": []})
+            datos["habitaciones"] += 1
+            datos["capacidad_maxima"] = max(datos["capacidad_maxima"], capacidad)
+            datos["ids"].append(habitacion_id)
+        return resumen
+    return cache_catalogo.obtener(cursor, "resumen_tipos", calcular)
+
+def tipo_por_habitacion(cursor) -> dict:
+    """Tipo de cada habitación habilitada"""
+    def calcular():
+        return {habitacion_id: tipo for tipo, datos in resumen_tipos(cursor).items() for habitacion_id in datos["ids"]}
+    return cache_catalogo.obtener(cursor, "tipo_por_habitacion", calcular)
+
+def tipos_disponibles(cursor, fecha_inicio: date, fecha_fin: date, huespedes: int,
+                      tipo_habitacion: Optional[str]) -> List[dict]:
+    """Habitaciones libres y precio desde de cada tipo (inventario + calendario de tarifas)"""
+    resumen = {
+        tipo: datos for tipo, datos in resumen_tipos(cursor).items()
+        if datos["capacidad_maxima"] >= huespedes
+        and tipo_habitacion in (None, tipo)
+    }
+    libres = disponibilidad_tipos(cursor, resumen, a_dia(fecha_inicio), a_dia(fecha_fin))
+    calendario = calendario_tarifas(cursor)
+    
+    tipos = []
+    for tipo, datos in resumen.items():
+        tipos.append({
+            "tipo": tipo,
+            "habitaciones": datos["habitaciones"],
+            "disponibles": libres[tipo],
+            "capacidad_maxima": datos["capacidad_maxima"],
+            "precio_total_desde": float(calendario.totales(datos["ids"], fecha_inicio, fecha_fin).min())
+        })
+    return tipos
+
 # ==================== UTILIDADES ====================
 
 def hash_password(password: str) -> str:
@@ -177,16 +1162,75 @@ def hash_password(password: str) -> str:
 def generate_token() -> str:
     return secrets.token_urlsafe(32)
 
+# Token de administración; si no está configurado, los endpoints /admin quedan deshabilitados
+ADMIN_TOKEN = os.environ.get("HOTEL_ADMIN_TOKEN")
+
+# "sesion": token opaco guardado en `sesiones`; "firmado": token HMAC sin estado.
+# verificar_token acepta ambos, así que cambiar de modo no invalida sesiones abiertas.
+MODO_TOKEN = os.environ.get("HOTEL_MODO_TOKEN", "sesion")
+SECRETO_TOKENS = os.environ.get("HOTEL_SECRETO_TOKENS")
+# Cada cuánto cada worker lee las revocaciones hechas por los demás
+REFRESCO_REVOCACIONES_SEGUNDOS = float(os.environ.get("HOTEL_REFRESCO_REVOCACIONES", "1"))
+
+_firmador: Optional[FirmadorTokens] = None
+_firmador_ruta: Optional[str] = None
+_revocaciones: Optional[RegistroRevocaciones] = None
+
+def _con_cursor_lectura(funcion):
+    with get_db_lectura() as conn:
+        return funcion(conn.cursor())
+
+def firmador_tokens() -> FirmadorTokens:
+    """Firmador con el secreto de HOTEL_SECRETO_TOKENS o, si no está, el guardado en la base de datos"""
+    global _firmador, _firmador_ruta
+    if _firmador is None or _firmador_ruta != DATABASE:
+        if SECRETO_TOKENS:
+            secreto = SECRETO_TOKENS
+        else:
+            secreto = _con_cursor_lectura(lambda cursor: cursor.execute(
+                "SELECT valor FROM configuracion WHERE clave = 'secreto_tokens'").fetchone()[0])
+        _firmador, _firmador_ruta = FirmadorTokens(secreto.encode()), DATABASE
+    return _firmador
+
+def registro_revocaciones() -> RegistroRevocaciones:
+    global _revocaciones
+    if _revocaciones is None or _firmador_ruta != DATABASE:
+        firmador_tokens()
+        _revocaciones = RegistroRevocaciones(REFRESCO_REVOCACIONES_SEGUNDOS)
+    return _revocaciones
+
+def _verificar_token_firmado(token: str) -> dict:
+    """Firma, vencimiento y revocación en memoria; la base de datos sólo ante un posible revocado"""
+    ahora = ahora_epoch()
+    datos = firmador_tokens().verificar(token, ahora)
+    if datos is None or registro_revocaciones().revocado(claves_revocacion(datos), ahora, _con_cursor_lectura):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token inválido o expirado"
+        )
+    return {
+        "usuario_id": datos["u"],
+        "email": datos["e"],
+        "nombre": datos["n"]
+    }
+
+def verificar_admin(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    if not ADMIN_TOKEN or not secrets.compare_digest(credentials.credentials, ADMIN_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acceso de administración denegado")
+    return True
+
 def verificar_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     token = credentials.credentials
-    with get_db() as conn:
+    if FirmadorTokens.es_firmado(token):
+        return _verificar_token_firmado(token)
+    with get_db_lectura() as conn:
         cursor = conn.cursor()
         cursor.execute("""
             SELECT s.usuario_id, u.email, u.nombre 
             FROM sesiones s
             JOIN usuarios u ON s.usuario_id = u.id
-            WHERE s.token = ? AND s.activa = 1 AND s.fecha_expiracion > datetime('now')
-        """, (token,))
+            WHERE s.token = ? AND s.activa = 1 AND s.fecha_expiracion > ?
+        """, (token, ahora_epoch()))
         result = cursor.fetchone()
         
         if not result:
@@ -201,12 +1245,910 @@ def verificar_token(credentials: HTTPAuthorizationCredentials = Depends(security
             "nombre": result[2]
         }
 
-# ==================== ENDPOINTS ====================
+# ==================== OPERACIONES DE ESCRITURA ====================
+# Cada operación recibe el cursor de una transacción ya abierta (ver
+# ejecutar_escritura) y lanza HTTPException para abortarla.
+
+def operacion_registro(cursor, usuario: UserRegister):
+    cursor.execute(
+        """INSERT INTO usuarios (email, password_hash, nombre, apellido, telefono)
+           VALUES (?, ?, ?, ?, ?)""",
+        (usuario.email, hash_password(usuario.password), usuario.nombre, 
+         usuario.apellido, usuario.telefono)
+    )
+    usuario_id = cursor.lastrowid
+    
+    return {
+        "success": True,
+        "mensaje": "Usuario registrado exitosamente",
+        "usuario_id": usuario_id
+    }
+
+def operacion_login(cursor, credenciales: UserLogin):
+    cursor.execute(
+        "SELECT id, nombre FROM usuarios WHERE email = ? AND password_hash = ? AND activo = 1",
+        (credenciales.email, hash_password(credenciales.password))
+    )
+    usuario = cursor.fetchone()
+    
+    if not usuario:
+        raise HTTPException(
+            status_code=401,
+            detail="Credenciales inválidas"
+        )
+    
+    fecha_expiracion = datetime.now() + DURACION_SESION
+    if MODO_TOKEN == "firmado":
+        token = firmador_tokens().emitir(usuario[0], credenciales.email, usuario[1], a_epoch(fecha_expiracion))
+    else:
+        # Crear sesión
+        token = generate_token()
+        cursor.execute(
+            """INSERT INTO sesiones (usuario_id, token, fecha_expiracion)
+               VALUES (?, ?, ?)""",
+            (usuario[0], token, a_epoch(fecha_expiracion))
+        )
+    
+    return {
+        "success": True,
+        "token": token,
+        "usuario": {
+            "id": usuario[0],
+            "nombre": usuario[1],
+            "email": credenciales.email
+        },
+        "expira": fecha_expiracion.isoformat()
+    }
+
+def operacion_logout(cursor, token: str):
+    """Cerrar la sesión: desactivarla o, si el token es firmado, revocar su jti hasta que venza"""
+    if FirmadorTokens.es_firmado(token):
+        ahora = ahora_epoch()
+        datos = firmador_tokens().verificar(token, ahora)
+        if datos is None:
+            # Venció entre la autenticación y ahora: no queda nada que revocar
+            return {"success": True, "mensaje": "Sesión cerrada"}
+        clave = claves_revocacion(datos)[0]
+        cursor.execute("INSERT OR REPLACE INTO revocaciones (clave, expira) VALUES (?, ?)", (clave, datos["x"]))
+        # Las revocaciones vencidas ya no protegen nada
+        cursor.execute("DELETE FROM revocaciones WHERE expira <= ?", (ahora,))
+        # Si la transacción fallara, el filtro sólo tendría un falso positivo (se confirma en la tabla)
+        registro_revocaciones().agregar_local(clave)
+    else:
+        cursor.execute("UPDATE sesiones SET activa = 0 WHERE token = ?", (token,))
+    
+    return {
+        "success": True,
+        "mensaje": "Sesión cerrada"
+    }
+
+def asignar_habitacion(cursor, reserva: ReservaCreate) -> int:
+    """Elegir la primera habitación libre del tipo pedido (la más ajustada en capacidad y precio)"""
+    # El inventario descarta sin tocar las reservas los tipos agotados
+    cursor.execute("SELECT COUNT(*) FROM habitaciones WHERE tipo = ? AND disponible = 1",
+                   (reserva.tipo_habitacion,))
+    total_tipo = cursor.fetchone()[0]
+    if total_tipo == 0:
+        raise HTTPException(status_code=404, detail="Tipo de habitación no encontrado")
+    inicio, fin = a_dia(reserva.fecha_inicio), a_dia(reserva.fecha_fin)
+    if vendidas_maximas(cursor, reserva.tipo_habitacion, inicio, fin) >= total_tipo:
+        raise HTTPException(status_code=409, detail="No quedan habitaciones de ese tipo en las fechas seleccionadas")
+    
+    cursor.execute("""
+        SELECT h.id FROM habitaciones h
+        WHERE h.tipo = ? AND h.disponible = 1 AND h.capacidad >= ?
+        AND h.id NOT IN (
+            SELECT habitacion_min FROM reservas_intervalos
+            WHERE fecha_inicio < ? AND fecha_fin > ?
+        )
+        ORDER BY h.capacidad, h.precio_noche, h.id
+        LIMIT 1
+    """, (reserva.tipo_habitacion, reserva.huespedes, fin, inicio))
+    habitacion = cursor.fetchone()
+    
+    if not habitacion:
+        # Hay cupo en el tipo, pero ninguna habitación queda libre toda la estancia sin reasignar otras
+        raise HTTPException(status_code=409, detail="No hay una habitación de ese tipo libre en todas las noches seleccionadas")
+    
+    return habitacion[0]
+
+def operacion_reserva(cursor, reserva: ReservaCreate, usuario_id: int):
+    if reserva.habitacion_id is None:
+        habitacion_id = asignar_habitacion(cursor, reserva)
+    else:
+        habitacion_id = reserva.habitacion_id
+        _verificar_habitacion_libre(cursor, reserva)
+    
+    # Obtener precio de habitación
+    cursor.execute("SELECT precio_noche, capacidad, tipo FROM habitaciones WHERE id = ?", 
+                  (habitacion_id,))
+    habitacion = cursor.fetchone()
+    
+    if not habitacion:
+        raise HTTPException(status_code=404, detail="Habitación no encontrada")
+    
+    if habitacion[1] < reserva.huespedes:
+        raise HTTPException(status_code=400, detail="La habitación no tiene capacidad suficiente")
+    
+    # Calcular precio total según el calendario de tarifas
+    noches = (reserva.fecha_fin - reserva.fecha_inicio).days
+    precio_total = calendario_tarifas(cursor).total(habitacion_id, reserva.fecha_inicio, reserva.fecha_fin)
+    inicio, fin = a_dia(reserva.fecha_inicio), a_dia(reserva.fecha_fin)
+    
+    # Crear reserva
+    cursor.execute("""
+        INSERT INTO reservas (usuario_id, habitacion_id, fecha_inicio, fecha_fin, huespedes, precio_total, estado)
+        VALUES (?, ?, ?, ?, ?, ?, 'pendiente')
+    """, (
+        usuario_id,
+        habitacion_id,
+        inicio,
+        fin,
+        reserva.huespedes,
+        precio_total
+    ))
+    
+    reserva_id = cursor.lastrowid
+    registrar_noches(cursor, habitacion[2], inicio, fin, 1)
+    registrar_ocupacion(cursor, habitacion[2], inicio, fin, precio_total,
+                        vendidas=1, confirmadas=0)
+    
+    return {
+        "success": True,
+        "mensaje": "Reserva creada exitosamente",
+        "reserva_id": reserva_id,
+        "habitacion_id": habitacion_id,
+        "precio_total": precio_total,
+        "noches": noches,
+        "estado": "pendiente"
+    }
+
+def operacion_reserva_grupo(cursor, reserva: ReservaGrupoCreate, usuario_id: int):
+    """
+    Reservar varias habitaciones para un grupo en una sola transacción
+
+    Cada habitación se reserva con `operacion_reserva`; si cualquiera falla
+    (ocupada, inexistente, sin capacidad) la excepción deshace también las
+    anteriores. Los huéspedes se reparten con al menos uno por habitación y
+    el resto llenando primero las de mayor capacidad.
+    """
+    habitacion_ids = reserva.habitacion_ids
+    if len(set(habitacion_ids)) != len(habitacion_ids):
+        raise HTTPException(status_code=400, detail="Hay habitaciones repetidas en la reserva de grupo")
+    if len(habitacion_ids) > reserva.huespedes:
+        raise HTTPException(status_code=400, detail="Hay más habitaciones que huéspedes")
+    
+    cursor.execute(f"""
+        SELECT id, capacidad FROM habitaciones WHERE id IN ({",".join("?" * len(habitacion_ids))})
+    """, habitacion_ids)
+    capacidades = dict(cursor.fetchall())
+    if len(capacidades) != len(habitacion_ids):
+        raise HTTPException(status_code=404, detail="Habitación no encontrada")
+    if sum(capacidades.values()) < reserva.huespedes:
+        raise HTTPException(status_code=400, detail="La capacidad de las habitaciones no alcanza para el grupo")
+    
+    reparto = {habitacion_id: 1 for habitacion_id in habitacion_ids}
+    restantes = reserva.huespedes - len(habitacion_ids)
+    for habitacion_id in sorted(habitacion_ids, key=lambda h: (-capacidades[h], h)):
+        extra = min(capacidades[habitacion_id] - 1, restantes)
+        reparto[habitacion_id] += extra
+        restantes -= extra
+    
+    reservas = [
+        operacion_reserva(cursor, ReservaCreate(
+            habitacion_id=habitacion_id,
+            fecha_inicio=reserva.fecha_inicio,
+            fecha_fin=reserva.fecha_fin,
+            huespedes=reparto[habitacion_id]
+        ), usuario_id)
+        for habitacion_id in habitacion_ids
+    ]
+    
+    return {
+        "success": True,
+        "mensaje": "Reserva de grupo creada exitosamente",
+        "reservas": [
+            {"reserva_id": r["reserva_id"], "habitacion_id": r["habitacion_id"],
+             "huespedes": reparto[r["habitacion_id"]], "precio_total": r["precio_total"]}
+            for r in reservas
+        ],
+        "precio_total": round(sum(r["precio_total"] for r in reservas), 2),
+        "noches": (reserva.fecha_fin - reserva.fecha_inicio).days,
+        "estado": "pendiente"
+    }
+
+def _verificar_habitacion_libre(cursor, reserva: ReservaCreate):
+    # Rango sobre las dos dimensiones del R*Tree: la habitación y las fechas
+    cursor.execute("""
+        SELECT COUNT(*) FROM reservas_intervalos
+        WHERE habitacion_min <= ? AND habitacion_max >= ?
+        AND fecha_inicio < ? AND fecha_fin > ?
+    """, (reserva.habitacion_id, reserva.habitacion_id,
+          a_dia(reserva.fecha_fin), a_dia(reserva.fecha_inicio)))
+    
+    if cursor.fetchone()[0] > 0:
+        raise HTTPException(status_code=409, detail="Habitación no disponible en las fechas seleccionadas")
+
+def _reserva_a_pagar(cursor, pago: PagoSimulado, usuario_id: int):
+    # Verificar que la reserva existe y pertenece al usuario
+    cursor.execute("""
+        SELECT r.id, r.precio_total, r.estado, r.fecha_inicio, r.fecha_fin, h.tipo
+        FROM reservas r
+        JOIN habitaciones h ON r.habitacion_id = h.id
+        WHERE r.id = ? AND r.usuario_id = ?
+    """, (pago.reserva_id, usuario_id))
+    
+    reserva = cursor.fetchone()
+    
+    if not reserva:
+        raise HTTPException(status_code=404, detail="Reserva no encontrada")
+    
+    if reserva[2] != 'pendiente':
+        raise HTTPException(status_code=400, detail="La reserva ya fue procesada")
+    
+    # Validaciones básicas de tarjeta (simuladas)
+    if len(pago.numero_tarjeta) != 16 or not pago.numero_tarjeta.isdigit():
+        raise HTTPException(status_code=400, detail="Número de tarjeta inválido")
+    
+    if len(pago.cvv) != 3 or not pago.cvv.isdigit():
+        raise HTTPException(status_code=400, detail="CVV inválido")
+    
+    return reserva
+
+def operacion_pago(cursor, pago: PagoSimulado, usuario_id: int):
+    reserva = _reserva_a_pagar(cursor, pago, usuario_id)
+    
+    # Pasarela instantánea: el pago se aprueba en la misma transacción
+    codigo_transaccion = f"TXN-{secrets.token_hex(8).upper()}"
+    ultimos_4 = pago.numero_tarjeta[-4:]
+    
+    # Registrar pago
+    cursor.execute("""
+        INSERT INTO pagos (reserva_id, monto, metodo_pago, ultimos_4_digitos, estado, codigo_transaccion)
+        VALUES (?, ?, ?, ?, 'aprobado', ?)
+    """, (pago.reserva_id, reserva[1], pago.metodo_pago, ultimos_4, codigo_transaccion))
+    
+    # Actualizar estado de reserva
+    cursor.execute("""
+        UPDATE reservas SET estado = 'confirmada' WHERE id = ?
+    """, (pago.reserva_id,))
+    registrar_ocupacion(cursor, reserva[5], reserva[3], reserva[4], reserva[1], vendidas=0, confirmadas=1)
+    
+    return {
+        "success": True,
+        "mensaje": "Pago procesado exitosamente",
+        "codigo_transaccion": codigo_transaccion,
+        "monto": reserva[1],
+        "metodo_pago": pago.metodo_pago,
+        "ultimos_4_digitos": ultimos_4,
+        "estado": "aprobado"
+    }
+
+# Un pago 'procesando' más antiguo se da por abandonado (se detuvo el worker que lo cobraba)
+PLAZO_PAGO_SEGUNDOS = 300
+
+def operacion_iniciar_pago(cursor, pago: PagoSimulado, usuario_id: int):
+    """Registrar un pago 'procesando' antes de llamar a la pasarela"""
+    reserva = _reserva_a_pagar(cursor, pago, usuario_id)
+    
+    plazo = f"-{PLAZO_PAGO_SEGUNDOS} seconds"
+    cursor.execute("""
+        SELECT 1 FROM pagos
+        WHERE reserva_id = ? AND estado = 'procesando' AND fecha_pago > datetime('now', ?)
+    """, (pago.reserva_id, plazo))
+    if cursor.fetchone():
+        raise HTTPException(status_code=409, detail="Ya hay un pago en curso para esta reserva")
+    cursor.execute("""
+        UPDATE pagos SET estado = 'error', motivo = 'Cobro abandonado'
+        WHERE reserva_id = ? AND estado = 'procesando'
+    """, (pago.reserva_id,))
+    
+    cursor.execute("""
+        INSERT INTO pagos (reserva_id, monto, metodo_pago, ultimos_4_digitos, estado)
+        VALUES (?, ?, ?, ?, 'procesando')
+    """, (pago.reserva_id, reserva[1], pago.metodo_pago, pago.numero_tarjeta[-4:]))
+    return {"pago_id": cursor.lastrowid, "monto": reserva[1], "ultimos_4_digitos": pago.numero_tarjeta[-4:]}
+
+def operacion_completar_pago(cursor, pago_id: int, resultado: Optional[ResultadoCobro], error: Optional[str]):
+    """Guardar el resultado de la pasarela y, si se aprobó, confirmar la reserva"""
+    cursor.execute("""
+        SELECT p.estado, r.id, r.estado, r.fecha_inicio, r.fecha_fin, h.tipo, r.precio_total
+        FROM pagos p
+        JOIN reservas r ON r.id = p.reserva_id
+        JOIN habitaciones h ON h.id = r.habitacion_id
+        WHERE p.id = ?
+    """, (pago_id,))
+    fila = cursor.fetchone()
+    # Ya resuelto (p. ej. dado por abandonado): no se pisa
+    if fila is None or fila[0] != 'procesando':
+        return estado_pago(cursor, pago_id)
+    
+    if resultado is None:
+        estado, codigo, motivo = 'error', None, error
+    elif not resultado.aprobado:
+        estado, codigo, motivo = 'rechazado', None, resultado.motivo
+    elif fila[2] != 'pendiente':
+        # La reserva se canceló mientras se cobraba: el cargo debe devolverse
+        estado, codigo, motivo = 'anulado', resultado.codigo_transaccion, f"Reserva {fila[2]} durante el cobro"
+    else:
+        estado, codigo, motivo = 'aprobado', resultado.codigo_transaccion, None
+    
+    cursor.execute("UPDATE pagos SET estado = ?, codigo_transaccion = ?, motivo = ? WHERE id = ?",
+                   (estado, codigo, motivo, pago_id))
+    if estado == 'aprobado':
+        cursor.execute("UPDATE reservas SET estado = 'confirmada' WHERE id = ?", (fila[1],))
+        registrar_ocupacion(cursor, fila[5], fila[3], fila[4], fila[6], vendidas=0, confirmadas=1)
+    return estado_pago(cursor, pago_id)
+
+def estado_pago(cursor, pago_id: int, usuario_id: Optional[int] = None) -> Optional[dict]:
+    """Pago y estado de su reserva (sólo si la reserva es de `usuario_id`, si se indica)"""
+    cursor.execute("""
+        SELECT p.id, p.reserva_id, p.estado, p.monto, p.metodo_pago, p.ultimos_4_digitos,
+               p.codigo_transaccion, p.motivo, r.estado
+        FROM pagos p
+        JOIN reservas r ON r.id = p.reserva_id
+        WHERE p.id = ? AND (? IS NULL OR r.usuario_id = ?)
+    """, (pago_id, usuario_id, usuario_id))
+    fila = cursor.fetchone()
+    if fila is None:
+        return None
+    return {
+        "pago_id": fila[0],
+        "reserva_id": fila[1],
+        "estado": fila[2],
+        "monto": fila[3],
+        "metodo_pago": fila[4],
+        "ultimos_4_digitos": fila[5],
+        "codigo_transaccion": fila[6],
+        "motivo": fila[7],
+        "estado_reserva": fila[8]
+    }
+
+def operacion_cancelacion(cursor, reserva_id: int, usuario_id: int):
+    cursor.execute("""
+        SELECT r.estado, r.fecha_inicio, r.fecha_fin, h.tipo, r.precio_total
+        FROM reservas r
+        JOIN habitaciones h ON r.habitacion_id = h.id
+        WHERE r.id = ? AND r.usuario_id = ?
+    """, (reserva_id, usuario_id))
+    
+    reserva = cursor.fetchone()
+    
+    if not reserva:
+        raise HTTPException(status_code=404, detail="Reserva no encontrada")
+    
+    if reserva[0] not in ('confirmada', 'pendiente'):
+        raise HTTPException(status_code=400, detail="La reserva ya fue cancelada")
+    
+    cursor.execute("UPDATE reservas SET estado = 'cancelada' WHERE id = ?", (reserva_id,))
+    
+    # Liberar las noches en el inventario del tipo y en el agregado de ocupación
+    registrar_noches(cursor, reserva[3], reserva[1], reserva[2], -1)
+    registrar_ocupacion(cursor, reserva[3], reserva[1], reserva[2], reserva[4],
+                        vendidas=-1, confirmadas=-1 if reserva[0] == 'confirmada' else 0)
+    
+    return {
+        "success": True,
+        "mensaje": "Reserva cancelada",
+        "reserva_id": reserva_id,
+        "estado": "cancelada"
+    }
+
+def operacion_crear_tarifa(cursor, tarifa: TarifaCreate):
+    if tarifa.habitacion_id is not None:
+        cursor.execute("SELECT 1 FROM habitaciones WHERE id = ?", (tarifa.habitacion_id,))
+        if not cursor.fetchone():
+            raise HTTPException(status_code=404, detail="Habitación no encontrada")
+    
+    cursor.execute("""
+        INSERT INTO tarifas (nombre, habitacion_id, tipo, fecha_inicio, fecha_fin, precio_noche, multiplicador, prioridad)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        tarifa.nombre, tarifa.habitacion_id, tarifa.tipo,
+        a_dia(tarifa.fecha_inicio), a_dia(tarifa.fecha_fin),
+        tarifa.precio_noche, tarifa.multiplicador, tarifa.prioridad
+    ))
+    
+    return {
+        "success": True,
+        "mensaje": "Tarifa creada exitosamente",
+        "tarifa_id": cursor.lastrowid
+    }
+
+def operacion_eliminar_tarifa(cursor, tarifa_id: int):
+    cursor.execute("DELETE FROM tarifas WHERE id = ?", (tarifa_id,))
+    if cursor.rowcount == 0:
+        raise HTTPException(status_code=404, detail="Tarifa no encontrada")
+    return {"success": True, "mensaje": "Tarifa eliminada"}
+
+# Filas por executemany (y, para usuarios, por transacción) en /admin/importar/*
+TAMANO_LOTE_IMPORTACION = 1000
+
+def operacion_importar_usuarios(cursor, usuarios: List[UsuarioImportado]) -> int:
+    """Alta o actualización (por email) de un lote de usuarios; devuelve cuántos son nuevos"""
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM usuarios")
+    ultimo_id = cursor.fetchone()[0]
+    # Desactivar un usuario con activo = 0 revoca sus tokens (trigger de revocaciones)
+    cursor.executemany("""
+        INSERT INTO usuarios (email, password_hash, nombre, apellido, telefono, activo)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(email) DO UPDATE SET
+            password_hash = excluded.password_hash,
+            nombre = excluded.nombre,
+            apellido = excluded.apellido,
+            telefono = excluded.telefono,
+            activo = excluded.activo
+    """, [
+        (u.email, hash_password(u.password), u.nombre, u.apellido, u.telefono, int(u.activo))
+        for u in usuarios
+    ])
+    cursor.execute("SELECT COUNT(*) FROM usuarios WHERE id > ?", (ultimo_id,))
+    return cursor.fetchone()[0]
+
+def operacion_importar_habitaciones(cursor, habitaciones: List[HabitacionImportada]) -> int:
+    """
+    Alta o actualización (por número) del catálogo de habitaciones; devuelve cuántas son nuevas
+
+    Todo el catálogo va en una transacción: las versiones de catálogo y de
+    datos cambian en un solo commit, así que cada worker recarga sus cachés
+    de habitaciones y tarifas una sola vez. Si una habitación con reservas
+    cambia de tipo, el inventario y la ocupación por tipo se recalculan al
+    final, también una sola vez.
+    """
+    cursor.execute("SELECT numero, tipo FROM habitaciones")
+    tipos_anteriores = dict(cursor.fetchall())
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM habitaciones")
+    ultimo_id = cursor.fetchone()[0]
+    
+    for inicio in range(0, len(habitaciones), TAMANO_LOTE_IMPORTACION):
+        cursor.executemany("""
+            INSERT INTO habitaciones (numero, tipo, capacidad, precio_noche, descripcion, disponible)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(numero) DO UPDATE SET
+                tipo = excluded.tipo,
+                capacidad = excluded.capacidad,
+                precio_noche = excluded.precio_noche,
+                descripcion = excluded.descripcion,
+                disponible = excluded.disponible
+        """, [
+            (h.numero, h.tipo, h.capacidad, h.precio_noche, h.descripcion, int(h.disponible))
+            for h in habitaciones[inicio:inicio + TAMANO_LOTE_IMPORTACION]
+        ])
+    
+    cambios_tipo = list({h.numero for h in habitaciones
+                         if tipos_anteriores.get(h.numero, h.tipo) != h.tipo})
+    for inicio in range(0, len(cambios_tipo), TAMANO_LOTE_IMPORTACION):
+        numeros = cambios_tipo[inicio:inicio + TAMANO_LOTE_IMPORTACION]
+        cursor.execute(f"""
+            SELECT 1 FROM reservas r JOIN habitaciones h ON h.id = r.habitacion_id
+            WHERE h.numero IN ({",".join("?" * len(numeros))}) LIMIT 1
+        """, numeros)
+        if cursor.fetchone():
+            reconstruir_inventario(cursor)
+            reconstruir_ocupacion(cursor)
+            break
+    
+    cursor.execute("SELECT COUNT(*) FROM habitaciones WHERE id > ?", (ultimo_id,))
+    return cursor.fetchone()[0]
+
+# ==================== PROYECCIONES ====================
+
+# Cada cuánto el proyector de cada worker busca eventos nuevos
+INTERVALO_PROYECCION_SEGUNDOS = float(os.environ.get("HOTEL_INTERVALO_PROYECCION_MS", "200")) / 1000
+
+def ejecutar_proyeccion() -> int:
+    """Poner al día el historial; sólo abre una transacción de escritura si hay eventos pendientes"""
+    aplicados = 0
+    while True:
+        with get_db_lectura() as conn:
+            if not hay_eventos_pendientes(conn.cursor()):
+                return aplicados
+        aplicados += ejecutar_escritura(proyectar)
+
+async def _proyector():
+    while True:
+        try:
+            await asyncio.to_thread(ejecutar_proyeccion)
+        except sqlite3.Error as e:
+            # El siguiente intento retoma desde la posición guardada
+            registro.warning("Proyector de eventos: %s", e)
+        await asyncio.sleep(INTERVALO_PROYECCION_SEGUNDOS)
+
+_tarea_proyector: Optional[asyncio.Task] = None
+
+# ==================== DISPONIBILIDAD EN VIVO ====================
+
+# Cada cuánto cada worker revisa los eventos nuevos para /disponibilidad/stream
+INTERVALO_DISPONIBILIDAD_SEGUNDOS = float(os.environ.get("HOTEL_INTERVALO_DISPONIBILIDAD_MS", "250")) / 1000
+MAX_SUSCRIPCIONES = int(os.environ.get("HOTEL_MAX_SUSCRIPCIONES", "10000"))
+MAX_NOCHES_SUSCRIPCION = 60
+# Eventos que cambian las noches vendidas (pagar una reserva pendiente no las cambia)
+EVENTOS_DISPONIBILIDAD = ("reserva_creada", "reserva_pendiente", "reserva_cancelada",
+                          "reserva_modificada", "reserva_eliminada")
+
+class DifusorDisponibilidad:
+    """
+    Sigue el registro de eventos y avisa a las suscripciones afectadas (ver suscripciones.py)
+
+    El índice sólo se toca desde el event loop; las consultas van a un hilo.
+    `posicion` es el último evento revisado: una suscripción nueva la hace
+    retroceder hasta antes de su foto inicial, así que ningún cambio
+    posterior a la foto se pierde (revisar de más sólo recalcula).
+    """
+
+    def __init__(self):
+        self.indice = IndiceSuscripciones()
+        self.posicion: Optional[int] = None
+        self.version_catalogo = None
+
+    def _foto(self, suscripcion: Suscripcion):
+        with get_db_lectura() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM eventos")
+            posicion = cursor.fetchone()[0]
+            return posicion, self._calcular_con(cursor, suscripcion.clave)
+
+    @staticmethod
+    def _calcular_con(cursor, clave) -> List[dict]:
+        inicio, fin, tipo, huespedes = clave
+        return tipos_disponibles(cursor, desde_dia(inicio), desde_dia(fin), huespedes, tipo)
+
+    async def suscribir(self, suscripcion: Suscripcion) -> List[dict]:
+        """Registrar la suscripción y devolver su foto inicial"""
+        posicion, tipos = await asyncio.to_thread(self._foto, suscripcion)
+        suscripcion.registrar_envio(tipos)
+        self.indice.agregar(suscripcion)
+        self.posicion = posicion if self.posicion is None else min(self.posicion, posicion)
+        return tipos
+
+    def desuscribir(self, suscripcion: Suscripcion):
+        self.indice.quitar(suscripcion)
+        if not len(self.indice):
+            self.posicion = None
+
+    def _leer_cambios(self, desde: int):
+        """Rangos (inicio, fin, tipo) de las reservas que cambiaron tras `desde`"""
+        with get_db_lectura() as conn:
+            cursor = conn.cursor()
+            version = leer_version_catalogo(cursor)
+            tipos = tipo_por_habitacion(cursor)
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM eventos")
+            hasta = cursor.fetchone()[0]
+            cursor.execute(f"""
+                SELECT datos FROM eventos
+                WHERE id > ? AND id <= ? AND tipo IN ({",".join("?" * len(EVENTOS_DISPONIBILIDAD))})
+            """, (desde, hasta, *EVENTOS_DISPONIBILIDAD))
+            cambios, todas = [], False
+            for (datos,) in cursor.fetchall():
+                datos = json.loads(datos)
+                if "fecha_inicio" in datos:
+                    cambios.append((datos["fecha_inicio"], datos["fecha_fin"], tipos.get(datos["habitacion_id"])))
+                    # Reserva movida o acortada: las noches que dejó libres también cambian
+                    anterior = datos.get("anterior")
+                    if anterior is not None:
+                        cambios.append((anterior["fecha_inicio"], anterior["fecha_fin"],
+                                        tipos.get(anterior["habitacion_id"])))
+                else:
+                    # Reserva eliminada: el evento no dice qué noches liberó
+                    todas = True
+            return hasta, version, cambios, todas
+
+    def _calcular(self, claves) -> dict:
+        with get_db_lectura() as conn:
+            cursor = conn.cursor()
+            return {clave: self._calcular_con(cursor, clave) for clave in claves}
+
+    async def revisar(self):
+        if self.posicion is None:
+            return
+        desde = self.posicion
+        hasta, version, cambios, todas = await asyncio.to_thread(self._leer_cambios, desde)
+        if self.posicion == desde:
+            self.posicion = hasta
+        # Un cambio de catálogo (habitaciones o tarifas) puede afectar a cualquier rango
+        if version != self.version_catalogo:
+            self.version_catalogo = version
+            todas = True
+        afectadas = self.indice.todas() if todas else self.indice.afectadas(cambios)
+        if not afectadas:
+            return
+        valores = await asyncio.to_thread(self._calcular, {s.clave for s in afectadas})
+        for suscripcion in afectadas:
+            suscripcion.actualizar(valores[suscripcion.clave])
+
+    async def ejecutar(self):
+        while True:
+            try:
+                await self.revisar()
+            except sqlite3.Error as e:
+                registro.warning("Disponibilidad en vivo: %s", e)
+            await asyncio.sleep(INTERVALO_DISPONIBILIDAD_SEGUNDOS)
+
+difusor_disponibilidad = DifusorDisponibilidad()
+_tarea_difusor: Optional[asyncio.Task] = None
+
+# ==================== PAGOS ====================
+
+# "instantanea": aprueba al momento (en una sola transacción, como siempre);
+# "simulada": proveedor remoto con latencia, fallos y límite de concurrencia
+PASARELA = os.environ.get("HOTEL_PASARELA", "instantanea")
+# Con pagos asíncronos /pagar responde 202 y el cobro se completa en segundo plano
+# (por defecto, con cualquier pasarela que no sea la instantánea)
+PAGOS_ASINCRONOS = os.environ.get("HOTEL_PAGOS_ASINCRONOS", "0" if PASARELA == "instantanea" else "1") == "1"
+PAGOS_CONCURRENTES = int(os.environ.get("HOTEL_PAGOS_CONCURRENTES", "20"))
+TIEMPO_MAXIMO_PAGO_SEGUNDOS = float(os.environ.get("HOTEL_PAGOS_TIEMPO_MAXIMO_MS", "3000")) / 1000
+# Cobros esperando turno por worker; con la cola llena /pagar responde 503
+MAX_PAGOS_EN_COLA = 1000
+
+def crear_pasarela() -> Pasarela:
+    if PASARELA == "simulada":
+        return PasarelaSimulada(
+            latencia_ms=float(os.environ.get("HOTEL_PASARELA_LATENCIA_MS", "800")),
+            dispersion=float(os.environ.get("HOTEL_PASARELA_DISPERSION", "0.5")),
+            tasa_fallo=float(os.environ.get("HOTEL_PASARELA_FALLOS", "0")),
+            tasa_rechazo=float(os.environ.get("HOTEL_PASARELA_RECHAZOS", "0")),
+            concurrencia=int(os.environ.get("HOTEL_PASARELA_CONCURRENCIA", "50"))
+        )
+    if PASARELA != "instantanea":
+        raise ValueError(f"HOTEL_PASARELA desconocida: {PASARELA}")
+    return PasarelaInstantanea()
+
+cliente_pagos = ClientePasarela(crear_pasarela(), max_concurrentes=PAGOS_CONCURRENTES,
+                                tiempo_maximo=TIEMPO_MAXIMO_PAGO_SEGUNDOS)
+
+async def completar_cobro(pago_id: int, monto: float, ultimos_4: str) -> dict:
+    """Cobrar un pago 'procesando' y guardar el resultado"""
+    try:
+        resultado, error = await cliente_pagos.cobrar(f"pago-{pago_id}", monto, ultimos_4), None
+    except ErrorPasarela as e:
+        resultado, error = None, str(e)
+    return await ejecutar_escritura_agrupable(operacion_completar_pago, pago_id, resultado, error)
+
+class ProcesadorPagos:
+    """
+    Cola de cobros atendida por trabajadores en segundo plano
+
+    Hay tantos trabajadores como cobros simultáneos admite el cliente de la
+    pasarela. Como la cola de escritura, se crea en el primer uso dentro del
+    event loop que la atiende.
+    """
+
+    def __init__(self, trabajadores: int = PAGOS_CONCURRENTES, max_cola: int = MAX_PAGOS_EN_COLA):
+        self.trabajadores = trabajadores
+        self.max_cola = max_cola
+        self.cola: Optional[asyncio.Queue] = None
+        self.tareas: List[asyncio.Task] = []
+        self.loop = None
+
+    def lleno(self) -> bool:
+        return self.cola is not None and self.cola.full()
+
+    def encolar(self, pago_id: int, monto: float, ultimos_4: str):
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop or any(tarea.done() for tarea in self.tareas):
+            self.loop = loop
+            self.cola = asyncio.Queue(self.max_cola)
+            self.tareas = [loop.create_task(self._trabajador()) for _ in range(self.trabajadores)]
+        self.cola.put_nowait((pago_id, monto, ultimos_4))
+
+    async def _trabajador(self):
+        while True:
+            pago_id, monto, ultimos_4 = await self.cola.get()
+            try:
+                await completar_cobro(pago_id, monto, ultimos_4)
+            except Exception:
+                # El pago queda 'procesando' y se da por abandonado pasado PLAZO_PAGO_SEGUNDOS
+                registro.exception("Pago %s sin completar", pago_id, extra={"pago_id": pago_id})
+            finally:
+                self.cola.task_done()
+
+    async def detener(self, espera: float = TIEMPO_MAXIMO_PAGO_SEGUNDOS):
+        """Dejar terminar los cobros en curso (como mucho `espera` segundos) y parar"""
+        if self.cola is not None and self.loop is asyncio.get_running_loop():
+            try:
+                await asyncio.wait_for(self.cola.join(), espera)
+            except asyncio.TimeoutError:
+                pass
+        for tarea in self.tareas:
+            tarea.cancel()
+        for tarea in self.tareas:
+            try:
+                await tarea
+            except asyncio.CancelledError:
+                pass
+        self.tareas = []
+
+procesador_pagos = ProcesadorPagos()
+
+# ==================== ARRANQUE EN CALIENTE ====================
+# Ver arranque.py: el calendario de tarifas, el resumen por tipo y el filtro de
+# revocaciones se guardan al cerrar y el siguiente arranque los mapea en memoria.
+
+ARRANQUE_EN_CALIENTE = os.environ.get("HOTEL_ARRANQUE_EN_CALIENTE", "1") == "1"
+# Por defecto, junto a la base de datos
+DIRECTORIO_ARRANQUE = os.environ.get("HOTEL_DIRECTORIO_ARRANQUE")
+
+def directorio_arranque() -> str:
+    return DIRECTORIO_ARRANQUE or DATABASE + ".arranque"
+
+def _esquema(cursor) -> int:
+    cursor.execute("PRAGMA user_version")
+    return cursor.fetchone()[0]
+
+def guardar_estado_en_memoria():
+    """Guardar la instantánea de arranque con el catálogo vigente y el filtro de revocaciones"""
+    with get_db_lectura() as conn:
+        cursor = conn.cursor()
+        esquema = _esquema(cursor)
+        # Si aún no se armaron, se arman ahora: el siguiente arranque no tendrá que hacerlo
+        calendario = calendario_tarifas(cursor)
+        version = motor_tarifas.clave[1]
+        resumen = resumen_tipos(cursor)
+    if cache_catalogo.version != (DATABASE, version):
+        # El catálogo cambió mientras se leía: mejor no guardar que guardar una mezcla
+        return
+    datos_calendario, arreglos_calendario = calendario.exportar()
+    datos = {"esquema": esquema, "version_catalogo": version,
+             "calendario": datos_calendario, "resumen_tipos": resumen}
+    arreglos = {f"calendario_{nombre}": arreglo for nombre, arreglo in arreglos_calendario.items()}
+    if _revocaciones is not None and _firmador_ruta == DATABASE:
+        datos["revocaciones"], filtro = _revocaciones.exportar()
+        arreglos["revocaciones_filtro"] = np.frombuffer(filtro, dtype=np.uint8)
+    directorio = directorio_arranque()
+    with bloqueo_archivo(directorio + ".lock"):
+        guardar_estado(directorio, datos, arreglos)
+
+def retomar_estado_en_memoria() -> List[str]:
+    """
+    Retomar lo que siga vigente de la instantánea de arranque
+
+    El calendario y el resumen por tipo se usan si el catálogo no cambió
+    (`version_catalogo`) y, el calendario, si su horizonte empieza hoy; si
+    no, se arman como siempre en la primera petición que los necesita. El
+    filtro de revocaciones se retoma y se pone al día leyendo sólo las
+    revocaciones posteriores a su último rowid.
+
+    Returns:
+        Partes retomadas (vacía si no había instantánea utilizable)
+    """
+    instantanea = abrir_estado(directorio_arranque(), copia_al_escribir=("revocaciones_filtro",))
+    if instantanea is None:
+        return []
+    manifiesto, arreglos = instantanea
+    retomadas = []
+    with get_db_lectura() as conn:
+        cursor = conn.cursor()
+        if manifiesto.get("esquema") != _esquema(cursor):
+            return []
+        version = leer_version_catalogo(cursor)
+        if manifiesto["version_catalogo"] == version:
+            datos_calendario = manifiesto["calendario"]
+            if datos_calendario["origen"] == dia_hoy() and datos_calendario["dias"] == motor_tarifas.dias:
+                calendario = CalendarioTarifas.restaurar(datos_calendario, {
+                    nombre: arreglos[f"calendario_{nombre}"] for nombre in ("ids", "perfil_de", "prefijos")
+                })
+                motor_tarifas.instalar(DATABASE, version, calendario)
+                retomadas.append("calendario de tarifas")
+            cache_catalogo.precargar(version, {"resumen_tipos": manifiesto["resumen_tipos"]})
+            retomadas.append("habitaciones por tipo")
+
+        revocaciones = manifiesto.get("revocaciones")
+        if revocaciones is not None:
+            cursor.execute("SELECT COALESCE(MAX(rowid), 0) FROM revocaciones")
+            # Un rowid mayor que el de la tabla indica otra base de datos (por ejemplo, restaurada)
+            if revocaciones["ultimo_rowid"] <= cursor.fetchone()[0]:
+                filtro = registro_revocaciones()
+                if filtro.restaurar(revocaciones, memoryview(arreglos["revocaciones_filtro"])):
+                    filtro.refrescar(cursor)
+                    retomadas.append("revocaciones")
+    return retomadas
+
+# ==================== CICLO DE VIDA ====================
+# El arranque (migraciones, estado en memoria, tareas de fondo) y el cierre van
+# en un único contexto de lifespan. El calentamiento corre después, en segundo
+# plano: uvicorn ya acepta conexiones y /healthz responde, pero /readyz da 503
+# hasta que las conexiones de lectura, las estructuras en memoria y las rutas
+# de /buscar están preparadas, así el balanceador no envía tráfico a un worker frío.
+
+CALENTAMIENTO = os.environ.get("HOTEL_CALENTAMIENTO", "1") == "1"
+# Búsquedas sintéticas que recorren /buscar entero (validación, caché, respuesta)
+BUSQUEDAS_CALENTAMIENTO = int(os.environ.get("HOTEL_BUSQUEDAS_CALENTAMIENTO", "6"))
+
+_listo = False
+_duracion_calentamiento: Optional[float] = None
+_tarea_calentamiento: Optional[asyncio.Task] = None
+
+def busquedas_sinteticas(cantidad: int) -> List[dict]:
+    """Búsquedas a partir de mañana, alternando duración, huéspedes y paginación"""
+    hoy = date.today()
+    busquedas = []
+    for i in range(cantidad):
+        inicio = hoy + timedelta(days=1 + 7 * i)
+        busqueda = {"fecha_inicio": str(inicio), "fecha_fin": str(inicio + timedelta(days=1 + i % 3)),
+                    "huespedes": 1 + i % 2}
+        if i % 2:
+            busqueda.update(orden="precio", limite=20)
+        busquedas.append(busqueda)
+    return busquedas
+
+def calentar_lecturas():
+    """Abrir el pool de lectura, compilar en cada conexión las consultas frecuentes y armar las estructuras"""
+    busquedas = [BusquedaHabitaciones(**busqueda) for busqueda in busquedas_sinteticas(2)]
+
+    def preparar(conn):
+        cursor = conn.cursor()
+        calendario_tarifas(cursor)
+        tipo_por_habitacion(cursor)
+        for busqueda in busquedas:
+            _buscar_en_bd(cursor, busqueda)
+        tipos_disponibles(cursor, busquedas[0].fecha_inicio, busquedas[0].fecha_fin, 1, None)
 
-@app.on_event("startup")
-async def startup_event():
-    init_database()
-    print("✅ Base de datos inicializada")
+    pool_lectura().calentar(preparar)
+    if MODO_TOKEN == "firmado":
+        _con_cursor_lectura(registro_revocaciones().refrescar)
+
+async def calentar():
+    """Preparar el worker y marcarlo listo; si algo falla queda listo igual (frío, pero funciona)"""
+    global _listo, _duracion_calentamiento
+    inicio = time.perf_counter()
+    try:
+        await asyncio.to_thread(calentar_lecturas)
+        transporte = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://calentamiento") as cliente:
+            for busqueda in busquedas_sinteticas(BUSQUEDAS_CALENTAMIENTO):
+                await cliente.post("/buscar", json=busqueda)
+    except Exception:
+        registro.exception("Calentamiento incompleto")
+    _duracion_calentamiento = time.perf_counter() - inicio
+    _listo = True
+    registro.info("Worker listo", extra={"calentamiento_ms": round(_duracion_calentamiento * 1000, 1)})
+
+@asynccontextmanager
+async def ciclo_de_vida(app: FastAPI):
+    global _tarea_proyector, _tarea_difusor, _tarea_calentamiento, _listo
+    configurar_registro()
+    # Las migraciones se aplican una sola vez entre workers (bloqueo de archivo en init_database)
+    await asyncio.to_thread(init_database)
+    if ARRANQUE_EN_CALIENTE:
+        retomadas = retomar_estado_en_memoria()
+        if retomadas:
+            registro.info("Arranque en caliente: %s", ", ".join(retomadas), extra={"retomadas": retomadas})
+    loop = asyncio.get_running_loop()
+    _tarea_proyector = loop.create_task(_proyector())
+    _tarea_difusor = loop.create_task(difusor_disponibilidad.ejecutar())
+    registro.info("Base de datos inicializada", extra={"base_datos": DATABASE})
+    if CALENTAMIENTO:
+        _tarea_calentamiento = loop.create_task(calentar())
+    else:
+        _listo = True
+
+    try:
+        yield
+    finally:
+        # Dejar de recibir tráfico nuevo mientras se cierra
+        _listo = False
+        for tarea in (_tarea_calentamiento, _tarea_proyector, _tarea_difusor):
+            if tarea is not None:
+                tarea.cancel()
+                try:
+                    await tarea
+                except asyncio.CancelledError:
+                    pass
+        _tarea_calentamiento = None
+        # Terminar las respuestas SSE abiertas para que el servidor pueda cerrarse
+        difusor_disponibilidad.indice.cerrar_todas()
+        await procesador_pagos.detener()
+        await cola_escritura.detener()
+        if ARRANQUE_EN_CALIENTE:
+            try:
+                guardar_estado_en_memoria()
+            except (OSError, sqlite3.Error) as e:
+                registro.warning("Instantánea de arranque: %s", e)
+        pool_lectura().cerrar()
+
+app.router.lifespan_context = ciclo_de_vida
+
+# ==================== ENDPOINTS ====================
 
 @app.get("/")
 async def root():
@@ -216,70 +2158,61 @@ async def root():
         "endpoints": ["/register", "/login", "/buscar", "/reservar", "/pagar"]
     }
 
+@app.get("/healthz")
+async def healthz():
+    """Liveness: el proceso y su event loop responden (no consulta la base de datos)"""
+    return {"estado": "vivo"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: calentamiento terminado y base de datos accesible; 503 mientras no"""
+    if not _listo:
+        raise HTTPException(status_code=503, detail="Calentando")
+    try:
+        _con_cursor_lectura(leer_version_datos)
+    except sqlite3.Error:
+        raise HTTPException(status_code=503, detail="Base de datos no disponible")
+    return {"estado": "listo", "calentamiento_ms": round((_duracion_calentamiento or 0) * 1000, 1)}
+
 @app.post("/register")
 async def registrar_usuario(usuario: UserRegister):
     """Registro de nuevo usuario"""
     try:
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                """INSERT INTO usuarios (email, password_hash, nombre, apellido, telefono)
-                   VALUES (?, ?, ?, ?, ?)""",
-                (usuario.email, hash_password(usuario.password), usuario.nombre, 
-                 usuario.apellido, usuario.telefono)
-            )
-            usuario_id = cursor.lastrowid
-            
-            return {
-                "success": True,
-                "mensaje": "Usuario registrado exitosamente",
-                "usuario_id": usuario_id
-            }
+        return await asyncio.to_thread(ejecutar_escritura, operacion_registro, usuario)
     except sqlite3.IntegrityError:
         raise HTTPException(status_code=400, detail="El email ya está registrado")
 
 @app.post("/login")
 async def login(credenciales: UserLogin):
     """Login y generación de token de sesión"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT id, nombre FROM usuarios WHERE email = ? AND password_hash = ? AND activo = 1",
-            (credenciales.email, hash_password(credenciales.password))
-        )
-        usuario = cursor.fetchone()
-        
-        if not usuario:
-            raise HTTPException(
-                status_code=401,
-                detail="Credenciales inválidas"
-            )
-        
-        # Crear sesión
-        token = generate_token()
-        fecha_expiracion = datetime.now() + timedelta(days=7)
-        
-        cursor.execute(
-            """INSERT INTO sesiones (usuario_id, token, fecha_expiracion)
-               VALUES (?, ?, ?)""",
-            (usuario[0], token, fecha_expiracion)
-        )
-        
-        return {
-            "success": True,
-            "token": token,
-            "usuario": {
-                "id": usuario[0],
-                "nombre": usuario[1],
-                "email": credenciales.email
-            },
-            "expira": fecha_expiracion.isoformat()
-        }
+    if MODO_TOKEN == "firmado":
+        # Sin sesión que guardar: basta una conexión de lectura
+        with get_db_lectura() as conn:
+            return operacion_login(conn.cursor(), credenciales)
+    return await asyncio.to_thread(ejecutar_escritura, operacion_login, credenciales)
+
+@app.post("/logout")
+async def logout(credentials: HTTPAuthorizationCredentials = Depends(security),
+                 usuario_actual = Depends(verificar_token)):
+    """Cerrar la sesión del token enviado"""
+    return await asyncio.to_thread(ejecutar_escritura, operacion_logout, credentials.credentials)
+
+def _seleccion(modelo, fields: Optional[str]):
+    try:
+        return seleccionar_campos(modelo, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/buscar")
-async def buscar_habitaciones(busqueda: BusquedaHabitaciones):
-    """Búsqueda de habitaciones disponibles por fecha y tipo"""
-    with get_db() as conn:
+async def buscar_habitaciones(busqueda: BusquedaHabitaciones, fields: Optional[str] = None):
+    """
+    Búsqueda de habitaciones disponibles por fecha y tipo
+
+    `fields` (por ejemplo `id,precio_total`) limita los campos de cada
+    habitación a los indicados.
+    """
+    campos = _seleccion(HabitacionDisponible, fields)
+    with get_db_lectura() as conn:
         cursor = conn.cursor()
         
         # Validar fechas
@@ -289,221 +2222,756 @@ async def buscar_habitaciones(busqueda: BusquedaHabitaciones):
         if busqueda.fecha_inicio < date.today():
             raise HTTPException(status_code=400, detail="No se pueden buscar fechas pasadas")
         
-        # Construir query
-        query = """
-            SELECT h.* FROM habitaciones h
-            WHERE h.disponible = 1
-            AND h.capacidad >= ?
-            AND h.id NOT IN (
-                SELECT habitacion_id FROM reservas
-                WHERE estado IN ('confirmada', 'pendiente')
-                AND (
-                    (fecha_inicio <= ? AND fecha_fin > ?)
-                    OR (fecha_inicio < ? AND fecha_fin >= ?)
-                    OR (fecha_inicio >= ? AND fecha_fin <= ?)
-                )
-            )
-        """
-        
-        params = [
-            busqueda.huespedes,
-            busqueda.fecha_inicio, busqueda.fecha_inicio,
-            busqueda.fecha_fin, busqueda.fecha_fin,
-            busqueda.fecha_inicio, busqueda.fecha_fin
-        ]
-        
-        if busqueda.tipo_habitacion:
-            query += " AND h.tipo = ?"
-            params.append(busqueda.tipo_habitacion)
+        if (busqueda.precio_min is not None and busqueda.precio_max is not None
+                and busqueda.precio_min > busqueda.precio_max):
+            raise HTTPException(status_code=400, detail="precio_min no puede ser mayor que precio_max")
         
-        query += " ORDER BY h.tipo, h.precio_noche"
+        clave = (*busqueda.model_dump().values(), campos)
+        # El resultado ya es JSON nativo: se renderiza sin pasar por jsonable_encoder
+        return RespuestaNegociada(cache_busquedas.obtener(cursor, clave, lambda: _buscar_en_bd(cursor, busqueda, campos)))
+
+def _filtro_disponibles(busqueda: BusquedaHabitaciones):
+    """WHERE común: habitaciones activas, con capacidad y sin reservas que se solapen (R*Tree)"""
+    # "+h.capacidad": el filtro de capacidad no debe llevar a SQLite a preferir un
+    # índice que obligue a ordenar; los índices de orden recorren disponible = 1
+    condiciones = """
+        h.disponible = 1
+        AND +h.capacidad >= ?
+        AND h.id NOT IN (
+            SELECT habitacion_min FROM reservas_intervalos
+            WHERE fecha_inicio < ? AND fecha_fin > ?
+        )
+    """
+    params = [busqueda.huespedes, a_dia(busqueda.fecha_fin), a_dia(busqueda.fecha_inicio)]
+    
+    if busqueda.tipo_habitacion:
+        condiciones += " AND h.tipo = ?"
+        params.append(busqueda.tipo_habitacion)
+    
+    return condiciones, params
+
+# Columna de cada campo de HabitacionDisponible; precio_total y noches se calculan
+COLUMNAS_HABITACION = {
+    "id": "h.id",
+    "numero": "h.numero",
+    "tipo": "h.tipo",
+    "capacidad": "h.capacidad",
+    "precio_noche": "h.precio_noche",
+    "descripcion": "h.descripcion",
+}
+CAMPOS_HABITACION = tuple(HabitacionDisponible.model_fields)
+
+class MapeadorHabitaciones:
+    """
+    Columnas a leer y armado de cada habitación para una selección de campos
+
+    `sql` siempre empieza por h.id (hace falta para el precio y el cursor).
+    Cada fila se arma con un itemgetter sobre (*columnas, precio_total, noches).
+    """
+
+    def __init__(self, campos: tuple):
+        columnas = ["id"] + [campo for campo in campos if campo in COLUMNAS_HABITACION and campo != "id"]
+        self.sql = ", ".join(COLUMNAS_HABITACION[columna] for columna in columnas)
+        self.claves = campos
+        self.calcula_total = "precio_total" in campos
+        calculados = {"precio_total": len(columnas), "noches": len(columnas) + 1}
+        posiciones = [columnas.index(campo) if campo in COLUMNAS_HABITACION else calculados[campo]
+                      for campo in campos]
+        obtener = itemgetter(*posiciones)
+        # Con un solo campo itemgetter devuelve el valor suelto
+        self.obtener = obtener if len(posiciones) > 1 else lambda valores: (obtener(valores),)
+
+    def filas(self, habitaciones, totales, noches: int) -> list:
+        claves, obtener = self.claves, self.obtener
+        return [dict(zip(claves, obtener((*hab, total, noches)))) for hab, total in zip(habitaciones, totales)]
+
+@lru_cache(maxsize=256)
+def mapeador_habitaciones(campos: Optional[tuple]) -> MapeadorHabitaciones:
+    return MapeadorHabitaciones(campos or CAMPOS_HABITACION)
+
+def _fila_habitacion(hab, precio_total: float, noches: int) -> dict:
+    return {
+        "id": hab[0],
+        "numero": hab[1],
+        "tipo": hab[2],
+        "capacidad": hab[3],
+        "precio_noche": hab[4],
+        "precio_total": precio_total,
+        "noches": noches,
+        "descripcion": hab[5]
+    }
+
+def _en_rango_precio(totales_centavos: np.ndarray, noches: int, busqueda: BusquedaHabitaciones) -> np.ndarray:
+    """Máscara de los totales cuyo promedio por noche cae en [precio_min, precio_max]"""
+    mascara = np.ones(len(totales_centavos), dtype=bool)
+    if busqueda.precio_min is not None:
+        mascara &= totales_centavos >= a_centavos(busqueda.precio_min) * noches
+    if busqueda.precio_max is not None:
+        mascara &= totales_centavos <= a_centavos(busqueda.precio_max) * noches
+    return mascara
+
+def _buscar_en_bd(cursor, busqueda: BusquedaHabitaciones, campos: Optional[tuple] = None):
+    noches = (busqueda.fecha_fin - busqueda.fecha_inicio).days
+    mapeador = mapeador_habitaciones(campos)
+    paginada = busqueda.orden is not None or busqueda.limite is not None or busqueda.cursor is not None
+    if paginada:
+        resultado, siguiente = _buscar_pagina(cursor, busqueda, noches, mapeador)
+    else:
+        resultado = _buscar_todas(cursor, busqueda, noches, mapeador)
+    
+    respuesta = {
+        "success": True,
+        "habitaciones_disponibles": len(resultado),
+        "fecha_inicio": str(busqueda.fecha_inicio),
+        "fecha_fin": str(busqueda.fecha_fin),
+        "noches": noches,
+        "habitaciones": resultado
+    }
+    if paginada:
+        # En una respuesta paginada habitaciones_disponibles cuenta sólo las de esta página
+        respuesta["siguiente_cursor"] = siguiente
+    if not resultado and busqueda.cursor is None and busqueda.dias_flexibles:
+        respuesta["alternativas"] = _buscar_alternativas(cursor, busqueda, noches)
+    return respuesta
+
+def _buscar_alternativas(cursor, busqueda: BusquedaHabitaciones, noches: int) -> list:
+    """Ventanas cercanas de la misma duración con habitaciones del tipo, capacidad y precio pedidos"""
+    query = "SELECT h.id FROM habitaciones h WHERE h.disponible = 1 AND h.capacidad >= ?"
+    params = [busqueda.huespedes]
+    if busqueda.tipo_habitacion:
+        query += " AND h.tipo = ?"
+        params.append(busqueda.tipo_habitacion)
+    cursor.execute(query + " ORDER BY h.id", params)
+    habitacion_ids = np.array([fila[0] for fila in cursor.fetchall()], dtype=np.int64)
+    
+    calendario = calendario_tarifas(cursor)
+    resultado = []
+    for ventana in alternativas(cursor, habitacion_ids, a_dia(busqueda.fecha_inicio), noches,
+                                busqueda.dias_flexibles, dia_hoy()):
+        fecha_inicio, fecha_fin = desde_dia(ventana["inicio"]), desde_dia(ventana["inicio"] + noches)
+        totales = calendario.totales_centavos(ventana["habitaciones"], fecha_inicio, fecha_fin)
+        totales = totales[_en_rango_precio(totales, noches, busqueda)]
+        if len(totales) == 0:
+            continue
+        resultado.append({
+            "fecha_inicio": str(fecha_inicio),
+            "fecha_fin": str(fecha_fin),
+            "desplazamiento_dias": ventana["desplazamiento"],
+            "habitaciones_disponibles": len(totales),
+            "precio_total_desde": int(totales.min()) / 100
+        })
+        if len(resultado) == ALTERNATIVAS_MAXIMAS:
+            break
+    return resultado
+
+def _buscar_todas(cursor, busqueda: BusquedaHabitaciones, noches: int, mapeador: MapeadorHabitaciones) -> list:
+    """Respuesta sin paginar: todas las habitaciones libres, por tipo y precio base"""
+    condiciones, params = _filtro_disponibles(busqueda)
+    cursor.execute(f"""
+        SELECT {mapeador.sql}
+        FROM habitaciones h
+        WHERE {condiciones}
+        ORDER BY h.tipo, h.precio_noche
+    """, params)
+    habitaciones = cursor.fetchall()
+    
+    filtra_precio = busqueda.precio_min is not None or busqueda.precio_max is not None
+    if not mapeador.calcula_total and not filtra_precio:
+        # Sin precio_total en la respuesta no hace falta el calendario de tarifas
+        return mapeador.filas(habitaciones, [None] * len(habitaciones), noches)
+    
+    # Calcular precio total (todas las habitaciones en una sola operación)
+    totales = calendario_tarifas(cursor).totales_centavos(
+        [hab[0] for hab in habitaciones], busqueda.fecha_inicio, busqueda.fecha_fin
+    )
+    if filtra_precio:
+        seleccion = np.flatnonzero(_en_rango_precio(totales, noches, busqueda))
+        habitaciones = [habitaciones[i] for i in seleccion]
+        totales = totales[seleccion]
+    
+    return mapeador.filas(habitaciones, (totales / 100).tolist(), noches)
+
+def _codificar_cursor(orden: str, descendente: bool, clave: int, habitacion_id: int) -> str:
+    datos = json.dumps([orden, descendente, clave, habitacion_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(datos.encode()).decode()
+
+def _leer_cursor(busqueda: BusquedaHabitaciones, orden: str) -> Optional[tuple]:
+    """(clave, id) de la última habitación de la página anterior, o None en la primera"""
+    if busqueda.cursor is None:
+        return None
+    try:
+        cursor_orden, descendente, clave, habitacion_id = json.loads(base64.urlsafe_b64decode(busqueda.cursor))
+        clave, habitacion_id = int(clave), int(habitacion_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    if cursor_orden != orden or descendente != busqueda.descendente:
+        raise HTTPException(status_code=400, detail="El cursor corresponde a otro orden")
+    return clave, habitacion_id
+
+def _buscar_pagina(cursor, busqueda: BusquedaHabitaciones, noches: int, mapeador: MapeadorHabitaciones):
+    """
+    Una página ordenada por precio total o capacidad, con paginación por clave
+
+    El cursor guarda la clave de orden (precio total en centavos o capacidad)
+    y el id de la última habitación entregada; la página siguiente empieza
+    estrictamente después, así que no se repiten ni se saltan habitaciones
+    aunque cambien las anteriores.
+
+    Si ninguna tarifa toca la estancia, el total es precio_noche × noches y
+    todo (filtro de precio, orden y LIMIT) se resuelve en SQL sobre los
+    índices ordenados. Si hay tarifas, SQL filtra disponibilidad y el precio
+    se calcula vectorizado; `argpartition` elige las k primeras sin ordenar
+    todas las candidatas.
+    """
+    orden = busqueda.orden or "precio"
+    limite = busqueda.limite or LIMITE_BUSQUEDA_DEFECTO
+    posicion = _leer_cursor(busqueda, orden)
+    calendario = calendario_tarifas(cursor)
+    condiciones, params = _filtro_disponibles(busqueda)
+    filtra_precio = busqueda.precio_min is not None or busqueda.precio_max is not None
+    
+    if not calendario.hay_reglas(busqueda.fecha_inicio, busqueda.fecha_fin) or (orden == "capacidad" and not filtra_precio):
+        # El total en centavos de cada habitación es proporcional a su precio base en centavos:
+        # orden, filtro y cursor usan esa misma clave, como la ruta numpy
+        centavos = CENTAVOS_PRECIO_SQL.replace("precio_noche", "h.precio_noche")
+        clave_sql = f"{centavos} * ?" if orden == "precio" else "h.capacidad"
+        params_clave = [noches] if orden == "precio" else []
+        columna_orden = centavos if orden == "precio" else "h.capacidad"
+        if busqueda.precio_min is not None:
+            condiciones += f" AND {centavos} >= ?"
+            params.append(a_centavos(busqueda.precio_min))
+        if busqueda.precio_max is not None:
+            condiciones += f" AND {centavos} <= ?"
+            params.append(a_centavos(busqueda.precio_max))
+        if posicion is not None:
+            condiciones += f" AND ({clave_sql}, h.id) {'<' if busqueda.descendente else '>'} (?, ?)"
+            params += params_clave + list(posicion)
+        sentido = "DESC" if busqueda.descendente else "ASC"
+        cursor.execute(f"""
+            SELECT {mapeador.sql}, {clave_sql}
+            FROM habitaciones h
+            WHERE {condiciones}
+            ORDER BY {columna_orden} {sentido}, h.id {sentido}
+            LIMIT ?
+        """, params_clave + params + [limite + 1])
+        filas = cursor.fetchall()
+        # La clave de orden va al final de cada fila: se guarda para el cursor y se quita antes de mapear
+        claves = [fila[-1] for fila in filas[:limite]]
+        pagina = [fila[:-1] for fila in filas[:limite]]
+        totales = calendario.totales_centavos([fila[0] for fila in pagina], busqueda.fecha_inicio, busqueda.fecha_fin)
+    else:
+        cursor.execute(f"SELECT h.id, h.capacidad FROM habitaciones h WHERE {condiciones}", params)
+        candidatas = cursor.fetchall()
+        ids = np.array([fila[0] for fila in candidatas], dtype=np.int64)
+        todos_totales = calendario.totales_centavos(ids, busqueda.fecha_inicio, busqueda.fecha_fin)
+        todas_claves = todos_totales if orden == "precio" else np.array([fila[1] for fila in candidatas], dtype=np.int64)
         
-        cursor.execute(query, params)
-        habitaciones = cursor.fetchall()
+        # Clave compuesta (clave, id) en un solo entero; negada para orden descendente
+        compuesta = todas_claves * (1 << 32) + ids
+        if busqueda.descendente:
+            compuesta = -compuesta
+        mascara = _en_rango_precio(todos_totales, noches, busqueda)
+        if posicion is not None:
+            limite_cursor = posicion[0] * (1 << 32) + posicion[1]
+            mascara &= compuesta > (-limite_cursor if busqueda.descendente else limite_cursor)
+        seleccion = np.flatnonzero(mascara)
         
-        # Calcular noches y precio total
-        noches = (busqueda.fecha_fin - busqueda.fecha_inicio).days
+        k = limite + 1
+        if len(seleccion) > k:
+            seleccion = seleccion[np.argpartition(compuesta[seleccion], k - 1)[:k]]
+        seleccion = seleccion[np.argsort(compuesta[seleccion])]
         
-        resultado = []
-        for hab in habitaciones:
-            resultado.append({
-                "id": hab[0],
-                "numero": hab[1],
-                "tipo": hab[2],
-                "capacidad": hab[3],
-                "precio_noche": hab[4],
-                "precio_total": hab[4] * noches,
-                "noches": noches,
-                "descripcion": hab[5]
-            })
+        filas = seleccion.tolist()
+        elegidas = seleccion[:limite]
+        claves = todas_claves[elegidas].tolist()
+        totales = todos_totales[elegidas]
+        # Sólo se leen los datos completos de las habitaciones de la página
+        pagina_ids = ids[elegidas].tolist()
+        cursor.execute(f"""
+            SELECT {mapeador.sql} FROM habitaciones h
+            WHERE h.id IN ({",".join("?" * len(pagina_ids))})
+        """, pagina_ids)
+        por_id = {fila[0]: fila for fila in cursor.fetchall()}
+        pagina = [por_id[habitacion_id] for habitacion_id in pagina_ids]
+    
+    resultado = mapeador.filas(pagina, (totales / 100).tolist(), noches)
+    siguiente = None
+    if len(filas) > limite:
+        siguiente = _codificar_cursor(orden, busqueda.descendente, claves[-1], pagina[-1][0])
+    return resultado, siguiente
+
+@app.post("/disponibilidad-tipos")
+async def disponibilidad_por_tipo(busqueda: BusquedaHabitaciones):
+    """Habitaciones libres por tipo según el inventario (sin recorrer habitaciones ni reservas)"""
+    if busqueda.fecha_inicio >= busqueda.fecha_fin:
+        raise HTTPException(status_code=400, detail="La fecha de fin debe ser posterior a la fecha de inicio")
+    
+    if busqueda.fecha_inicio < date.today():
+        raise HTTPException(status_code=400, detail="No se pueden buscar fechas pasadas")
+    
+    with get_db_lectura() as conn:
+        tipos = tipos_disponibles(conn.cursor(), busqueda.fecha_inicio, busqueda.fecha_fin,
+                                  busqueda.huespedes, busqueda.tipo_habitacion)
         
         return {
             "success": True,
-            "habitaciones_disponibles": len(resultado),
             "fecha_inicio": str(busqueda.fecha_inicio),
             "fecha_fin": str(busqueda.fecha_fin),
-            "noches": noches,
-            "habitaciones": resultado
+            "noches": (busqueda.fecha_fin - busqueda.fecha_inicio).days,
+            "tipos": tipos
         }
 
+# Comentario SSE periódico para que proxies y clientes no den la conexión por muerta
+LATIDO_SSE_SEGUNDOS = 15
+
+def _evento_sse(nombre: str, datos: dict) -> str:
+    return f"event: {nombre}\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n"
+
+@app.get("/disponibilidad/stream")
+async def disponibilidad_stream(fecha_inicio: date, fecha_fin: date, tipo_habitacion: Optional[str] = None,
+                                huespedes: int = 1):
+    """
+    Disponibilidad por tipo en vivo (Server-Sent Events)
+
+    Envía primero un evento `disponibilidad` con la misma información que
+    /disponibilidad-tipos y después un evento `cambio` con los tipos cuyo
+    valor cambió, cada vez que una reserva o el catálogo lo modifican.
+    """
+    if fecha_inicio >= fecha_fin:
+        raise HTTPException(status_code=400, detail="La fecha de fin debe ser posterior a la fecha de inicio")
+    if fecha_inicio < date.today():
+        raise HTTPException(status_code=400, detail="No se pueden buscar fechas pasadas")
+    if (fecha_fin - fecha_inicio).days > MAX_NOCHES_SUSCRIPCION:
+        raise HTTPException(status_code=400, detail=f"Se admiten como máximo {MAX_NOCHES_SUSCRIPCION} noches")
+    if len(difusor_disponibilidad.indice) >= MAX_SUSCRIPCIONES:
+        raise HTTPException(status_code=503, detail="Demasiadas suscripciones, intenta de nuevo")
+    
+    suscripcion = Suscripcion(a_dia(fecha_inicio), a_dia(fecha_fin), tipo_habitacion, huespedes)
+    
+    async def generar():
+        # Se registra dentro del generador: si la respuesta nunca empieza, no queda suscripción huérfana
+        tipos = await difusor_disponibilidad.suscribir(suscripcion)
+        try:
+            yield _evento_sse("disponibilidad", {
+                "fecha_inicio": str(fecha_inicio),
+                "fecha_fin": str(fecha_fin),
+                "noches": (fecha_fin - fecha_inicio).days,
+                "tipos": tipos
+            })
+            while True:
+                try:
+                    await asyncio.wait_for(suscripcion.aviso.wait(), LATIDO_SSE_SEGUNDOS)
+                except asyncio.TimeoutError:
+                    yield ": latido\n\n"
+                    continue
+                if suscripcion.cerrada:
+                    break
+                yield _evento_sse("cambio", {"tipos": suscripcion.tomar_cambios()})
+        finally:
+            difusor_disponibilidad.desuscribir(suscripcion)
+    
+    return StreamingResponse(
+        generar(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/buscar-grupo")
+async def buscar_grupo(busqueda: BusquedaGrupo):
+    """Combinación de habitaciones libres que cubre un grupo, la más barata o la de menos habitaciones"""
+    if busqueda.fecha_inicio >= busqueda.fecha_fin:
+        raise HTTPException(status_code=400, detail="La fecha de fin debe ser posterior a la fecha de inicio")
+    
+    if busqueda.fecha_inicio < date.today():
+        raise HTTPException(status_code=400, detail="No se pueden buscar fechas pasadas")
+    
+    with get_db_lectura() as conn:
+        cursor = conn.cursor()
+        clave = ("grupo",) + tuple(busqueda.model_dump().values())
+        return cache_busquedas.obtener(cursor, clave, lambda: _buscar_grupo_en_bd(cursor, busqueda))
+
+def _buscar_grupo_en_bd(cursor, busqueda: BusquedaGrupo):
+    # Todas las habitaciones libres (de cualquier capacidad) son candidatas
+    condiciones, params = _filtro_disponibles(BusquedaHabitaciones(
+        fecha_inicio=busqueda.fecha_inicio,
+        fecha_fin=busqueda.fecha_fin,
+        tipo_habitacion=busqueda.tipo_habitacion,
+        huespedes=1
+    ))
+    cursor.execute(f"""
+        SELECT h.id, h.numero, h.tipo, h.capacidad, h.precio_noche, h.descripcion
+        FROM habitaciones h
+        WHERE {condiciones}
+        ORDER BY h.id
+    """, params)
+    habitaciones = cursor.fetchall()
+    
+    noches = (busqueda.fecha_fin - busqueda.fecha_inicio).days
+    totales = calendario_tarifas(cursor).totales_centavos(
+        [hab[0] for hab in habitaciones], busqueda.fecha_inicio, busqueda.fecha_fin
+    )
+    elegidas = combinacion_optima(
+        np.array([hab[3] for hab in habitaciones], dtype=np.int64),
+        costos_combinacion(totales, busqueda.criterio),
+        busqueda.huespedes
+    )
+    if elegidas is None:
+        elegidas = np.zeros(0, dtype=np.int64)
+    
+    resultado = [
+        _fila_habitacion(habitaciones[i], total, noches)
+        for i, total in zip(elegidas.tolist(), (totales[elegidas] / 100).tolist())
+    ]
+    return {
+        "success": True,
+        "combinacion_encontrada": bool(resultado),
+        "huespedes": busqueda.huespedes,
+        "fecha_inicio": str(busqueda.fecha_inicio),
+        "fecha_fin": str(busqueda.fecha_fin),
+        "noches": noches,
+        "numero_habitaciones": len(resultado),
+        "capacidad_total": sum(hab["capacidad"] for hab in resultado),
+        "precio_total": int(totales[elegidas].sum()) / 100,
+        "habitaciones": resultado
+    }
+
 @app.post("/reservar")
 async def crear_reserva(reserva: ReservaCreate, usuario_actual = Depends(verificar_token)):
     """Crear nueva reserva con validación de disponibilidad"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        
-        # Validar fechas
-        if reserva.fecha_inicio >= reserva.fecha_fin:
-            raise HTTPException(status_code=400, detail="Fechas inválidas")
-        
-        # Verificar disponibilidad
-        cursor.execute("""
-            SELECT COUNT(*) FROM reservas
-            WHERE habitacion_id = ?
-            AND estado IN ('confirmada', 'pendiente')
-            AND (
-                (fecha_inicio <= ? AND fecha_fin > ?)
-                OR (fecha_inicio < ? AND fecha_fin >= ?)
-                OR (fecha_inicio >= ? AND fecha_fin <= ?)
-            )
-        """, (
-            reserva.habitacion_id,
-            reserva.fecha_inicio, reserva.fecha_inicio,
-            reserva.fecha_fin, reserva.fecha_fin,
-            reserva.fecha_inicio, reserva.fecha_fin
-        ))
-        
-        if cursor.fetchone()[0] > 0:
-            raise HTTPException(status_code=409, detail="Habitación no disponible en las fechas seleccionadas")
-        
-        # Obtener precio de habitación
-        cursor.execute("SELECT precio_noche, capacidad FROM habitaciones WHERE id = ?", 
-                      (reserva.habitacion_id,))
-        habitacion = cursor.fetchone()
-        
-        if not habitacion:
-            raise HTTPException(status_code=404, detail="Habitación no encontrada")
-        
-        if habitacion[1] < reserva.huespedes:
-            raise HTTPException(status_code=400, detail="La habitación no tiene capacidad suficiente")
-        
-        # Calcular precio total
-        noches = (reserva.fecha_fin - reserva.fecha_inicio).days
-        precio_total = habitacion[0] * noches
-        
-        # Crear reserva
-        cursor.execute("""
-            INSERT INTO reservas (usuario_id, habitacion_id, fecha_inicio, fecha_fin, huespedes, precio_total, estado)
-            VALUES (?, ?, ?, ?, ?, ?, 'pendiente')
-        """, (
-            usuario_actual["usuario_id"],
-            reserva.habitacion_id,
-            reserva.fecha_inicio,
-            reserva.fecha_fin,
-            reserva.huespedes,
-            precio_total
-        ))
-        
-        reserva_id = cursor.lastrowid
-        
-        return {
-            "success": True,
-            "mensaje": "Reserva creada exitosamente",
-            "reserva_id": reserva_id,
-            "precio_total": precio_total,
-            "noches": noches,
-            "estado": "pendiente"
-        }
+    # Validar fechas
+    if reserva.fecha_inicio >= reserva.fecha_fin:
+        raise HTTPException(status_code=400, detail="Fechas inválidas")
+    
+    if (reserva.habitacion_id is None) == (reserva.tipo_habitacion is None):
+        raise HTTPException(status_code=400, detail="Indica habitacion_id o tipo_habitacion (sólo uno)")
+    
+    return await ejecutar_escritura_agrupable(operacion_reserva, reserva, usuario_actual["usuario_id"])
+
+@app.post("/reservar-grupo")
+async def crear_reserva_grupo(reserva: ReservaGrupoCreate, usuario_actual = Depends(verificar_token)):
+    """Reservar atómicamente la combinación de habitaciones de /buscar-grupo"""
+    if reserva.fecha_inicio >= reserva.fecha_fin:
+        raise HTTPException(status_code=400, detail="Fechas inválidas")
+    
+    return await ejecutar_escritura_agrupable(operacion_reserva_grupo, reserva, usuario_actual["usuario_id"])
+
+@app.post("/reservas/{reserva_id}/cancelar")
+async def cancelar_reserva(reserva_id: int, usuario_actual = Depends(verificar_token)):
+    """Cancelar una reserva propia y devolver sus noches al inventario"""
+    return await ejecutar_escritura_agrupable(operacion_cancelacion, reserva_id, usuario_actual["usuario_id"])
 
 @app.post("/pagar")
 async def procesar_pago(pago: PagoSimulado, usuario_actual = Depends(verificar_token)):
-    """Simulación de proceso de pago"""
-    with get_db() as conn:
+    """
+    Pagar una reserva pendiente
+
+    Con la pasarela instantánea responde el pago aprobado. Con pagos
+    asíncronos responde 202 con el `pago_id`; su resultado se consulta en
+    GET /pagos/{pago_id}.
+    """
+    if not PAGOS_ASINCRONOS and isinstance(cliente_pagos.pasarela, PasarelaInstantanea):
+        return await ejecutar_escritura_agrupable(operacion_pago, pago, usuario_actual["usuario_id"])
+    
+    # Fallar antes de registrar nada si el cobro no podría hacerse
+    if not cliente_pagos.admite_cobros() or (PAGOS_ASINCRONOS and procesador_pagos.lleno()):
+        raise HTTPException(status_code=503, detail="Pasarela de pagos no disponible, intenta más tarde")
+    
+    iniciado = await ejecutar_escritura_agrupable(operacion_iniciar_pago, pago, usuario_actual["usuario_id"])
+    if PAGOS_ASINCRONOS:
+        procesador_pagos.encolar(iniciado["pago_id"], iniciado["monto"], iniciado["ultimos_4_digitos"])
+        return RespuestaNegociada(
+            status_code=202,
+            content={"success": True, "mensaje": "Pago en proceso", "pago_id": iniciado["pago_id"],
+                     "estado": "procesando", "consultar": f"/pagos/{iniciado['pago_id']}"},
+            headers={"Location": f"/pagos/{iniciado['pago_id']}"}
+        )
+    
+    # Cobro dentro de la petición: la respuesta espera a la pasarela
+    resultado = await completar_cobro(iniciado["pago_id"], iniciado["monto"], iniciado["ultimos_4_digitos"])
+    if resultado["estado"] == "rechazado":
+        raise HTTPException(status_code=402, detail=resultado["motivo"])
+    if resultado["estado"] != "aprobado":
+        raise HTTPException(status_code=502, detail=resultado["motivo"])
+    return {"success": True, "mensaje": "Pago procesado exitosamente", **resultado}
+
+@app.get("/pagos/{pago_id}")
+async def consultar_pago(pago_id: int, usuario_actual = Depends(verificar_token)):
+    """Estado de un pago propio: procesando, aprobado, rechazado, error o anulado"""
+    with get_db_lectura() as conn:
+        pago = estado_pago(conn.cursor(), pago_id, usuario_actual["usuario_id"])
+    if pago is None:
+        raise HTTPException(status_code=404, detail="Pago no encontrado")
+    return {"success": True, **pago}
+
+# Documentos del historial ya convertidos a MessagePack (por worker)
+conversor_msgpack = ConversorDocumentos()
+
+@app.get("/mis-reservas")
+async def obtener_mis_reservas(fields: Optional[str] = None, usuario_actual = Depends(verificar_token)):
+    """
+    Obtener todas las reservas del usuario autenticado
+
+    `fields` (por ejemplo `id,estado,habitacion.numero`) limita los campos de
+    cada reserva a los indicados.
+    """
+    campos = _seleccion(ReservaHistorial, fields)
+    with get_db_lectura() as conn:
+        # Modelo de lectura: documentos ya unidos con la habitación, serializados y en orden
+        reservas = historial_usuario(conn.cursor(), usuario_actual["usuario_id"], campos)
+    
+    if formato_respuesta() == "msgpack":
+        return Response(
+            content=conversor_msgpack.mapa_con_lista({"success": True, "total_reservas": len(reservas)},
+                                                     "reservas", reservas),
+            media_type=TIPO_MSGPACK
+        )
+    return Response(
+        content=f'{{"success":true,"total_reservas":{len(reservas)},"reservas":[{",".join(reservas)}]}}',
+        media_type="application/json"
+    )
+
+@app.get("/admin/tarifas")
+async def listar_tarifas(admin = Depends(verificar_admin)):
+    """Listar las reglas del calendario de tarifas"""
+    with get_db_lectura() as conn:
         cursor = conn.cursor()
-        
-        # Verificar que la reserva existe y pertenece al usuario
-        cursor.execute("""
-            SELECT id, precio_total, estado FROM reservas
-            WHERE id = ? AND usuario_id = ?
-        """, (pago.reserva_id, usuario_actual["usuario_id"]))
-        
-        reserva = cursor.fetchone()
-        
-        if not reserva:
-            raise HTTPException(status_code=404, detail="Reserva no encontrada")
-        
-        if reserva[2] != 'pendiente':
-            raise HTTPException(status_code=400, detail="La reserva ya fue procesada")
-        
-        # Validaciones básicas de tarjeta (simuladas)
-        if len(pago.numero_tarjeta) != 16 or not pago.numero_tarjeta.isdigit():
-            raise HTTPException(status_code=400, detail="Número de tarjeta inválido")
-        
-        if len(pago.cvv) != 3 or not pago.cvv.isdigit():
-            raise HTTPException(status_code=400, detail="CVV inválido")
-        
-        # Simular procesamiento de pago (siempre exitoso en esta versión)
-        codigo_transaccion = f"TXN-{secrets.token_hex(8).upper()}"
-        ultimos_4 = pago.numero_tarjeta[-4:]
-        
-        # Registrar pago
-        cursor.execute("""
-            INSERT INTO pagos (reserva_id, monto, metodo_pago, ultimos_4_digitos, estado, codigo_transaccion)
-            VALUES (?, ?, ?, ?, 'aprobado', ?)
-        """, (pago.reserva_id, reserva[1], pago.metodo_pago, ultimos_4, codigo_transaccion))
-        
-        # Actualizar estado de reserva
-        cursor.execute("""
-            UPDATE reservas SET estado = 'confirmada' WHERE id = ?
-        """, (pago.reserva_id,))
-        
+        cursor.execute("SELECT * FROM tarifas ORDER BY fecha_inicio, prioridad")
+        tarifas = []
+        for fila in cursor.fetchall():
+            tarifa = dict(fila)
+            tarifa["fecha_inicio"] = texto_dia(tarifa["fecha_inicio"])
+            tarifa["fecha_fin"] = texto_dia(tarifa["fecha_fin"])
+            tarifas.append(tarifa)
         return {
             "success": True,
-            "mensaje": "Pago procesado exitosamente",
-            "codigo_transaccion": codigo_transaccion,
-            "monto": reserva[1],
-            "metodo_pago": pago.metodo_pago,
-            "ultimos_4_digitos": ultimos_4,
-            "estado": "aprobado"
+            "tarifas": tarifas
         }
 
-@app.get("/mis-reservas")
-async def obtener_mis_reservas(usuario_actual = Depends(verificar_token)):
-    """Obtener todas las reservas del usuario autenticado"""
-    with get_db() as conn:
+@app.post("/admin/tarifas")
+async def crear_tarifa(tarifa: TarifaCreate, admin = Depends(verificar_admin)):
+    """Crear una temporada o excepción de precio"""
+    if tarifa.fecha_inicio >= tarifa.fecha_fin:
+        raise HTTPException(status_code=400, detail="Fechas inválidas")
+    if (tarifa.precio_noche is None) == (tarifa.multiplicador is None):
+        raise HTTPException(status_code=400, detail="Indica precio_noche o multiplicador (sólo uno)")
+    if tarifa.tipo is not None and tarifa.habitacion_id is not None:
+        raise HTTPException(status_code=400, detail="Una tarifa aplica a un tipo o a una habitación, no a ambos")
+    return await asyncio.to_thread(ejecutar_escritura, operacion_crear_tarifa, tarifa)
+
+@app.delete("/admin/tarifas/{tarifa_id}")
+async def eliminar_tarifa(tarifa_id: int, admin = Depends(verificar_admin)):
+    """Eliminar una regla del calendario de tarifas"""
+    return await asyncio.to_thread(ejecutar_escritura, operacion_eliminar_tarifa, tarifa_id)
+
+# Directorio donde /admin/instantanea deja las copias de la base de datos
+DIRECTORIO_INSTANTANEAS = os.environ.get("HOTEL_DIRECTORIO_INSTANTANEAS", "instantaneas")
+
+@app.post("/admin/instantanea")
+async def crear_instantanea_bd(admin = Depends(verificar_admin)):
+    """Copia consistente de la base de datos en línea (API de backup por pasos)"""
+    os.makedirs(DIRECTORIO_INSTANTANEAS, exist_ok=True)
+    destino = os.path.join(DIRECTORIO_INSTANTANEAS, f"hotel_booking-{datetime.now():%Y%m%d-%H%M%S}.db")
+    # En un hilo aparte: la copia puede tardar y el event loop sigue atendiendo peticiones
+    resultado = await asyncio.to_thread(crear_instantanea, DATABASE, destino)
+    return {"success": True, **resultado}
+
+@app.get("/admin/exportar/{tabla}")
+async def exportar_tabla(tabla: str, formato: str = "csv", admin = Depends(verificar_admin)):
+    """Exportar reservas, pagos o usuarios (sin secretos) como CSV o Parquet por bloques"""
+    if tabla not in TABLAS_EXPORTABLES:
+        raise HTTPException(status_code=404, detail="Tabla no exportable")
+    if formato not in FORMATOS:
+        raise HTTPException(status_code=400, detail="Formato no soportado (csv o parquet)")
+    try:
+        contenido = exportar(DATABASE, tabla, formato)
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    return StreamingResponse(
+        contenido,
+        media_type=FORMATOS[formato],
+        headers={"Content-Disposition": f'attachment; filename="{tabla}.{formato}"'}
+    )
+
+# Eventos máximos por página de /admin/eventos
+MAX_EVENTOS_PAGINA = 1000
+
+@app.get("/admin/eventos")
+async def leer_eventos(desde: int = 0, limite: int = 100, tipo: Optional[str] = None,
+                       admin = Depends(verificar_admin)):
+    """
+    Eventos posteriores a `desde` en orden de publicación
+
+    Para seguir el registro de forma incremental se vuelve a llamar con
+    `desde = siguiente`.
+    """
+    if not 1 <= limite <= MAX_EVENTOS_PAGINA:
+        raise HTTPException(status_code=400, detail=f"El límite debe estar entre 1 y {MAX_EVENTOS_PAGINA}")
+    with get_db_lectura() as conn:
         cursor = conn.cursor()
         cursor.execute("""
-            SELECT r.id, r.fecha_inicio, r.fecha_fin, r.huespedes, r.precio_total, r.estado,
-                   h.numero, h.tipo, h.descripcion
-            FROM reservas r
-            JOIN habitaciones h ON r.habitacion_id = h.id
-            WHERE r.usuario_id = ?
-            ORDER BY r.fecha_reserva DESC
-        """, (usuario_actual["usuario_id"],))
-        
-        reservas = cursor.fetchall()
-        
-        resultado = []
-        for r in reservas:
-            resultado.append({
-                "id": r[0],
-                "fecha_inicio": r[1],
-                "fecha_fin": r[2],
-                "huespedes": r[3],
-                "precio_total": r[4],
-                "estado": r[5],
-                "habitacion": {
-                    "numero": r[6],
-                    "tipo": r[7],
-                    "descripcion": r[8]
-                }
+            SELECT id, tipo, usuario_id, reserva_id, datos, fecha FROM eventos
+            WHERE id > ? AND (? IS NULL OR tipo = ?)
+            ORDER BY id LIMIT ?
+        """, (desde, tipo, tipo, limite))
+        eventos = [
+            {
+                "id": fila[0],
+                "tipo": fila[1],
+                "usuario_id": fila[2],
+                "reserva_id": fila[3],
+                "datos": json.loads(fila[4]),
+                "fecha": datetime.fromtimestamp(fila[5]).isoformat()
+            }
+            for fila in cursor.fetchall()
+        ]
+    return {
+        "success": True,
+        "eventos": eventos,
+        "siguiente": eventos[-1]["id"] if eventos else desde
+    }
+
+# Errores por fila incluidos en la respuesta de una importación (el total siempre se informa)
+MAX_ERRORES_IMPORTACION = 1000
+# El catálogo se aplica en una sola transacción: se limita su tamaño
+MAX_HABITACIONES_IMPORTACION = 50_000
+
+validador_usuarios = TypeAdapter(List[UsuarioImportado])
+validador_habitaciones = TypeAdapter(List[HabitacionImportada])
+
+async def _lotes_importacion(request: Request, formato: str):
+    """Registros del cuerpo de la petición, leído por fragmentos, en lotes de TAMANO_LOTE_IMPORTACION"""
+    lector = LectorRegistros(formato)
+    lote = []
+    try:
+        async for fragmento in request.stream():
+            lote.extend(lector.alimentar(fragmento))
+            while len(lote) >= TAMANO_LOTE_IMPORTACION:
+                yield lote[:TAMANO_LOTE_IMPORTACION]
+                lote = lote[TAMANO_LOTE_IMPORTACION:]
+        lote.extend(lector.terminar())
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail=f"El archivo no es UTF-8 válido (línea {lector.linea + 1})")
+    for inicio in range(0, len(lote), TAMANO_LOTE_IMPORTACION):
+        yield lote[inicio:inicio + TAMANO_LOTE_IMPORTACION]
+
+def _anotar_lote(resumen: dict, validos: int, errores: List[dict]):
+    resumen["filas"] += validos + len(errores)
+    resumen["con_error"] += len(errores)
+    espacio = MAX_ERRORES_IMPORTACION - len(resumen["errores"])
+    resumen["errores"].extend(errores[:max(espacio, 0)])
+
+def _importar_lote_usuarios(lote: List[tuple]):
+    validos, errores = validar_lote(validador_usuarios, lote)
+    nuevos = ejecutar_escritura(operacion_importar_usuarios, [u for _, u in validos]) if validos else 0
+    return len(validos), nuevos, errores
+
+@app.post("/admin/importar/usuarios")
+async def importar_usuarios(request: Request, formato: str = "csv", admin = Depends(verificar_admin)):
+    """
+    Alta o actualización masiva de usuarios desde CSV (con cabecera) o NDJSON
+
+    El cuerpo se lee por streaming y cada lote se valida y se confirma en su
+    propia transacción. Como es un UPSERT por email, repetir una importación
+    interrumpida es seguro.
+    """
+    if formato not in FORMATOS_IMPORTACION:
+        raise HTTPException(status_code=400, detail="Formato no soportado (csv o ndjson)")
+    
+    resumen = {"success": True, "filas": 0, "insertadas": 0, "actualizadas": 0, "con_error": 0, "errores": []}
+    async for lote in _lotes_importacion(request, formato):
+        # Validar y escribir fuera del event loop
+        validos, nuevos, errores = await asyncio.to_thread(_importar_lote_usuarios, lote)
+        _anotar_lote(resumen, validos, errores)
+        resumen["insertadas"] += nuevos
+        resumen["actualizadas"] += validos - nuevos
+    return resumen
+
+@app.post("/admin/importar/habitaciones")
+async def importar_habitaciones(request: Request, formato: str = "csv", admin = Depends(verificar_admin)):
+    """
+    Alta o actualización masiva del catálogo de habitaciones desde CSV o NDJSON
+
+    Se valida por lotes mientras llega el cuerpo y las filas válidas se
+    aplican al final en una sola transacción (ver operacion_importar_habitaciones).
+    """
+    if formato not in FORMATOS_IMPORTACION:
+        raise HTTPException(status_code=400, detail="Formato no soportado (csv o ndjson)")
+    
+    resumen = {"success": True, "filas": 0, "insertadas": 0, "actualizadas": 0, "con_error": 0, "errores": []}
+    habitaciones = []
+    async for lote in _lotes_importacion(request, formato):
+        validos, errores = await asyncio.to_thread(validar_lote, validador_habitaciones, lote)
+        _anotar_lote(resumen, len(validos), errores)
+        habitaciones.extend(h for _, h in validos)
+        if len(habitaciones) > MAX_HABITACIONES_IMPORTACION:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Se admiten como máximo {MAX_HABITACIONES_IMPORTACION} habitaciones por importación"
+            )
+    
+    if habitaciones:
+        nuevas = await asyncio.to_thread(ejecutar_escritura, operacion_importar_habitaciones, habitaciones)
+        resumen["insertadas"] = nuevas
+        resumen["actualizadas"] = len(habitaciones) - nuevas
+    return resumen
+
+# Días máximos por consulta de reporte
+MAX_DIAS_REPORTE = 366
+
+@app.get("/reportes/ocupacion")
+async def reporte_ocupacion(desde: date, hasta: date, tipo: Optional[str] = None,
+                            admin = Depends(verificar_admin)):
+    """Ocupación, ADR y RevPAR por día y tipo para [desde, hasta)"""
+    if desde >= hasta:
+        raise HTTPException(status_code=400, detail="La fecha de fin debe ser posterior a la fecha de inicio")
+    if (hasta - desde).days > MAX_DIAS_REPORTE:
+        raise HTTPException(status_code=400, detail=f"El reporte admite como máximo {MAX_DIAS_REPORTE} días")
+    
+    with get_db_lectura() as conn:
+        cursor = conn.cursor()
+        habitaciones = {t: datos["habitaciones"] for t, datos in resumen_tipos(cursor).items()
+                        if tipo in (None, t)}
+        cursor.execute("""
+            SELECT fecha, tipo, vendidas, confirmadas, ingresos, ingresos_confirmados
+            FROM ocupacion_diaria
+            WHERE fecha >= ? AND fecha < ?
+        """, (a_dia(desde), a_dia(hasta)))
+        agregado = {(fila[0], fila[1]): fila[2:] for fila in cursor.fetchall()}
+    
+    dias = []
+    for dia in range(a_dia(desde), a_dia(hasta)):
+        por_tipo = []
+        total = [0, 0, 0, 0]
+        for t, cantidad in habitaciones.items():
+            vendidas, confirmadas, ingresos, ingresos_confirmados = agregado.get((dia, t), (0, 0, 0, 0))
+            total = [total[0] + vendidas, total[1] + confirmadas, total[2] + ingresos, total[3] + ingresos_confirmados]
+            por_tipo.append({
+                "tipo": t,
+                "habitaciones": cantidad,
+                "vendidas": vendidas,
+                "confirmadas": confirmadas,
+                "ingresos": ingresos / 100,
+                "ingresos_confirmados": ingresos_confirmados / 100,
+                **indicadores(cantidad, vendidas, ingresos)
             })
-        
-        return {
-            "success": True,
-            "total_reservas": len(resultado),
-            "reservas": resultado
-        }
+        total_habitaciones = sum(habitaciones.values())
+        dias.append({
+            "fecha": texto_dia(dia),
+            "habitaciones": total_habitaciones,
+            "vendidas": total[0],
+            "confirmadas": total[1],
+            "ingresos": total[2] / 100,
+            "ingresos_confirmados": total[3] / 100,
+            **indicadores(total_habitaciones, total[0], total[2]),
+            "tipos": por_tipo
+        })
+    
+    return {
+        "success": True,
+        "desde": str(desde),
+        "hasta": str(hasta),
+        "dias": dias
+    }
 
 @app.get("/tipos-habitacion")
 async def obtener_tipos_habitacion():
@@ -524,4 +2992,9 @@ if __name__ == "__main__":
     print("🏨 Iniciando servidor de Sistema de Reservas de Hotel...")
     print("📍 Servidor corriendo en: http://localhost:8000")
     print("📚 Documentación API: http://localhost:8000/docs")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    workers = int(os.environ.get("HOTEL_WORKERS", "1"))
+    if workers > 1:
+        # Con varios procesos uvicorn necesita la app como cadena importable
+        uvicorn.run("hotel_booking_system:app", host="0.0.0.0", port=8000, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
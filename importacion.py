@@ -0,0 +1,142 @@
+"""
+Importación masiva por streaming de usuarios y habitaciones
+
+Dar de alta una cadena hotelera son decenas de miles de usuarios y miles de
+habitaciones; con `/register` sería una petición por usuario. Aquí el cuerpo
+de la petición (CSV con cabecera o NDJSON, un objeto JSON por línea) se lee
+por fragmentos, sin cargarlo entero en memoria:
+
+- `LectorRegistros` decodifica UTF-8 de forma incremental y entrega sólo los
+  registros completos, con su número de línea. Un campo CSV entre comillas
+  puede contener saltos de línea: mientras el número de comillas acumulado
+  sea impar, el registro continúa en la línea siguiente.
+- `validar_lote` valida un lote entero con una sola llamada a pydantic
+  (`TypeAdapter` de una lista). Sólo si falla se separan las filas con
+  errores, que se informan por línea, y se validan de nuevo las demás.
+
+Las filas válidas se escriben con `executemany` y UPSERT en transacciones por
+lotes (ver `/admin/importar/*` en hotel_booking_system.py).
+"""
+import codecs
+import csv
+import json
+from typing import List, Optional, Tuple
+
+from pydantic import TypeAdapter, ValidationError
+
+FORMATOS_IMPORTACION = ("csv", "ndjson")
+
+class LectorRegistros:
+    """
+    Separa un flujo de bytes en registros (línea, datos, error)
+
+    `datos` es un diccionario columna → valor (las celdas CSV vacías se
+    omiten para que rijan los valores por defecto); si la fila no se pudo
+    leer, `datos` es None y `error` explica por qué.
+    """
+
+    def __init__(self, formato: str):
+        if formato not in FORMATOS_IMPORTACION:
+            raise ValueError(f"Formato no soportado: {formato}")
+        self.formato = formato
+        # utf-8-sig: acepta (y descarta) el BOM que añaden algunas hojas de cálculo
+        self.decodificador = codecs.getincrementaldecoder("utf-8-sig")()
+        self.pendiente = ""
+        self.linea = 0
+        # Registro CSV con comillas abiertas: sus líneas físicas y la primera
+        self.lineas_registro: List[str] = []
+        self.inicio_registro = 0
+        self.columnas: Optional[List[str]] = None
+
+    def alimentar(self, datos: bytes) -> List[tuple]:
+        """Registros completos tras añadir `datos` (lanza UnicodeDecodeError)"""
+        lineas = (self.pendiente + self.decodificador.decode(datos)).split("\n")
+        self.pendiente = lineas.pop()
+        return self._procesar(lineas)
+
+    def terminar(self) -> List[tuple]:
+        """Registros restantes al final del flujo"""
+        resto = self.pendiente + self.decodificador.decode(b"", final=True)
+        self.pendiente = ""
+        registros = self._procesar([resto] if resto else [])
+        if self.lineas_registro:
+            registros.append((self.inicio_registro, None, "Comillas sin cerrar"))
+            self.lineas_registro = []
+        return registros
+
+    def _procesar(self, lineas: List[str]) -> List[tuple]:
+        if self.formato == "ndjson":
+            return self._procesar_ndjson(lineas)
+        return self._procesar_csv(lineas)
+
+    def _procesar_ndjson(self, lineas: List[str]) -> List[tuple]:
+        registros = []
+        for linea in lineas:
+            self.linea += 1
+            if not linea.strip():
+                continue
+            try:
+                datos = json.loads(linea)
+            except ValueError:
+                registros.append((self.linea, None, "JSON inválido"))
+                continue
+            if isinstance(datos, dict):
+                registros.append((self.linea, datos, None))
+            else:
+                registros.append((self.linea, None, "Se esperaba un objeto JSON"))
+        return registros
+
+    def _procesar_csv(self, lineas: List[str]) -> List[tuple]:
+        completos = []
+        for linea in lineas:
+            self.linea += 1
+            if not self.lineas_registro:
+                self.inicio_registro = self.linea
+            self.lineas_registro.append(linea.rstrip("\r"))
+            texto = "\n".join(self.lineas_registro)
+            # Las comillas escapadas van dobladas: con un número impar el campo sigue abierto
+            if texto.count('"') % 2:
+                continue
+            self.lineas_registro = []
+            if texto.strip():
+                completos.append((self.inicio_registro, texto))
+
+        registros = []
+        # Un solo csv.reader para todos los registros completos del fragmento
+        for (linea, _), valores in zip(completos, csv.reader(texto for _, texto in completos)):
+            if self.columnas is None:
+                self.columnas = [columna.strip() for columna in valores]
+            elif len(valores) != len(self.columnas):
+                registros.append((linea, None, f"Se esperaban {len(self.columnas)} columnas y hay {len(valores)}"))
+            else:
+                registros.append((linea, {c: v for c, v in zip(self.columnas, valores) if v != ""}, None))
+        return registros
+
+def validar_lote(adaptador: TypeAdapter, registros: List[tuple]) -> Tuple[List[tuple], List[dict]]:
+    """
+    Validar un lote de registros de `LectorRegistros`
+
+    Args:
+        adaptador: `TypeAdapter(List[Modelo])`
+
+    Returns:
+        (válidos, errores): válidos es [(línea, modelo)] en el orden de
+        entrada; errores es [{"linea", "errores"}] con un mensaje por campo
+    """
+    errores = {linea: [error] for linea, datos, error in registros if datos is None}
+    legibles = [(linea, datos) for linea, datos, _ in registros if datos is not None]
+    try:
+        modelos = adaptador.validate_python([datos for _, datos in legibles])
+    except ValidationError as e:
+        invalidas = set()
+        for error in e.errors():
+            indice, *campo = error["loc"]
+            invalidas.add(indice)
+            errores.setdefault(legibles[indice][0], []).append(
+                f"{'.'.join(map(str, campo)) or 'fila'}: {error['msg']}"
+            )
+        legibles = [fila for indice, fila in enumerate(legibles) if indice not in invalidas]
+        modelos = adaptador.validate_python([datos for _, datos in legibles])
+
+    validos = [(linea, modelo) for (linea, _), modelo in zip(legibles, modelos)]
+    return validos, [{"linea": linea, "errores": mensajes} for linea, mensajes in sorted(errores.items())]
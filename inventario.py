@@ -0,0 +1,123 @@
+"""
+Inventario por tipo de habitación
+
+El huésped reserva "una doble", no la 203. La tabla `inventario_tipo` guarda,
+por tipo y por noche, cuántas habitaciones de ese tipo están vendidas; se
+actualiza en la misma transacción que crea o cancela la reserva. Así, la
+disponibilidad de un tipo para [inicio, fin) es (días como en fechas.py):
+
+    habitaciones del tipo - max(vendidas en cada noche del rango)
+
+y cuesta O(tipos × noches) en lugar de recorrer habitaciones y reservas.
+
+Uso (reconstruir el inventario a partir de las reservas):
+    python inventario.py --db hotel_booking.db
+"""
+import argparse
+import sqlite3
+import sys
+import time
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+
+def registrar_noches(cursor, tipo: str, inicio: int, fin: int, delta: int):
+    """Sumar `delta` habitaciones vendidas del tipo a cada noche de [inicio, fin)"""
+    cursor.executemany("""
+        INSERT INTO inventario_tipo (tipo, fecha, vendidas) VALUES (?, ?, ?)
+        ON CONFLICT (tipo, fecha) DO UPDATE SET vendidas = vendidas + excluded.vendidas
+    """, [(tipo, noche, delta) for noche in range(inicio, fin)])
+
+def vendidas_maximas(cursor, tipo: str, inicio: int, fin: int) -> int:
+    """Máximo de habitaciones vendidas del tipo en alguna noche de [inicio, fin)"""
+    cursor.execute("""
+        SELECT COALESCE(MAX(vendidas), 0) FROM inventario_tipo
+        WHERE tipo = ? AND fecha >= ? AND fecha < ?
+    """, (tipo, inicio, fin))
+    return cursor.fetchone()[0]
+
+def codificar_tipos(tipos_reserva) -> Tuple[np.ndarray, np.ndarray]:
+    """Tipos distintos (ordenados) y, por reserva, la fila de su tipo"""
+    # Pocos tipos distintos: un diccionario es mucho más rápido que np.unique sobre cadenas
+    tipos = np.array(sorted(set(tipos_reserva)), dtype=object)
+    indice_tipo = {tipo: i for i, tipo in enumerate(tipos)}
+    codigos = np.fromiter((indice_tipo[tipo] for tipo in tipos_reserva), dtype=np.int64, count=len(tipos_reserva))
+    return tipos, codigos
+
+def reconstruir_inventario(cursor) -> int:
+    """
+    Recalcular `inventario_tipo` desde las reservas activas
+
+    Cada reserva suma +1 en su primera noche y -1 el día de salida de su tipo;
+    la suma acumulada por fila da las habitaciones vendidas de cada noche. Los
+    números de día sirven directamente de posición en la matriz, sin expandir
+    noche a noche.
+
+    Returns:
+        Filas (tipo, noche) escritas
+    """
+    cursor.execute("""
+        SELECT h.tipo, r.fecha_inicio, r.fecha_fin
+        FROM reservas r
+        JOIN habitaciones h ON h.id = r.habitacion_id
+        WHERE r.estado IN ('confirmada', 'pendiente') AND r.fecha_fin > r.fecha_inicio
+    """)
+    filas = cursor.fetchall()
+    cursor.execute("DELETE FROM inventario_tipo")
+    if not filas:
+        return 0
+
+    tipos_reserva, inicios, fines = zip(*filas)
+    tipos, codigos = codificar_tipos(tipos_reserva)
+    inicios = np.array(inicios, dtype=np.int64)
+    fines = np.array(fines, dtype=np.int64)
+    origen = int(inicios.min())
+
+    diferencias = np.zeros((len(tipos), int(fines.max()) - origen + 1), dtype=np.int64)
+    np.add.at(diferencias, (codigos, inicios - origen), 1)
+    np.add.at(diferencias, (codigos, fines - origen), -1)
+    vendidas = np.cumsum(diferencias, axis=1)
+
+    filas_tipo, dias = np.nonzero(vendidas)
+    cursor.executemany(
+        "INSERT INTO inventario_tipo (tipo, fecha, vendidas) VALUES (?, ?, ?)",
+        zip(tipos[filas_tipo].tolist(), (dias + origen).tolist(), vendidas[filas_tipo, dias].tolist())
+    )
+    return len(filas_tipo)
+
+def disponibilidad_tipos(cursor, resumen: Dict[str, dict], inicio: int, fin: int) -> Dict[str, int]:
+    """Habitaciones libres de cada tipo del resumen para toda la estancia [inicio, fin)"""
+    return {
+        tipo: max(0, datos["habitaciones"] - vendidas_maximas(cursor, tipo, inicio, fin))
+        for tipo, datos in resumen.items()
+    }
+
+# ==================== CLI ====================
+
+def ejecutar_reconstruccion(argv, descripcion: str, reconstruir: Callable, hecho: str) -> int:
+    """CLI de una reconstrucción: `reconstruir(cursor)` en una transacción sobre --db"""
+    parser = argparse.ArgumentParser(description=descripcion)
+    parser.add_argument("--db", default="hotel_booking.db")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db, isolation_level=None)
+    try:
+        inicio = time.perf_counter()
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        filas = reconstruir(cursor)
+        cursor.execute("COMMIT")
+    except sqlite3.OperationalError as e:
+        print(f"❌ {e}")
+        return 1
+    finally:
+        conn.close()
+    print(f"✅ {hecho}: {filas} noches-tipo ({time.perf_counter() - inicio:.2f}s)")
+    return 0
+
+def main(argv=None) -> int:
+    return ejecutar_reconstruccion(argv, "Reconstruir el inventario por tipo desde las reservas",
+                                   reconstruir_inventario, "Inventario reconstruido")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,6 +4,8 @@ from datetime import datetime
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from registro import configurar_registro
+
 def mostrar_menu():
     """Mostrar menú principal"""
     print("\n" + "="*70)
@@ -281,6 +283,9 @@ if __name__ == "__main__":
     print("\n🏨 Sistema de Reservas de Hotel - Proyecto Completo")
     print("   Testing de Software\n")
     
+    # Los mensajes de métricas, dashboard y reportes van por el registro: en consola, como texto
+    configurar_registro(formato_por_defecto="texto")
+    
     # Verificar dependencias al inicio
     if not verificar_dependencias():
         print("\n⚠️ Por favor instala las dependencias faltantes antes de continuar")
@@ -6,6 +6,10 @@ import json
 from dataclasses import dataclass, asdict
 import os
 
+from registro import configurar_registro, obtener_registro
+
+registro = obtener_registro(__name__)
+
 @dataclass
 class MetricasDia:
     """Métricas diarias del proceso de testing"""
@@ -66,9 +70,10 @@ class MetricasTesting:
                 with open(self.archivo_historico, 'r', encoding='utf-8') as f:
                     datos = json.load(f)
                     self.historico = [MetricasDia(**m) for m in datos]
-                print(f"✅ Histórico cargado: {len(self.historico)} días")
+                registro.info("Histórico cargado: %d días", len(self.historico),
+                              extra={"archivo": self.archivo_historico})
             except Exception as e:
-                print(f"⚠️ Error al cargar histórico: {e}")
+                registro.warning("Error al cargar histórico: %s", e, extra={"archivo": self.archivo_historico})
                 self.historico = []
         else:
             self.historico = []
@@ -79,9 +84,10 @@ class MetricasTesting:
             with open(self.archivo_historico, 'w', encoding='utf-8') as f:
                 datos = [asdict(m) for m in self.historico]
                 json.dump(datos, f, indent=2, ensure_ascii=False)
-            print(f"💾 Histórico guardado: {len(self.historico)} días")
+            registro.debug("Histórico guardado: %d días", len(self.historico),
+                           extra={"archivo": self.archivo_historico})
         except Exception as e:
-            print(f"❌ Error al guardar histórico: {e}")
+            registro.error("Error al guardar histórico: %s", e, extra={"archivo": self.archivo_historico})
     
     def registrar_dia(self, metricas: Dict) -> MetricasDia:
         """
@@ -468,6 +474,7 @@ def crear_metricas_ejemplo():
 
 
 if __name__ == "__main__":
+    configurar_registro(formato_por_defecto="texto")
     print("🧪 Iniciando Sistema de Métricas de Testing\n")
     
     # Crear datos de ejemplo
@@ -0,0 +1,157 @@
+"""
+Negociación de contenido: JSON o MessagePack
+
+Los clientes internos (channel managers) piden /buscar y /mis-reservas a
+ritmo alto y gastan CPU en codificar y decodificar JSON. Con MessagePack la
+misma respuesta ocupa menos (enteros y floats en binario, sin comillas ni
+separadores) y se decodifica sin analizar texto:
+
+- `Accept: application/msgpack` → la respuesta se codifica en MessagePack
+  (con el mismo contenido que en JSON). Sin esa cabecera, o si `msgpack` no
+  está instalado, todo sigue en JSON.
+- `Content-Type: application/msgpack` → el cuerpo de la petición se lee
+  como MessagePack y se valida contra el mismo modelo pydantic.
+
+`RutaNegociada` (clase de ruta de FastAPI) decide el formato de cada
+petición y lo deja en una variable de contexto; `RespuestaNegociada` (clase
+de respuesta por defecto) lo consulta al renderizar. Los errores (4xx/5xx)
+se siguen enviando en JSON.
+
+Las respuestas armadas con documentos JSON ya serializados (el historial de
+/mis-reservas) no se vuelven a decodificar en cada petición: `ConversorDocumentos`
+guarda cada documento convertido a MessagePack y arma la lista concatenando
+los elementos, igual que se hace con el JSON.
+
+MessagePack requiere `msgpack` (opcional).
+"""
+import contextvars
+import json
+from collections import OrderedDict
+from typing import List, Optional
+
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+
+try:
+    import msgpack
+except ImportError:  # MessagePack es opcional
+    msgpack = None
+
+TIPO_MSGPACK = "application/msgpack"
+# Nombres con los que los clientes suelen pedir MessagePack
+TIPOS_MSGPACK = (TIPO_MSGPACK, "application/x-msgpack", "application/vnd.msgpack")
+
+_formato = contextvars.ContextVar("formato_respuesta", default="json")
+
+def formato_respuesta() -> str:
+    """Formato negociado para la petición en curso: "json" o "msgpack" """
+    return _formato.get()
+
+def _tipo_medio(valor: str) -> str:
+    return valor.split(";", 1)[0].strip().lower()
+
+def prefiere_msgpack(accept: Optional[str]) -> bool:
+    """True si el Accept pide MessagePack con al menos la calidad de JSON"""
+    if not accept:
+        return False
+    calidad_msgpack = calidad_json = 0.0
+    for parte in accept.split(","):
+        tipo, *parametros = parte.split(";")
+        tipo = tipo.strip().lower()
+        calidad = 1.0
+        for parametro in parametros:
+            nombre, _, valor = parametro.partition("=")
+            if nombre.strip() == "q":
+                try:
+                    calidad = float(valor)
+                except ValueError:
+                    calidad = 0.0
+        if tipo in TIPOS_MSGPACK:
+            calidad_msgpack = max(calidad_msgpack, calidad)
+        elif tipo == "application/json":
+            calidad_json = max(calidad_json, calidad)
+    return calidad_msgpack > 0 and calidad_msgpack >= calidad_json
+
+class RespuestaNegociada(JSONResponse):
+    """JSONResponse que se renderiza en MessagePack si así se negoció"""
+
+    def __init__(self, content=None, status_code: int = 200, headers=None, media_type: Optional[str] = None,
+                 background=None):
+        if media_type is None and _formato.get() == "msgpack":
+            media_type = TIPO_MSGPACK
+        super().__init__(content, status_code, headers, media_type, background)
+
+    def render(self, content) -> bytes:
+        if self.media_type == TIPO_MSGPACK:
+            return msgpack.packb(content, use_bin_type=True)
+        return super().render(content)
+
+class PeticionMessagePack(Request):
+    """Petición cuyo cuerpo MessagePack se entrega a FastAPI como si fuera JSON ya decodificado"""
+
+    async def json(self):
+        if not hasattr(self, "_json"):
+            try:
+                self._json = msgpack.unpackb(await self.body())
+            except (ValueError, msgpack.UnpackException):
+                raise HTTPException(status_code=400, detail="Cuerpo MessagePack inválido")
+        return self._json
+
+def _como_json(scope: dict) -> dict:
+    # FastAPI sólo llama a request.json() si el Content-Type es JSON
+    cabeceras = [(nombre, b"application/json" if nombre == b"content-type" else valor)
+                 for nombre, valor in scope["headers"]]
+    return {**scope, "headers": cabeceras}
+
+class RutaNegociada(APIRoute):
+    """Ruta que acepta cuerpos MessagePack y fija el formato de la respuesta según Accept"""
+
+    def get_route_handler(self):
+        manejador = super().get_route_handler()
+
+        async def manejador_negociado(request: Request):
+            if _tipo_medio(request.headers.get("content-type", "")) in TIPOS_MSGPACK:
+                if msgpack is None:
+                    raise HTTPException(status_code=415, detail="MessagePack requiere msgpack (pip install msgpack)")
+                request = PeticionMessagePack(_como_json(request.scope), request.receive)
+            msgpack_pedido = msgpack is not None and prefiere_msgpack(request.headers.get("accept"))
+            token = _formato.set("msgpack" if msgpack_pedido else "json")
+            try:
+                respuesta = await manejador(request)
+            finally:
+                _formato.reset(token)
+            respuesta.headers.add_vary_header("Accept")
+            return respuesta
+
+        return manejador_negociado
+
+class ConversorDocumentos:
+    """Documentos JSON serializados → MessagePack, con caché LRU por documento"""
+
+    def __init__(self, max_entradas: int = 50_000):
+        self.max_entradas = max_entradas
+        self.entradas: "OrderedDict[str, bytes]" = OrderedDict()
+
+    def _convertir(self, documento: str) -> bytes:
+        empaquetado = self.entradas.get(documento)
+        if empaquetado is not None:
+            self.entradas.move_to_end(documento)
+            return empaquetado
+        empaquetado = msgpack.packb(json.loads(documento), use_bin_type=True)
+        self.entradas[documento] = empaquetado
+        if len(self.entradas) > self.max_entradas:
+            self.entradas.popitem(last=False)
+        return empaquetado
+
+    def mapa_con_lista(self, campos: dict, clave_lista: str, documentos: List[str]) -> bytes:
+        """MessagePack de {**campos, clave_lista: [documentos...]}"""
+        empaquetador = msgpack.Packer(use_bin_type=True)
+        partes = [empaquetador.pack_map_header(len(campos) + 1)]
+        for clave, valor in campos.items():
+            partes.append(empaquetador.pack(clave))
+            partes.append(empaquetador.pack(valor))
+        partes.append(empaquetador.pack(clave_lista))
+        partes.append(empaquetador.pack_array_header(len(documentos)))
+        partes.extend(self._convertir(documento) for documento in documentos)
+        return b"".join(partes)
@@ -0,0 +1,125 @@
+"""
+Agregado diario de ocupación e ingresos por tipo de habitación
+
+`ocupacion_diaria` guarda, por noche y tipo, las habitaciones vendidas
+(reservas pendientes o confirmadas), las confirmadas (pagadas) y sus ingresos
+en centavos. Se actualiza en la misma transacción que crea, confirma o libera
+la reserva, así que los reportes leen una fila por día y tipo:
+
+    ocupación = vendidas / habitaciones
+    ADR       = ingresos / vendidas
+    RevPAR    = ingresos / habitaciones
+
+El `precio_total` de una reserva se reparte entre sus noches en centavos
+enteros (el resto, un centavo por noche desde la primera), así que sumar y
+restar una reserva deja el agregado exactamente como estaba.
+
+Uso (recalcular el agregado desde las reservas):
+    python ocupacion.py --db hotel_booking.db
+"""
+import sys
+
+import numpy as np
+
+from inventario import codificar_tipos, ejecutar_reconstruccion
+from tarifas import a_centavos
+
+def registrar_ocupacion(cursor, tipo: str, inicio: int, fin: int, precio_total: float,
+                        vendidas: int, confirmadas: int):
+    """
+    Sumar una estancia a cada noche de [inicio, fin) (números de día)
+
+    `vendidas` y `confirmadas` son +1 / -1 / 0 según el cambio de estado
+    (crear: +1, 0; pagar: 0, +1; cancelar: -1 y -1 si estaba pagada).
+    """
+    base, resto = divmod(a_centavos(precio_total), fin - inicio)
+    filas = []
+    for i, noche in enumerate(range(inicio, fin)):
+        centavos = base + (1 if i < resto else 0)
+        filas.append((noche, tipo, vendidas, confirmadas, vendidas * centavos, confirmadas * centavos))
+    cursor.executemany("""
+        INSERT INTO ocupacion_diaria (fecha, tipo, vendidas, confirmadas, ingresos, ingresos_confirmados)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (fecha, tipo) DO UPDATE SET
+            vendidas = vendidas + excluded.vendidas,
+            confirmadas = confirmadas + excluded.confirmadas,
+            ingresos = ingresos + excluded.ingresos,
+            ingresos_confirmados = ingresos_confirmados + excluded.ingresos_confirmados
+    """, filas)
+
+def reconstruir_ocupacion(cursor) -> int:
+    """
+    Recalcular `ocupacion_diaria` desde las reservas activas en una pasada vectorizada
+
+    Como en `reconstruir_inventario`, cada magnitud se acumula con arreglos de
+    diferencias (+x al entrar, -x al salir) y una suma acumulada por tipo; el
+    centavo de resto se suma sólo a las primeras noches de cada reserva.
+
+    Returns:
+        Filas (noche, tipo) escritas
+    """
+    cursor.execute("""
+        SELECT h.tipo, r.fecha_inicio, r.fecha_fin, r.precio_total,
+               r.estado = 'confirmada'
+        FROM reservas r
+        JOIN habitaciones h ON h.id = r.habitacion_id
+        WHERE r.estado IN ('confirmada', 'pendiente') AND r.fecha_fin > r.fecha_inicio
+    """)
+    filas = cursor.fetchall()
+    cursor.execute("DELETE FROM ocupacion_diaria")
+    if not filas:
+        return 0
+
+    tipos_reserva, inicios, fines, precios, pagadas = zip(*filas)
+    tipos, codigos = codificar_tipos(tipos_reserva)
+    inicios = np.array(inicios, dtype=np.int64)
+    fines = np.array(fines, dtype=np.int64)
+    pagadas = np.array(pagadas, dtype=bool)
+    base, resto = np.divmod(np.rint(np.array(precios, dtype=np.float64) * 100).astype(np.int64), fines - inicios)
+
+    origen = int(inicios.min())
+    forma = (len(tipos), int(fines.max()) - origen + 1)
+    entrada, salida, fin_resto = inicios - origen, fines - origen, inicios + resto - origen
+
+    def acumular(seleccion, base_noche, con_resto=False):
+        diferencias = np.zeros(forma, dtype=np.int64)
+        np.add.at(diferencias, (codigos[seleccion], entrada[seleccion]), base_noche)
+        np.add.at(diferencias, (codigos[seleccion], salida[seleccion]), -base_noche)
+        if con_resto:
+            # +1 centavo en las noches [entrada, entrada + resto)
+            np.add.at(diferencias, (codigos[seleccion], entrada[seleccion]), 1)
+            np.add.at(diferencias, (codigos[seleccion], fin_resto[seleccion]), -1)
+        return np.cumsum(diferencias, axis=1)
+
+    todas = np.ones(len(filas), dtype=bool)
+    vendidas = acumular(todas, 1)
+    confirmadas = acumular(pagadas, 1)
+    ingresos = acumular(todas, base, con_resto=True)
+    ingresos_confirmados = acumular(pagadas, base[pagadas], con_resto=True)
+
+    filas_tipo, dias = np.nonzero(vendidas)
+    cursor.executemany(
+        """INSERT INTO ocupacion_diaria (fecha, tipo, vendidas, confirmadas, ingresos, ingresos_confirmados)
+           VALUES (?, ?, ?, ?, ?, ?)""",
+        zip((dias + origen).tolist(), tipos[filas_tipo].tolist(),
+            vendidas[filas_tipo, dias].tolist(), confirmadas[filas_tipo, dias].tolist(),
+            ingresos[filas_tipo, dias].tolist(), ingresos_confirmados[filas_tipo, dias].tolist())
+    )
+    return len(filas_tipo)
+
+def indicadores(habitaciones: int, vendidas: int, ingresos_centavos: int) -> dict:
+    """Ocupación (%), ADR y RevPAR de un día a partir del agregado"""
+    return {
+        "ocupacion": round(100 * vendidas / habitaciones, 2) if habitaciones else 0.0,
+        "adr": round(ingresos_centavos / vendidas / 100, 2) if vendidas else 0.0,
+        "revpar": round(ingresos_centavos / habitaciones / 100, 2) if habitaciones else 0.0,
+    }
+
+# ==================== CLI ====================
+
+def main(argv=None) -> int:
+    return ejecutar_reconstruccion(argv, "Recalcular el agregado diario de ocupación e ingresos",
+                                   reconstruir_ocupacion, "Ocupación reconstruida")
+
+if __name__ == "__main__":
+    sys.exit(main())
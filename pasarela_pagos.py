@@ -0,0 +1,179 @@
+"""
+Pasarela de pagos intercambiable, simulador con latencia y cliente protegido
+
+Una pasarela real tarda cientos de milisegundos, a veces falla y limita las
+peticiones simultáneas por comercio. Cobrar dentro de la petición de /pagar
+ataría un worker a esa espera; por eso, con una pasarela que no sea la
+instantánea, /pagar responde 202 y el cobro lo hacen trabajadores en segundo
+plano (ver `ProcesadorPagos` en hotel_booking_system.py).
+
+- `Pasarela` es la interfaz: `cobrar` devuelve un `ResultadoCobro`
+  (aprobado o rechazado) o lanza `ErrorPasarela` ante un fallo técnico.
+- `PasarelaInstantanea` aprueba al momento (el comportamiento original).
+- `PasarelaSimulada` imita un proveedor remoto: latencia lognormal con la
+  mediana y la dispersión dadas, fallos y rechazos con la probabilidad dada
+  y un límite de peticiones simultáneas (las demás esperan turno, como en
+  el proveedor).
+- `ClientePasarela` es lo que usa la aplicación: limita los cobros en curso
+  con un semáforo, corta los que superan el tiempo máximo y abre un
+  cortocircuito tras varios fallos seguidos, para no seguir esperando a una
+  pasarela caída. Pasado el enfriamiento deja pasar un cobro de prueba: si
+  sale bien se cierra, si falla vuelve a abrirse.
+
+Un cobro que agota el tiempo se informa como error, aunque la pasarela
+podría haberlo completado; una pasarela real se consultaría por la
+referencia del cobro antes de reintentar.
+"""
+import asyncio
+import math
+import random
+import secrets
+import time
+from abc import ABC, abstractmethod
+from typing import Optional
+
+class ErrorPasarela(Exception):
+    """Fallo técnico: el cobro no se pudo completar y puede reintentarse"""
+
+class CircuitoAbierto(ErrorPasarela):
+    """El cliente no intenta cobrar: la pasarela falló varias veces seguidas"""
+
+class ResultadoCobro:
+    def __init__(self, aprobado: bool, codigo_transaccion: Optional[str] = None, motivo: Optional[str] = None):
+        self.aprobado = aprobado
+        self.codigo_transaccion = codigo_transaccion
+        self.motivo = motivo
+
+def _codigo_transaccion() -> str:
+    return f"TXN-{secrets.token_hex(8).upper()}"
+
+class Pasarela(ABC):
+    """Interfaz de una pasarela de pagos"""
+
+    @abstractmethod
+    async def cobrar(self, referencia: str, monto: float, ultimos_4: str) -> ResultadoCobro:
+        """Cobrar y devolver el resultado, o lanzar `ErrorPasarela` ante un fallo técnico"""
+
+class PasarelaInstantanea(Pasarela):
+    """Aprueba todos los cobros sin esperar"""
+
+    async def cobrar(self, referencia: str, monto: float, ultimos_4: str) -> ResultadoCobro:
+        return ResultadoCobro(True, _codigo_transaccion())
+
+class PasarelaSimulada(Pasarela):
+    """
+    Proveedor remoto simulado
+
+    Args:
+        latencia_ms: Mediana de la latencia de cada cobro
+        dispersion: Desviación del logaritmo de la latencia (0 = constante;
+            0.5 deja el percentil 99 en ~3,2 veces la mediana)
+        tasa_fallo: Probabilidad de un error técnico (`ErrorPasarela`)
+        tasa_rechazo: Probabilidad de que el emisor rechace la tarjeta
+        concurrencia: Cobros que el proveedor atiende a la vez
+    """
+
+    def __init__(self, latencia_ms: float = 800, dispersion: float = 0.5, tasa_fallo: float = 0.0,
+                 tasa_rechazo: float = 0.0, concurrencia: int = 50, semilla: Optional[int] = None):
+        self.mu = math.log(max(latencia_ms, 0.001) / 1000)
+        self.dispersion = dispersion
+        self.tasa_fallo = tasa_fallo
+        self.tasa_rechazo = tasa_rechazo
+        self.concurrencia = concurrencia
+        self.aleatorio = random.Random(semilla)
+        self.semaforo: Optional[asyncio.Semaphore] = None
+        self.loop = None
+
+    def _semaforo(self) -> asyncio.Semaphore:
+        # Los primitivos de asyncio quedan ligados al loop en que se usan por primera vez
+        loop = asyncio.get_running_loop()
+        if self.semaforo is None or self.loop is not loop:
+            self.loop = loop
+            self.semaforo = asyncio.Semaphore(self.concurrencia)
+        return self.semaforo
+
+    async def cobrar(self, referencia: str, monto: float, ultimos_4: str) -> ResultadoCobro:
+        async with self._semaforo():
+            await asyncio.sleep(self.aleatorio.lognormvariate(self.mu, self.dispersion))
+            sorteo = self.aleatorio.random()
+        if sorteo < self.tasa_fallo:
+            raise ErrorPasarela("La pasarela no respondió correctamente")
+        if sorteo < self.tasa_fallo + self.tasa_rechazo:
+            return ResultadoCobro(False, motivo="Tarjeta rechazada por el emisor")
+        return ResultadoCobro(True, _codigo_transaccion())
+
+class ClientePasarela:
+    """
+    Acceso a una pasarela con concurrencia limitada, tiempo máximo y cortocircuito
+
+    Args:
+        max_concurrentes: Cobros en curso como máximo (los demás esperan)
+        tiempo_maximo: Segundos de espera de cada cobro antes de darlo por fallido
+        umbral_fallos: Fallos seguidos que abren el circuito
+        enfriamiento: Segundos con el circuito abierto antes del cobro de prueba
+    """
+
+    def __init__(self, pasarela: Pasarela, max_concurrentes: int = 20, tiempo_maximo: float = 3.0,
+                 umbral_fallos: int = 5, enfriamiento: float = 10.0):
+        self.pasarela = pasarela
+        self.max_concurrentes = max_concurrentes
+        self.tiempo_maximo = tiempo_maximo
+        self.umbral_fallos = umbral_fallos
+        self.enfriamiento = enfriamiento
+        self.fallos_seguidos = 0
+        self.abierto_desde: Optional[float] = None
+        self.prueba_en_curso = False
+        self.semaforo: Optional[asyncio.Semaphore] = None
+        self.loop = None
+
+    @property
+    def estado(self) -> str:
+        if self.abierto_desde is None:
+            return "cerrado"
+        if time.monotonic() - self.abierto_desde < self.enfriamiento:
+            return "abierto"
+        return "semiabierto"
+
+    def admite_cobros(self) -> bool:
+        """False si un cobro ahora fallaría sin intentarse (para rechazar antes de encolar)"""
+        estado = self.estado
+        return estado == "cerrado" or (estado == "semiabierto" and not self.prueba_en_curso)
+
+    def _semaforo(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self.semaforo is None or self.loop is not loop:
+            self.loop = loop
+            self.semaforo = asyncio.Semaphore(self.max_concurrentes)
+        return self.semaforo
+
+    async def cobrar(self, referencia: str, monto: float, ultimos_4: str) -> ResultadoCobro:
+        """Cobrar o lanzar `ErrorPasarela` (`CircuitoAbierto` si ni se intentó)"""
+        async with self._semaforo():
+            # El estado se evalúa con el turno ya obtenido: la espera pudo durar más que el enfriamiento
+            estado = self.estado
+            if estado == "abierto" or (estado == "semiabierto" and self.prueba_en_curso):
+                raise CircuitoAbierto("Pasarela de pagos no disponible, intenta más tarde")
+            prueba = estado == "semiabierto"
+            self.prueba_en_curso = prueba
+            try:
+                resultado = await asyncio.wait_for(
+                    self.pasarela.cobrar(referencia, monto, ultimos_4), self.tiempo_maximo
+                )
+            except (ErrorPasarela, asyncio.TimeoutError) as e:
+                self._registrar_fallo()
+                if isinstance(e, asyncio.TimeoutError):
+                    raise ErrorPasarela("La pasarela no respondió a tiempo") from e
+                raise
+            finally:
+                if prueba:
+                    self.prueba_en_curso = False
+            # Un rechazo del emisor es una respuesta válida: la pasarela funciona
+            self.fallos_seguidos = 0
+            self.abierto_desde = None
+            return resultado
+
+    def _registrar_fallo(self):
+        self.fallos_seguidos += 1
+        if self.abierto_desde is not None or self.fallos_seguidos >= self.umbral_fallos:
+            # Se abre (o se reabre tras una prueba fallida) y el enfriamiento vuelve a empezar
+            self.abierto_desde = time.monotonic()
@@ -0,0 +1,249 @@
+"""
+Registro de eventos y modelo de lectura del historial de reservas
+
+Cada cambio de una reserva (creación, pago, cancelación, reasignación) y cada
+pago añaden una fila a `eventos` desde triggers, en la misma transacción que
+el cambio: ningún escritor (API, reasignación nocturna, scripts) puede
+olvidarse de publicar. Los eventos de reserva llevan el estado completo de la
+reserva, así que aplicarlos es idempotente: basta quedarse con el último. Los
+datos de la habitación se leen al proyectar (el trigger queda mínimo: se
+compila en cada conexión de escritura) y sus cambios posteriores llegan como
+eventos `habitacion_modificada`.
+
+`historial_reservas` es el modelo de lectura de /mis-reservas: una fila por
+reserva con clave (usuario_id, fecha_reserva, reserva_id) y el elemento de la
+respuesta ya serializado como JSON. Leer el historial de un usuario es un
+recorrido de la clave primaria, sin join, sin ordenar y sin volver a
+serializar cada reserva (que costaba más que la consulta). Lo mantiene
+`proyectar`, que aplica los eventos posteriores a la posición guardada en
+`proyecciones`.
+
+El proyector corre en segundo plano, así que puede ir unos milisegundos por
+detrás. `historial_usuario` aplica en memoria los eventos que aún no
+proyectó, de modo que un usuario siempre ve sus propias escrituras.
+
+Con una selección de campos (`fields=` de /mis-reservas) los documentos se
+recortan en la misma consulta con `json_object` y el operador `->`: sólo
+salen de SQLite los campos pedidos.
+"""
+import json
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from campos import agrupar_campos
+from fechas import sql_dia_a_texto, texto_dia
+
+PROYECCION_HISTORIAL = "historial_reservas"
+# Eventos aplicados por transacción del proyector
+LOTE_PROYECCION = 1000
+
+# Eventos que llevan el estado completo de una reserva
+EVENTOS_RESERVA = ("reserva_creada", "reserva_pendiente", "reserva_confirmada",
+                   "reserva_cancelada", "reserva_modificada")
+
+def sql_estado_reserva(fila: str = "NEW") -> str:
+    """Expresión json_object con el estado completo de la reserva `fila` (para triggers)"""
+    return f"""json_object(
+        'usuario_id', {fila}.usuario_id, 'fecha_reserva', {fila}.fecha_reserva, 'reserva_id', {fila}.id,
+        'habitacion_id', {fila}.habitacion_id, 'fecha_inicio', {fila}.fecha_inicio, 'fecha_fin', {fila}.fecha_fin,
+        'huespedes', {fila}.huespedes, 'precio_total', {fila}.precio_total, 'estado', {fila}.estado
+    )"""
+
+def _habitaciones(cursor, estados) -> dict:
+    """Número, tipo y descripción actuales de las habitaciones de las reservas"""
+    ids = list({estado["habitacion_id"] for estado in estados})
+    habitaciones = {}
+    for inicio in range(0, len(ids), 500):
+        bloque = ids[inicio:inicio + 500]
+        cursor.execute(f"SELECT id, numero, tipo, descripcion FROM habitaciones WHERE id IN ({','.join('?' * len(bloque))})",
+                       bloque)
+        habitaciones.update((fila[0], tuple(fila[1:])) for fila in cursor.fetchall())
+    return habitaciones
+
+def documento_reserva(estado: dict, habitacion: Optional[tuple]) -> str:
+    """Elemento de /mis-reservas serializado, a partir del estado de una reserva y su habitación"""
+    numero, tipo, descripcion = habitacion or (None, None, None)
+    return json.dumps({
+        "id": estado["reserva_id"],
+        "fecha_inicio": texto_dia(estado["fecha_inicio"]),
+        "fecha_fin": texto_dia(estado["fecha_fin"]),
+        "huespedes": estado["huespedes"],
+        "precio_total": estado["precio_total"],
+        "estado": estado["estado"],
+        "habitacion": {
+            "numero": numero,
+            "tipo": tipo,
+            "descripcion": descripcion
+        }
+    }, ensure_ascii=False, separators=(",", ":"))
+
+def _guardar(cursor, estados):
+    estados = list(estados)
+    if not estados:
+        return
+    habitaciones = _habitaciones(cursor, estados)
+    cursor.executemany("""
+        INSERT INTO historial_reservas (usuario_id, fecha_reserva, reserva_id, habitacion_id, documento)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(usuario_id, fecha_reserva, reserva_id) DO UPDATE SET
+            habitacion_id = excluded.habitacion_id,
+            documento = excluded.documento
+    """, [
+        (estado["usuario_id"], estado["fecha_reserva"], estado["reserva_id"], estado["habitacion_id"],
+         documento_reserva(estado, habitaciones.get(estado["habitacion_id"])))
+        for estado in estados
+    ])
+
+def reconstruir_historial(cursor) -> int:
+    """Rehacer el historial desde las reservas y dejar la proyección al día; devuelve las filas"""
+    cursor.execute("DELETE FROM historial_reservas")
+    # Mismo documento que documento_reserva, armado en SQL: sin pasar cada fila por Python
+    cursor.execute(f"""
+        INSERT INTO historial_reservas (usuario_id, fecha_reserva, reserva_id, habitacion_id, documento)
+        SELECT r.usuario_id, r.fecha_reserva, r.id, r.habitacion_id,
+               json_object(
+                   'id', r.id,
+                   'fecha_inicio', {sql_dia_a_texto("r.fecha_inicio")},
+                   'fecha_fin', {sql_dia_a_texto("r.fecha_fin")},
+                   'huespedes', r.huespedes,
+                   'precio_total', r.precio_total,
+                   'estado', r.estado,
+                   'habitacion', json_object('numero', h.numero, 'tipo', h.tipo, 'descripcion', h.descripcion)
+               )
+        FROM reservas r
+        LEFT JOIN habitaciones h ON h.id = r.habitacion_id
+        ORDER BY r.usuario_id, r.fecha_reserva, r.id
+    """)
+    filas = cursor.rowcount
+    cursor.execute("""
+        INSERT INTO proyecciones (nombre, posicion)
+        VALUES (?, (SELECT COALESCE(MAX(id), 0) FROM eventos))
+        ON CONFLICT(nombre) DO UPDATE SET posicion = excluded.posicion
+    """, (PROYECCION_HISTORIAL,))
+    return filas
+
+def posicion(cursor, nombre: str = PROYECCION_HISTORIAL) -> int:
+    """Último evento aplicado por la proyección"""
+    cursor.execute("SELECT posicion FROM proyecciones WHERE nombre = ?", (nombre,))
+    fila = cursor.fetchone()
+    return fila[0] if fila else 0
+
+def hay_eventos_pendientes(cursor) -> bool:
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM eventos WHERE id > ?)", (posicion(cursor),))
+    return bool(cursor.fetchone()[0])
+
+def aplicar_eventos(cursor, eventos: List[tuple]):
+    """Aplicar al historial una secuencia ordenada de eventos (tipo, datos)"""
+    # Los estados sucesivos de una misma reserva se reducen al último antes de escribir
+    reservas = {}
+    for tipo, datos in eventos:
+        if tipo in EVENTOS_RESERVA:
+            reservas[datos["reserva_id"]] = datos
+            continue
+        if tipo not in ("reserva_eliminada", "habitacion_modificada"):
+            continue
+        _guardar(cursor, reservas.values())
+        reservas.clear()
+        if tipo == "reserva_eliminada":
+            cursor.execute("DELETE FROM historial_reservas WHERE usuario_id = ? AND reserva_id = ?",
+                           (datos["usuario_id"], datos["reserva_id"]))
+        else:
+            cursor.execute("""
+                UPDATE historial_reservas
+                SET documento = json_set(documento, '$.habitacion.numero', ?, '$.habitacion.tipo', ?,
+                                         '$.habitacion.descripcion', ?)
+                WHERE habitacion_id = ?
+            """, (datos["numero"], datos["tipo"], datos["descripcion"], datos["habitacion_id"]))
+    _guardar(cursor, reservas.values())
+
+def proyectar(cursor, limite: int = LOTE_PROYECCION) -> int:
+    """
+    Aplicar los eventos siguientes a la posición guardada (como mucho `limite`)
+
+    Debe ejecutarse en una transacción de escritura: la posición se lee y se
+    avanza dentro de ella, así que dos proyectores (uno por worker) nunca
+    aplican el mismo tramo a la vez. Devuelve cuántos eventos aplicó.
+    """
+    cursor.execute("SELECT id, tipo, datos FROM eventos WHERE id > ? ORDER BY id LIMIT ?",
+                   (posicion(cursor), limite))
+    eventos = cursor.fetchall()
+    if not eventos:
+        return 0
+    aplicar_eventos(cursor, [(tipo, json.loads(datos)) for _, tipo, datos in eventos])
+    cursor.execute("UPDATE proyecciones SET posicion = ? WHERE nombre = ?", (eventos[-1][0], PROYECCION_HISTORIAL))
+    return len(eventos)
+
+@lru_cache(maxsize=256)
+def sql_documento_recortado(campos: Tuple[str, ...]) -> str:
+    """Expresión que arma, desde la columna `documento`, un documento con sólo `campos`"""
+    # Los nombres vienen de seleccionar_campos (validados contra el modelo)
+    partes = []
+    for padre, hijos in agrupar_campos(campos).items():
+        if hijos is None:
+            partes.append(f"'{padre}', documento -> '$.{padre}'")
+        else:
+            anidados = ", ".join(f"'{hijo}', documento -> '$.{padre}.{hijo}'" for hijo in hijos)
+            partes.append(f"'{padre}', json_object({anidados})")
+    return f"json_object({', '.join(partes)})"
+
+def recortar_documento(documento: str, campos: Tuple[str, ...]) -> str:
+    """Lo mismo que sql_documento_recortado, en Python"""
+    completo = json.loads(documento)
+    recortado = {}
+    for padre, hijos in agrupar_campos(campos).items():
+        if hijos is None:
+            recortado[padre] = completo[padre]
+        else:
+            recortado[padre] = {hijo: completo[padre][hijo] for hijo in hijos}
+    return json.dumps(recortado, ensure_ascii=False, separators=(",", ":"))
+
+def historial_usuario(cursor, usuario_id: int, campos: Optional[Tuple[str, ...]] = None) -> List[str]:
+    """
+    Reservas del usuario (documentos JSON), de la más reciente a la más antigua
+
+    Incluye los eventos que el proyector aún no aplicó. Con `campos` cada
+    documento trae sólo esos campos.
+    """
+    # La posición se lee antes que el historial: los eventos posteriores se vuelven a aplicar
+    # encima, lo que es inocuo porque llevan el estado completo
+    desde = posicion(cursor)
+    columna = "documento" if campos is None else sql_documento_recortado(campos)
+    cursor.execute(f"""
+        SELECT fecha_reserva, reserva_id, habitacion_id, {columna} FROM historial_reservas
+        WHERE usuario_id = ?
+        ORDER BY fecha_reserva DESC, reserva_id DESC
+    """, (usuario_id,))
+    filas = cursor.fetchall()
+
+    # Los eventos del usuario y los cambios de habitaciones (sin usuario) que faltan por proyectar
+    cursor.execute("""
+        SELECT id, tipo, datos FROM eventos WHERE usuario_id = ? AND id > ?
+        UNION ALL
+        SELECT id, tipo, datos FROM eventos WHERE usuario_id IS NULL AND id > ?
+        ORDER BY id
+    """, (usuario_id, desde, desde))
+    pendientes = cursor.fetchall()
+    if not pendientes:
+        return [fila[3] for fila in filas]
+    if campos is not None:
+        # Los eventos pendientes se aplican sobre documentos completos; se recortan al final
+        return [recortar_documento(documento, campos) for documento in historial_usuario(cursor, usuario_id)]
+
+    pendientes = [(tipo, json.loads(datos)) for _, tipo, datos in pendientes]
+    habitaciones = _habitaciones(cursor, [datos for tipo, datos in pendientes if tipo in EVENTOS_RESERVA])
+    reservas = {fila[1]: list(fila) for fila in filas}
+    for tipo, datos in pendientes:
+        if tipo in EVENTOS_RESERVA:
+            reservas[datos["reserva_id"]] = [datos["fecha_reserva"], datos["reserva_id"], datos["habitacion_id"],
+                                             documento_reserva(datos, habitaciones.get(datos["habitacion_id"]))]
+        elif tipo == "reserva_eliminada":
+            reservas.pop(datos["reserva_id"], None)
+        elif tipo == "habitacion_modificada":
+            for fila in reservas.values():
+                if fila[2] == datos["habitacion_id"]:
+                    documento = json.loads(fila[3])
+                    documento["habitacion"].update(numero=datos["numero"], tipo=datos["tipo"],
+                                                   descripcion=datos["descripcion"])
+                    fila[3] = json.dumps(documento, ensure_ascii=False, separators=(",", ":"))
+    ordenadas = sorted(reservas.values(), key=lambda fila: (fila[0] or "", fila[1]), reverse=True)
+    return [fila[3] for fila in ordenadas]
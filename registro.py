@@ -0,0 +1,183 @@
+"""
+Registro (logging) estructurado y sin bloqueos
+
+`print` escribe en stdout desde el hilo que atiende la petición: si la
+salida va lenta (un pipe lleno, un recolector de logs atascado) la petición
+espera, y no hay forma de filtrar ni de bajar el volumen. Aquí:
+
+- Cada módulo pide su logger con `obtener_registro(__name__)`; todos cuelgan
+  del espacio "hotel" y no se propagan al logger raíz (ni a los de uvicorn).
+- El manejador del logger sólo encola el registro (`ManejadorCola`); un hilo
+  (`QueueListener`) lo formatea y lo escribe. Con la cola llena el registro
+  se descarta y se cuenta: quien registra nunca espera.
+- La salida es JSON, una línea por registro (`ts`, `nivel`, `modulo`,
+  `mensaje` y los campos pasados con `extra=`), o texto para la consola.
+- Niveles por módulo: un diagnóstico apagado cuesta lo que
+  `Logger.isEnabledFor` (una consulta a una caché), sin formatear nada.
+- Muestreo: los registros con `extra={"evento": ...}` de un evento con tasa
+  configurada pasan con esa probabilidad y llevan el campo `muestreo`.
+
+Configuración (variables de entorno):
+    HOTEL_LOG_NIVEL      Nivel general (INFO)
+    HOTEL_LOG_NIVELES    Niveles por módulo: "pasarela_pagos=DEBUG,metricas_testing=WARNING"
+    HOTEL_LOG_FORMATO    "json" o "texto"
+    HOTEL_LOG_MUESTREO   Tasas por evento: "escritura_reintentada=0.01"
+    HOTEL_LOG_COLA       Registros pendientes como máximo (10000)
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+ESPACIO = "hotel"
+
+# Atributos propios de LogRecord: el resto son los campos pasados con extra=
+_ATRIBUTOS_REGISTRO = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+def obtener_registro(modulo: str) -> logging.Logger:
+    """Logger del módulo dentro del espacio "hotel" """
+    if modulo == "__main__":
+        # Ejecutado como script: el nombre del archivo, para que HOTEL_LOG_NIVELES lo encuentre
+        modulo = os.path.splitext(os.path.basename(sys.argv[0]))[0] or modulo
+    return logging.getLogger(f"{ESPACIO}.{modulo}")
+
+def _campos(registro: logging.LogRecord) -> dict:
+    return {clave: valor for clave, valor in vars(registro).items() if clave not in _ATRIBUTOS_REGISTRO}
+
+def _modulo(registro: logging.LogRecord) -> str:
+    return registro.name[len(ESPACIO) + 1:] if registro.name.startswith(ESPACIO + ".") else registro.name
+
+class FormateadorJSON(logging.Formatter):
+    """Una línea JSON por registro"""
+
+    def format(self, registro: logging.LogRecord) -> str:
+        datos = {
+            "ts": datetime.fromtimestamp(registro.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "nivel": registro.levelname,
+            "modulo": _modulo(registro),
+            "mensaje": registro.getMessage(),
+            **_campos(registro),
+        }
+        if registro.exc_text:
+            datos["traza"] = registro.exc_text
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+class FormateadorTexto(logging.Formatter):
+    """Texto legible para la consola, con los campos extra como clave=valor"""
+
+    def format(self, registro: logging.LogRecord) -> str:
+        hora = datetime.fromtimestamp(registro.created).strftime("%Y-%m-%d %H:%M:%S")
+        linea = f"{hora} {registro.levelname:<7} {_modulo(registro)}: {registro.getMessage()}"
+        campos = _campos(registro)
+        if campos:
+            linea += " " + " ".join(f"{clave}={valor}" for clave, valor in campos.items())
+        if registro.exc_text:
+            linea += "\n" + registro.exc_text
+        return linea
+
+FORMATEADORES = {"json": FormateadorJSON, "texto": FormateadorTexto}
+
+class FiltroMuestreo(logging.Filter):
+    """Deja pasar cada registro de un evento muestreado con la probabilidad de su tasa"""
+
+    def __init__(self, tasas: Dict[str, float]):
+        super().__init__()
+        self.tasas = tasas
+
+    def filter(self, registro: logging.LogRecord) -> bool:
+        tasa = self.tasas.get(getattr(registro, "evento", None))
+        if tasa is None:
+            return True
+        if random.random() >= tasa:
+            return False
+        registro.muestreo = tasa
+        return True
+
+class ManejadorCola(QueueHandler):
+    """QueueHandler que nunca bloquea: con la cola llena descarta el registro y lo cuenta"""
+
+    def __init__(self, cola: queue.Queue):
+        super().__init__(cola)
+        self.descartados = 0
+
+    def prepare(self, registro: logging.LogRecord) -> logging.LogRecord:
+        # El mensaje y la traza se resuelven aquí: los argumentos pueden cambiar antes de que el hilo
+        # escriba. Sin copiar el registro: en el espacio "hotel" no hay otro manejador que lo use
+        registro.msg = registro.getMessage()
+        registro.args = None
+        if registro.exc_info:
+            registro.exc_text = logging.Formatter().formatException(registro.exc_info)
+            registro.exc_info = None
+        return registro
+
+    def enqueue(self, registro: logging.LogRecord):
+        try:
+            self.queue.put_nowait(registro)
+        except queue.Full:
+            self.descartados += 1
+
+def _pares(texto: str) -> Dict[str, str]:
+    pares = {}
+    for parte in texto.split(","):
+        clave, _, valor = parte.partition("=")
+        if clave.strip() and valor.strip():
+            pares[clave.strip()] = valor.strip()
+    return pares
+
+_lock = threading.Lock()
+_manejador: Optional[ManejadorCola] = None
+_oyente: Optional[QueueListener] = None
+
+def configurar_registro(formato_por_defecto: str = "json") -> logging.Logger:
+    """
+    Configurar el espacio "hotel" según el entorno (sólo la primera vez)
+
+    Args:
+        formato_por_defecto: Formato si HOTEL_LOG_FORMATO no está definido
+            (las herramientas de consola usan "texto")
+
+    Returns:
+        El logger raíz del espacio
+    """
+    global _manejador, _oyente
+    raiz = logging.getLogger(ESPACIO)
+    with _lock:
+        if _manejador is not None:
+            return raiz
+        formato = os.environ.get("HOTEL_LOG_FORMATO", formato_por_defecto)
+        salida = logging.StreamHandler(sys.stdout)
+        salida.setFormatter(FORMATEADORES.get(formato, FormateadorJSON)())
+
+        _manejador = ManejadorCola(queue.Queue(int(os.environ.get("HOTEL_LOG_COLA", "10000"))))
+        tasas = {evento: float(tasa) for evento, tasa in _pares(os.environ.get("HOTEL_LOG_MUESTREO", "")).items()}
+        if tasas:
+            _manejador.addFilter(FiltroMuestreo(tasas))
+        _oyente = QueueListener(_manejador.queue, salida, respect_handler_level=True)
+        _oyente.start()
+        atexit.register(detener_registro)
+
+        raiz.setLevel(os.environ.get("HOTEL_LOG_NIVEL", "INFO").upper())
+        raiz.addHandler(_manejador)
+        raiz.propagate = False
+        for modulo, nivel in _pares(os.environ.get("HOTEL_LOG_NIVELES", "")).items():
+            obtener_registro(modulo).setLevel(nivel.upper())
+    return raiz
+
+def detener_registro():
+    """Escribir lo pendiente y parar el hilo de escritura"""
+    global _manejador, _oyente
+    with _lock:
+        if _oyente is None:
+            return
+        _oyente.stop()
+        logging.getLogger(ESPACIO).removeHandler(_manejador)
+        if _manejador.descartados:
+            sys.stderr.write(f"registro: {_manejador.descartados} registros descartados con la cola llena\n")
+        _manejador = _oyente = None
@@ -4,6 +4,7 @@ from datetime import datetime, timedelta
 import random
 from metricas_testing import MetricasTesting
 from dashboard_visual import DashboardVisual
+from registro import configurar_registro
 import os
 
 class SimuladorTesting:
@@ -418,5 +419,6 @@ class SimuladorTesting:
 
 
 if __name__ == "__main__":
+    configurar_registro(formato_por_defecto="texto")
     simulador = SimuladorTesting()
     simulador.ejecutar_simulacion()
\ No newline at end of file
@@ -0,0 +1,105 @@
+"""
+Suscripciones a la disponibilidad por tipo (push con Server-Sent Events)
+
+En vez de repetir /buscar cada pocos segundos, un cliente se suscribe a un
+rango de fechas (y opcionalmente un tipo) y recibe sólo los cambios. Cada
+worker sigue el registro de eventos (ver proyecciones.py) y, por cada
+reserva creada, cancelada, modificada o eliminada, avisa a las suscripciones
+cuyo rango incluye alguna de sus noches:
+
+- `IndiceSuscripciones` guarda cada suscripción en un conjunto por noche,
+  así que encontrar las afectadas cuesta lo que las noches del evento más
+  las suscripciones que devuelve, no el total de suscripciones.
+- Las suscripciones con el mismo rango, tipo y huéspedes comparten cálculo.
+- Cada suscripción recuerda lo último que envió y sólo recibe los tipos
+  cuyo valor cambió. Si el cliente lee despacio, los cambios pendientes se
+  fusionan en lugar de acumularse.
+"""
+import asyncio
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+class Suscripcion:
+    """Rango [inicio, fin) de números de día, tipo opcional y últimos valores enviados"""
+
+    def __init__(self, inicio: int, fin: int, tipo: Optional[str], huespedes: int):
+        self.inicio = inicio
+        self.fin = fin
+        self.tipo = tipo
+        self.huespedes = huespedes
+        self.enviado: Dict[str, dict] = {}
+        self.pendiente: Dict[str, dict] = {}
+        self.aviso = asyncio.Event()
+        self.cerrada = False
+
+    @property
+    def clave(self) -> Tuple[int, int, Optional[str], int]:
+        return self.inicio, self.fin, self.tipo, self.huespedes
+
+    def registrar_envio(self, tipos: List[dict]):
+        """Marcar como enviados los valores de la foto inicial"""
+        self.enviado = {entrada["tipo"]: entrada for entrada in tipos}
+
+    def actualizar(self, tipos: List[dict]) -> bool:
+        """Acumular los tipos cuyo valor difiere de lo enviado; True si hay algo que enviar"""
+        for entrada in tipos:
+            if self.enviado.get(entrada["tipo"]) != entrada:
+                self.pendiente[entrada["tipo"]] = entrada
+        if self.pendiente:
+            self.aviso.set()
+        return bool(self.pendiente)
+
+    def tomar_cambios(self) -> List[dict]:
+        cambios = list(self.pendiente.values())
+        self.enviado.update(self.pendiente)
+        self.pendiente = {}
+        self.aviso.clear()
+        return cambios
+
+    def cerrar(self):
+        self.cerrada = True
+        self.aviso.set()
+
+class IndiceSuscripciones:
+    """Suscripciones indexadas por cada noche de su rango"""
+
+    def __init__(self):
+        self.por_noche: Dict[int, Set[Suscripcion]] = {}
+        self.total = 0
+
+    def __len__(self):
+        return self.total
+
+    def agregar(self, suscripcion: Suscripcion):
+        for noche in range(suscripcion.inicio, suscripcion.fin):
+            self.por_noche.setdefault(noche, set()).add(suscripcion)
+        self.total += 1
+
+    def quitar(self, suscripcion: Suscripcion):
+        for noche in range(suscripcion.inicio, suscripcion.fin):
+            suscripciones = self.por_noche.get(noche)
+            if suscripciones is not None:
+                suscripciones.discard(suscripcion)
+                if not suscripciones:
+                    del self.por_noche[noche]
+        self.total -= 1
+
+    def todas(self) -> Set[Suscripcion]:
+        return set().union(*self.por_noche.values())
+
+    def afectadas(self, cambios: Iterable[Tuple[int, int, Optional[str]]]) -> Set[Suscripcion]:
+        """
+        Suscripciones que incluyen alguna noche de los cambios (inicio, fin, tipo)
+
+        Con tipo None (desconocido) el cambio afecta a todos los tipos.
+        """
+        resultado = set()
+        for inicio, fin, tipo in cambios:
+            for noche in range(inicio, fin):
+                for suscripcion in self.por_noche.get(noche, ()):
+                    if tipo is None or suscripcion.tipo in (None, tipo):
+                        resultado.add(suscripcion)
+        return resultado
+
+    def cerrar_todas(self):
+        for suscripcion in self.todas():
+            suscripcion.cerrar()
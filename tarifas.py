@@ -0,0 +1,201 @@
+"""
+Calendario de tarifas con sumas prefijas
+
+El precio de una noche sale del `precio_noche` de la habitación, modificado
+por las reglas de la tabla `tarifas` (temporadas y excepciones por tipo o por
+habitación). Para que el total de cualquier estancia cueste O(1), se
+precalcula una matriz de precios por noche y su suma acumulada:
+
+    total(habitación, inicio, fin) = prefijo[perfil, fin] - prefijo[perfil, inicio]
+
+Las habitaciones con el mismo tipo, el mismo precio base y sin reglas propias
+comparten fila ("perfil"), así que un hotel de miles de habitaciones casi
+idénticas ocupa unas pocas filas.
+"""
+import threading
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from fechas import a_dia
+
+# Días precalculados a partir de hoy; fuera de ese rango se calcula al vuelo
+DIAS_HORIZONTE = 730
+
+def a_centavos(precio: float) -> int:
+    return int(round(precio * 100))
+
+class CalendarioTarifas:
+    """Instantánea inmutable de precios por noche (en centavos) y sus sumas prefijas"""
+
+    def __init__(self, habitaciones: List[Tuple[int, str, float]], reglas: List[dict],
+                 origen: date, dias: int = DIAS_HORIZONTE):
+        """
+        Args:
+            habitaciones: Filas (id, tipo, precio_noche)
+            reglas: Filas de la tabla tarifas como diccionarios (fechas como número de día)
+            origen: Primer día del horizonte precalculado
+        """
+        self.origen = a_dia(origen)
+        self.dias = dias
+        self.reglas = sorted(reglas, key=lambda r: (self._nivel(r), r["prioridad"] or 0, r["id"]))
+        self.sin_reglas = not reglas
+
+        con_reglas_propias = {r["habitacion_id"] for r in reglas if r["habitacion_id"] is not None}
+
+        # Perfil = (tipo, precio base en centavos, habitación si tiene reglas propias)
+        indice_perfiles: Dict[tuple, int] = {}
+        ids = np.empty(len(habitaciones), dtype=np.int64)
+        perfil_de = np.empty(len(habitaciones), dtype=np.int64)
+        for i, (habitacion_id, tipo, precio_noche) in enumerate(habitaciones):
+            clave = (tipo, a_centavos(precio_noche),
+                     habitacion_id if habitacion_id in con_reglas_propias else None)
+            ids[i] = habitacion_id
+            perfil_de[i] = indice_perfiles.setdefault(clave, len(indice_perfiles))
+
+        orden = np.argsort(ids)
+        self.ids = ids[orden]
+        self.perfil_de = perfil_de[orden]
+        self.perfiles = sorted(indice_perfiles, key=indice_perfiles.get)
+
+        precios = self._precios(self.perfiles, self.origen, self.origen + dias)
+        self.prefijos = np.zeros((len(self.perfiles), dias + 1), dtype=np.int64)
+        np.cumsum(precios, axis=1, out=self.prefijos[:, 1:])
+
+    def exportar(self) -> Tuple[dict, Dict[str, np.ndarray]]:
+        """Datos (serializables en JSON) y arreglos del calendario, para guardarlo en una instantánea"""
+        datos = {"origen": self.origen, "dias": self.dias, "reglas": self.reglas, "perfiles": self.perfiles}
+        return datos, {"ids": self.ids, "perfil_de": self.perfil_de, "prefijos": self.prefijos}
+
+    @classmethod
+    def restaurar(cls, datos: dict, arreglos: Dict[str, np.ndarray]) -> "CalendarioTarifas":
+        """Calendario armado con lo que devolvió `exportar` (los arreglos pueden ser de sólo lectura)"""
+        calendario = cls.__new__(cls)
+        calendario.origen = datos["origen"]
+        calendario.dias = datos["dias"]
+        calendario.reglas = datos["reglas"]
+        calendario.sin_reglas = not datos["reglas"]
+        calendario.perfiles = [tuple(perfil) for perfil in datos["perfiles"]]
+        calendario.ids = arreglos["ids"]
+        calendario.perfil_de = arreglos["perfil_de"]
+        calendario.prefijos = arreglos["prefijos"]
+        return calendario
+
+    @staticmethod
+    def _nivel(regla: dict) -> int:
+        if regla["habitacion_id"] is not None:
+            return 2
+        if regla["tipo"] is not None:
+            return 1
+        return 0
+
+    def _precios(self, perfiles: List[tuple], desde: int, hasta: int) -> np.ndarray:
+        """
+        Matriz de precios por noche (perfil × día) para los días [desde, hasta)
+
+        Las reglas se aplican de la más general a la más específica; dentro de
+        un mismo nivel gana la de mayor prioridad.
+        """
+        base = np.array([p[1] for p in perfiles], dtype=np.int64)
+        precios = np.repeat(base[:, None], hasta - desde, axis=1)
+        tipos = np.array([p[0] for p in perfiles], dtype=object)
+        propias = np.array([-1 if p[2] is None else p[2] for p in perfiles], dtype=np.int64)
+
+        for regla in self.reglas:
+            inicio = max(regla["fecha_inicio"], desde) - desde
+            fin = min(regla["fecha_fin"], hasta) - desde
+            if inicio >= fin:
+                continue
+            if regla["habitacion_id"] is not None:
+                filas = propias == regla["habitacion_id"]
+            elif regla["tipo"] is not None:
+                filas = tipos == regla["tipo"]
+            else:
+                filas = np.ones(len(perfiles), dtype=bool)
+            if not filas.any():
+                continue
+            if regla["precio_noche"] is not None:
+                precios[filas, inicio:fin] = a_centavos(regla["precio_noche"])
+            else:
+                precios[filas, inicio:fin] = np.rint(base[filas] * regla["multiplicador"])[:, None]
+        return precios
+
+    def _filas(self, habitacion_ids: np.ndarray) -> np.ndarray:
+        if len(self.ids) == 0:
+            raise KeyError("Habitación sin tarifa")
+        posiciones = np.minimum(np.searchsorted(self.ids, habitacion_ids), len(self.ids) - 1)
+        if not np.array_equal(self.ids[posiciones], habitacion_ids):
+            raise KeyError("Habitación sin tarifa")
+        return self.perfil_de[posiciones]
+
+    def totales_centavos(self, habitacion_ids, inicio: date, fin: date) -> np.ndarray:
+        """Total de la estancia [inicio, fin) para cada habitación, en una sola operación"""
+        habitacion_ids = np.asarray(habitacion_ids, dtype=np.int64)
+        if len(habitacion_ids) == 0:
+            return np.zeros(0, dtype=np.int64)
+        filas = self._filas(habitacion_ids)
+        desde = a_dia(inicio) - self.origen
+        hasta = a_dia(fin) - self.origen
+        if 0 <= desde and hasta <= self.dias:
+            return self.prefijos[filas, hasta] - self.prefijos[filas, desde]
+
+        # Fuera del horizonte: se calculan sólo los perfiles implicados y sólo esos días
+        unicos, inverso = np.unique(filas, return_inverse=True)
+        precios = self._precios([self.perfiles[f] for f in unicos], a_dia(inicio), a_dia(fin))
+        return precios.sum(axis=1)[inverso]
+
+    def hay_reglas(self, inicio: date, fin: date) -> bool:
+        """¿Alguna regla toca [inicio, fin)? Si no, cada total es precio_noche × noches"""
+        desde, hasta = a_dia(inicio), a_dia(fin)
+        return any(r["fecha_inicio"] < hasta and r["fecha_fin"] > desde for r in self.reglas)
+
+    def totales(self, habitacion_ids, inicio: date, fin: date) -> np.ndarray:
+        return self.totales_centavos(habitacion_ids, inicio, fin) / 100
+
+    def total(self, habitacion_id: int, inicio: date, fin: date) -> float:
+        return float(self.totales([habitacion_id], inicio, fin)[0])
+
+class MotorTarifas:
+    """
+    Mantiene el calendario vigente y lo reconstruye cuando cambia el catálogo
+
+    La reconstrucción se dispara cuando cambia `version_catalogo` (habitaciones
+    o tarifas, en cualquier worker) o cuando cambia el día.
+    """
+
+    def __init__(self, dias: int = DIAS_HORIZONTE):
+        self.dias = dias
+        self.clave: Optional[tuple] = None
+        self.calendario: Optional[CalendarioTarifas] = None
+        self.lock = threading.Lock()
+
+    def obtener(self, cursor, ruta: str, version_catalogo: int) -> CalendarioTarifas:
+        hoy = date.today()
+        clave = (ruta, version_catalogo, hoy)
+        if clave != self.clave:
+            with self.lock:
+                if clave != self.clave:
+                    self.calendario = cargar_calendario(cursor, hoy, self.dias)
+                    self.clave = clave
+        return self.calendario
+
+    def instalar(self, ruta: str, version_catalogo: int, calendario: CalendarioTarifas):
+        """Usar un calendario ya armado (con origen hoy) como el vigente para esa versión del catálogo"""
+        with self.lock:
+            self.calendario = calendario
+            self.clave = (ruta, version_catalogo, date.today())
+
+def cargar_calendario(cursor, origen: date, dias: int = DIAS_HORIZONTE) -> CalendarioTarifas:
+    cursor.execute("SELECT id, tipo, precio_noche FROM habitaciones")
+    habitaciones = [tuple(fila) for fila in cursor.fetchall()]
+    cursor.execute("""
+        SELECT id, habitacion_id, tipo, fecha_inicio, fecha_fin, precio_noche, multiplicador, prioridad
+        FROM tarifas
+    """)
+    reglas = [
+        dict(zip(("id", "habitacion_id", "tipo", "fecha_inicio", "fecha_fin",
+                  "precio_noche", "multiplicador", "prioridad"), fila))
+        for fila in cursor.fetchall()
+    ]
+    return CalendarioTarifas(habitaciones, reglas, origen, dias)
@@ -0,0 +1,141 @@
+"""
+Fixtures comunes: cada prueba usa su propia base de datos en un directorio temporal
+"""
+import os
+import random
+import sqlite3
+import sys
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hotel_booking_system  # noqa: E402
+
+ADMIN = "token-admin-pruebas"
+
+@pytest.fixture
+def base_datos(tmp_path, monkeypatch):
+    """Ruta de una base de datos nueva, sin calentamiento ni instantánea de arranque"""
+    ruta = str(tmp_path / "hotel.db")
+    monkeypatch.setattr(hotel_booking_system, "DATABASE", ruta)
+    monkeypatch.setattr(hotel_booking_system, "CALENTAMIENTO", False)
+    monkeypatch.setattr(hotel_booking_system, "ARRANQUE_EN_CALIENTE", False)
+    monkeypatch.setattr(hotel_booking_system, "ADMIN_TOKEN", ADMIN)
+    return ruta
+
+@pytest.fixture
+def cliente(base_datos):
+    """TestClient con el lifespan en marcha (esquema, migraciones y habitaciones de ejemplo)"""
+    with TestClient(hotel_booking_system.app) as cliente:
+        yield cliente
+
+@pytest.fixture
+def usuario(cliente):
+    """Cabeceras de un usuario registrado y con sesión iniciada"""
+    datos = {"email": "huesped@hotel.com", "password": "secreto1", "nombre": "Ana", "apellido": "Prueba",
+             "telefono": "600000000"}
+    assert cliente.post("/register", json=datos).status_code == 200
+    token = cliente.post("/login", json={"email": datos["email"], "password": datos["password"]}).json()["token"]
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture
+def admin():
+    return {"Authorization": f"Bearer {ADMIN}"}
+
+# Esquema original (user_version 0): fechas de estancia y vencimientos como texto
+ESQUEMA_LEGADO = """
+CREATE TABLE usuarios (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, email TEXT UNIQUE NOT NULL, password_hash TEXT NOT NULL,
+    nombre TEXT NOT NULL, apellido TEXT NOT NULL, telefono TEXT,
+    fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP, activo BOOLEAN DEFAULT 1
+);
+CREATE TABLE sesiones (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, usuario_id INTEGER NOT NULL, token TEXT UNIQUE NOT NULL,
+    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP, fecha_expiracion TIMESTAMP NOT NULL,
+    activa BOOLEAN DEFAULT 1
+);
+CREATE TABLE habitaciones (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, numero TEXT UNIQUE NOT NULL, tipo TEXT NOT NULL,
+    capacidad INTEGER NOT NULL, precio_noche REAL NOT NULL, descripcion TEXT, disponible BOOLEAN DEFAULT 1
+);
+CREATE TABLE reservas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, usuario_id INTEGER NOT NULL, habitacion_id INTEGER NOT NULL,
+    fecha_inicio DATE NOT NULL, fecha_fin DATE NOT NULL, huespedes INTEGER NOT NULL,
+    precio_total REAL NOT NULL, estado TEXT DEFAULT 'pendiente', fecha_reserva TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE pagos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, reserva_id INTEGER NOT NULL, monto REAL NOT NULL,
+    metodo_pago TEXT NOT NULL, ultimos_4_digitos TEXT, estado TEXT DEFAULT 'procesando',
+    fecha_pago TIMESTAMP DEFAULT CURRENT_TIMESTAMP, codigo_transaccion TEXT UNIQUE
+);
+"""
+
+# (habitacion_id, fecha_inicio, fecha_fin, precio_total, estado) de las reservas legadas
+RESERVAS_LEGADAS = [
+    (1, "2030-01-10", "2030-01-13", 150.0, "confirmada"),
+    (1, "2030-01-13", "2030-01-15", 100.0, "pendiente"),
+    (3, "2030-01-11", "2030-01-12", 80.0, "cancelada"),
+    (6, "2030-02-27", "2030-03-02", 450.0, "confirmada"),
+]
+
+@pytest.fixture
+def base_legada(base_datos):
+    """Base de datos con el esquema original y algunos datos, sin migrar"""
+    conn = sqlite3.connect(base_datos)
+    with conn:
+        conn.executescript(ESQUEMA_LEGADO)
+        conn.executemany(
+            "INSERT INTO habitaciones (numero, tipo, capacidad, precio_noche, descripcion) VALUES (?, ?, ?, ?, ?)",
+            [("101", "simple", 1, 50.0, "Individual"), ("102", "simple", 1, 50.0, "Individual"),
+             ("201", "doble", 2, 80.0, "Doble"), ("202", "doble", 2, 85.0, "Doble"),
+             ("203", "doble", 2, 80.0, "Doble"), ("301", "suite", 4, 150.0, "Suite")],
+        )
+        conn.execute("INSERT INTO usuarios (email, password_hash, nombre, apellido) VALUES (?, ?, ?, ?)",
+                     ("legado@hotel.com", "x", "Ana", "Legado"))
+        conn.execute("INSERT INTO sesiones (usuario_id, token, fecha_expiracion) VALUES (1, 'tok', '2030-01-01 12:00:00')")
+        conn.executemany("""
+            INSERT INTO reservas (usuario_id, habitacion_id, fecha_inicio, fecha_fin, huespedes, precio_total, estado)
+            VALUES (1, ?, ?, ?, 1, ?, ?)
+        """, RESERVAS_LEGADAS)
+        conn.execute("INSERT INTO pagos (reserva_id, monto, metodo_pago, estado) VALUES (1, 150.0, 'tarjeta', 'aprobado')")
+    conn.close()
+    return base_datos
+
+PAGO = {"metodo_pago": "tarjeta_credito", "numero_tarjeta": "4532123456789012", "cvv": "123",
+        "nombre_titular": "Ana Prueba"}
+
+@pytest.fixture
+def reservas_variadas(cliente, usuario):
+    """Reservas por habitación, por tipo y de grupo, algunas pagadas y otras canceladas, hechas por la API"""
+    rng = random.Random(11)
+    hoy = date.today()
+    creadas = []
+    for _ in range(60):
+        inicio = hoy + timedelta(days=rng.randint(1, 40))
+        fechas = {"fecha_inicio": str(inicio), "fecha_fin": str(inicio + timedelta(days=rng.randint(1, 6)))}
+        eleccion = rng.random()
+        if eleccion < 0.5:
+            respuesta = cliente.post("/reservar", headers=usuario,
+                                     json={"habitacion_id": rng.randint(1, 10), "huespedes": 1, **fechas})
+        elif eleccion < 0.85:
+            respuesta = cliente.post("/reservar", headers=usuario,
+                                     json={"tipo_habitacion": rng.choice(["simple", "doble", "suite"]), "huespedes": 1,
+                                           **fechas})
+        else:
+            respuesta = cliente.post("/reservar-grupo", headers=usuario,
+                                     json={"habitacion_ids": rng.sample(range(1, 11), 2), "huespedes": 2, **fechas})
+        if respuesta.status_code != 200:
+            continue
+        datos = respuesta.json()
+        creadas += [reserva["reserva_id"] for reserva in datos["reservas"]] if "reservas" in datos else [datos["reserva_id"]]
+    for reserva_id in creadas:
+        accion = rng.random()
+        if accion < 0.4:
+            assert cliente.post("/pagar", headers=usuario, json={"reserva_id": reserva_id, **PAGO}).status_code == 200
+        if accion < 0.2 or accion > 0.8:
+            assert cliente.post(f"/reservas/{reserva_id}/cancelar", headers=usuario).status_code == 200
+    assert len(creadas) > 20
+    return creadas
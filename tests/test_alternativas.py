@@ -0,0 +1,69 @@
+"""
+/buscar con dias_flexibles: las alternativas frente a buscar cada ventana desplazada
+"""
+import random
+import sqlite3
+from contextlib import closing
+from datetime import date, timedelta
+
+import pytest
+
+from fechas import a_dia
+from hotel_booking_system import ALTERNATIVAS_MAXIMAS
+from tarifas import DIAS_HORIZONTE
+
+def ocupar(base_datos, reservas):
+    with closing(sqlite3.connect(base_datos)) as conn, conn:
+        conn.executemany("""
+            INSERT INTO reservas (usuario_id, habitacion_id, fecha_inicio, fecha_fin, huespedes, precio_total, estado)
+            VALUES (1, ?, ?, ?, 1, 100, ?)
+        """, reservas)
+
+def por_fuerza_bruta(cliente, busqueda, inicio, fin, dias):
+    """Buscar cada [inicio + k, fin + k) por separado, del desplazamiento más cercano al más lejano"""
+    resultado = []
+    for k in sorted(range(-dias, dias + 1), key=lambda d: (abs(d), d)):
+        desde, hasta = inicio + timedelta(days=k), fin + timedelta(days=k)
+        if k == 0 or desde < date.today():
+            continue
+        habitaciones = cliente.post("/buscar", json={**busqueda, "fecha_inicio": str(desde),
+                                                    "fecha_fin": str(hasta)}).json()["habitaciones"]
+        if habitaciones:
+            resultado.append({
+                "fecha_inicio": str(desde), "fecha_fin": str(hasta), "desplazamiento_dias": k,
+                "habitaciones_disponibles": len(habitaciones),
+                "precio_total_desde": min(habitacion["precio_total"] for habitacion in habitaciones),
+            })
+    return resultado[:ALTERNATIVAS_MAXIMAS]
+
+@pytest.mark.parametrize("semilla", range(25))
+def test_igual_a_buscar_cada_ventana(cliente, admin, base_datos, semilla):
+    rng = random.Random(semilla)
+    hoy = date.today()
+    # Cerca de hoy (las ventanas anteriores se descartan) y cruzando el horizonte de tarifas
+    inicio = hoy + timedelta(days=rng.choice([0, 1, 3, 20, DIAS_HORIZONTE - 4]))
+    noches = rng.randint(1, 4)
+    fin = inicio + timedelta(days=noches)
+    dias = rng.randint(1, 8)
+    busqueda = {"huespedes": rng.choice([1, 1, 2, 3]), "tipo_habitacion": rng.choice([None, "simple", "doble", "suite"])}
+    if rng.random() < 0.3:
+        busqueda["precio_max"] = rng.choice([90, 130, 200])
+
+    # Todas las habitaciones ocupadas en las fechas pedidas y otras estancias alrededor
+    reservas = [(h, a_dia(inicio), a_dia(fin), "confirmada") for h in range(1, 11)]
+    for _ in range(rng.randint(0, 25)):
+        entrada = a_dia(inicio) + rng.randint(-dias - 3, dias + 3)
+        reservas.append((rng.randint(1, 10), entrada, entrada + rng.randint(1, 4),
+                         rng.choice(["pendiente", "confirmada", "cancelada"])))
+    ocupar(base_datos, reservas)
+    if rng.random() < 0.5:
+        # Una temporada que empieza dentro del rango de desplazamientos
+        assert cliente.post("/admin/tarifas", headers=admin, json={
+            "nombre": "Temporada", "fecha_inicio": str(inicio + timedelta(days=rng.randint(-3, 3))),
+            "fecha_fin": str(fin + timedelta(days=rng.randint(4, 10))), "multiplicador": 1.4,
+        }).status_code == 200
+
+    respuesta = cliente.post("/buscar", json={**busqueda, "fecha_inicio": str(inicio), "fecha_fin": str(fin),
+                                             "dias_flexibles": dias}).json()
+    assert respuesta["habitaciones"] == []
+    assert respuesta["alternativas"] == por_fuerza_bruta(cliente, busqueda, inicio, fin, dias)
@@ -0,0 +1,95 @@
+"""
+asignacion_habitaciones: reasignar nunca crea solapamientos
+"""
+import random
+import sqlite3
+from contextlib import closing
+from datetime import date
+
+import numpy as np
+import pytest
+
+from asignacion_habitaciones import asignar_tipo, medir_huecos, optimizar_y_aplicar
+
+def estancias_validas(rng, habitaciones):
+    """Estancias sin solapamientos en su habitación actual: (inicio, fin, habitación)"""
+    filas = []
+    for h in range(habitaciones):
+        dia = rng.randint(0, 3)
+        while dia < 60:
+            noches = rng.randint(1, 5)
+            filas.append((dia, dia + noches, h))
+            dia += noches + rng.choice([0, 0, 1, 1, 2, 4])
+    rng.shuffle(filas)
+    return [np.array(columna, dtype=np.int64) for columna in zip(*filas)]
+
+def solapadas(habitacion, inicio, fin):
+    orden = np.lexsort((inicio, habitacion))
+    habitacion, inicio, fin = habitacion[orden], inicio[orden], fin[orden]
+    return int(((habitacion[1:] == habitacion[:-1]) & (inicio[1:] < fin[:-1])).sum())
+
+@pytest.mark.parametrize("semilla", range(40))
+def test_sin_solapamientos(semilla):
+    rng = random.Random(semilla)
+    habitaciones = rng.randint(1, 8)
+    inicio, fin, actual = estancias_validas(rng, habitaciones)
+    capacidad = np.array([rng.choice([2, 3, 4]) for _ in range(habitaciones)], dtype=np.int64)
+    huespedes = np.array([rng.randint(1, capacidad[h]) for h in actual], dtype=np.int64)
+    fija = np.array([rng.random() < 0.2 for _ in inicio])
+    habilitada = np.array([rng.random() < 0.9 for _ in range(habitaciones)])
+
+    nueva, sin_asignar = asignar_tipo(inicio, fin, huespedes, actual, fija, capacidad, habilitada)
+
+    assert not sin_asignar[fija].any()
+    assert (nueva[fija] == actual[fija]).all()
+    movidas = ~sin_asignar & ~fija
+    assert (capacidad[nueva[movidas]] >= huespedes[movidas]).all()
+    assert habilitada[nueva[movidas]].all()
+    # Las asignadas (fijas incluidas) no se solapan entre sí aunque alguna no haya cabido
+    asignadas = ~sin_asignar
+    assert solapadas(nueva[asignadas], inicio[asignadas], fin[asignadas]) == 0
+
+@pytest.mark.parametrize("semilla", range(20))
+def test_sin_restricciones_todo_cabe(semilla):
+    # Habitaciones iguales y nada fijo: el barrido por entrada es un coloreado óptimo
+    rng = random.Random(semilla)
+    habitaciones = rng.randint(1, 8)
+    inicio, fin, actual = estancias_validas(rng, habitaciones)
+    n = len(inicio)
+    nueva, sin_asignar = asignar_tipo(inicio, fin, np.ones(n, dtype=np.int64), actual, np.zeros(n, dtype=bool),
+                                      np.full(habitaciones, 2), np.ones(habitaciones, dtype=bool))
+    assert not sin_asignar.any()
+    assert solapadas(nueva, inicio, fin) == 0
+    antes = medir_huecos(actual, inicio, fin, 0, 70)
+    despues = medir_huecos(nueva, inicio, fin, 0, 70)
+    assert despues["huecos_cortos"] <= antes["huecos_cortos"]
+
+def test_cierra_un_hueco_de_una_noche():
+    # Habitación 0: 0..3 y 4..6 deja libre la noche 3, que nadie puede comprar
+    inicio, fin = np.array([0, 4, 3]), np.array([3, 6, 4])
+    actual = np.array([0, 0, 1])
+    nueva, sin_asignar = asignar_tipo(inicio, fin, np.ones(3, dtype=np.int64), actual, np.zeros(3, dtype=bool),
+                                      np.array([2, 2]), np.ones(2, dtype=bool))
+    assert not sin_asignar.any()
+    assert medir_huecos(actual, inicio, fin, 0, 10)["huecos_cortos"] == 1
+    assert medir_huecos(nueva, inicio, fin, 0, 10)["huecos_cortos"] == 0
+    assert solapadas(nueva, inicio, fin) == 0
+
+def test_aplicar_en_la_base(reservas_variadas, base_datos):
+    with closing(sqlite3.connect(base_datos, isolation_level=None)) as conn:
+        tipos_antes = conn.execute("""
+            SELECT r.id, h.tipo FROM reservas r JOIN habitaciones h ON h.id = r.habitacion_id ORDER BY r.id
+        """).fetchall()
+        optimizar_y_aplicar(conn, date.today(), 60, aplicar=True)
+        solapes = conn.execute("""
+            SELECT COUNT(*) FROM reservas a JOIN reservas b
+              ON a.habitacion_id = b.habitacion_id AND a.id < b.id
+             AND a.fecha_inicio < b.fecha_fin AND b.fecha_inicio < a.fecha_fin
+            WHERE a.estado IN ('pendiente', 'confirmada') AND b.estado IN ('pendiente', 'confirmada')
+        """).fetchone()[0]
+        tipos_despues = conn.execute("""
+            SELECT r.id, h.tipo FROM reservas r JOIN habitaciones h ON h.id = r.habitacion_id ORDER BY r.id
+        """).fetchall()
+    assert solapes == 0
+    # Sólo se cambia de habitación dentro del tipo
+    assert tipos_despues == tipos_antes
@@ -0,0 +1,104 @@
+"""
+/buscar: paginación por clave y selección de campos (fields=)
+
+La respuesta paginada debe traer las mismas habitaciones, con los mismos
+valores, que la respuesta completa; sólo cambian el orden y el corte.
+"""
+import sqlite3
+from contextlib import closing
+from datetime import date, timedelta
+
+import pytest
+
+INICIO = date.today() + timedelta(days=30)
+FIN = INICIO + timedelta(days=3)
+BUSQUEDA = {"fecha_inicio": str(INICIO), "fecha_fin": str(FIN), "huespedes": 1}
+
+def buscar(cliente, fields=None, **extra):
+    params = {"fields": fields} if fields else None
+    respuesta = cliente.post("/buscar", json={**BUSQUEDA, **extra}, params=params)
+    assert respuesta.status_code == 200, respuesta.text
+    return respuesta.json()
+
+def por_id(habitaciones):
+    return {habitacion["id"]: habitacion for habitacion in habitaciones}
+
+def recorrer_paginas(cliente, **extra):
+    """Todas las habitaciones siguiendo siguiente_cursor"""
+    habitaciones, cursor = [], None
+    while True:
+        datos = buscar(cliente, **extra, **({"cursor": cursor} if cursor else {}))
+        habitaciones += datos["habitaciones"]
+        cursor = datos["siguiente_cursor"]
+        if cursor is None:
+            return habitaciones
+
+@pytest.fixture(params=["sin_tarifas", "con_tarifas"])
+def con_o_sin_tarifas(request, cliente, admin):
+    """Con una tarifa en la estancia la página se arma en numpy; sin ella, en SQL"""
+    if request.param == "con_tarifas":
+        respuesta = cliente.post("/admin/tarifas", headers=admin, json={
+            "nombre": "Temporada", "fecha_inicio": str(INICIO), "fecha_fin": str(INICIO + timedelta(days=1)),
+            "tipo": "doble", "multiplicador": 1.5,
+        })
+        assert respuesta.status_code == 200, respuesta.text
+    return cliente
+
+@pytest.mark.parametrize("orden", ["precio", "capacidad"])
+def test_pagina_igual_a_respuesta_completa(con_o_sin_tarifas, orden):
+    cliente = con_o_sin_tarifas
+    completa = por_id(buscar(cliente)["habitaciones"])
+    paginada = buscar(cliente, orden=orden, limite=100)["habitaciones"]
+    assert len(paginada) == len(completa)
+    for habitacion in paginada:
+        assert habitacion == completa[habitacion["id"]]
+        assert habitacion["noches"] == 3
+
+@pytest.mark.parametrize("descendente", [False, True])
+@pytest.mark.parametrize("orden", ["precio", "capacidad"])
+def test_cursor_recorre_todas_en_orden(con_o_sin_tarifas, orden, descendente):
+    cliente = con_o_sin_tarifas
+    completa = buscar(cliente)["habitaciones"]
+    recorridas = recorrer_paginas(cliente, orden=orden, descendente=descendente, limite=2)
+
+    ids = [habitacion["id"] for habitacion in recorridas]
+    assert len(ids) == len(set(ids)) == len(completa)
+    campo = "precio_total" if orden == "precio" else "capacidad"
+    claves = [(habitacion[campo], habitacion["id"]) for habitacion in recorridas]
+    assert claves == sorted(claves, reverse=descendente)
+
+def test_fields_en_pagina(con_o_sin_tarifas):
+    cliente = con_o_sin_tarifas
+    completa = por_id(buscar(cliente)["habitaciones"])
+    paginada = buscar(cliente, fields="noches,precio_total,id", orden="precio", limite=100)["habitaciones"]
+    assert paginada
+    for habitacion in paginada:
+        # En el orden del modelo, sin importar el orden pedido
+        assert list(habitacion) == ["id", "precio_total", "noches"]
+        original = completa[habitacion["id"]]
+        assert habitacion == {campo: original[campo] for campo in ("id", "precio_total", "noches")}
+
+def test_fields_un_solo_campo_en_pagina(cliente):
+    paginada = buscar(cliente, fields="capacidad", orden="capacidad", limite=3)
+    assert [list(habitacion) for habitacion in paginada["habitaciones"]] == [["capacidad"]] * 3
+    assert paginada["siguiente_cursor"] is not None
+
+def test_fields_desconocido(cliente):
+    respuesta = cliente.post("/buscar", json=BUSQUEDA, params={"fields": "id,color"})
+    assert respuesta.status_code == 400
+
+# Precios base con fracciones de centavo: 80.004 y 79.996 valen lo mismo en centavos y
+# 80.125 es un medio centavo exacto (a_centavos redondea al par, a 8012)
+PRECIOS_FRACCIONARIOS = {1: 80.004, 2: 79.996, 3: 80.125, 4: 80.12, 5: 80.13, 6: 80.115}
+
+@pytest.mark.parametrize("descendente", [False, True])
+@pytest.mark.parametrize("precios", [{}, {"precio_min": 80.12, "precio_max": 80.12}, {"precio_max": 80.0}])
+def test_precios_con_fracciones_de_centavo(con_o_sin_tarifas, base_datos, descendente, precios):
+    with closing(sqlite3.connect(base_datos)) as conn, conn:
+        conn.executemany("UPDATE habitaciones SET precio_noche = ? WHERE id = ?",
+                         [(precio, habitacion_id) for habitacion_id, precio in PRECIOS_FRACCIONARIOS.items()])
+    cliente = con_o_sin_tarifas
+    completa = buscar(cliente, **precios)["habitaciones"]
+    recorridas = recorrer_paginas(cliente, orden="precio", descendente=descendente, limite=1, **precios)
+    esperado = sorted(completa, key=lambda h: (h["precio_total"], h["id"]), reverse=descendente)
+    assert [h["id"] for h in recorridas] == [h["id"] for h in esperado]
@@ -0,0 +1,47 @@
+"""
+CacheVersionada compartida entre el event loop y los hilos de asyncio.to_thread
+"""
+import threading
+
+from hotel_booking_system import CacheVersionada
+
+def test_no_guarda_un_valor_calculado_con_otra_version():
+    version = {"actual": 1}
+    cache = CacheVersionada(leer_version=lambda cursor: version["actual"])
+    calculando, seguir = threading.Event(), threading.Event()
+
+    def calcular_lento():
+        calculando.set()
+        seguir.wait(5)
+        return "viejo"
+
+    hilo = threading.Thread(target=cache.obtener, args=(None, "clave", calcular_lento))
+    hilo.start()
+    calculando.wait(5)
+    # Mientras el hilo calcula con la versión 1, otro cambio invalida la caché
+    version["actual"] = 2
+    assert cache.obtener(None, "otra", lambda: "nuevo") == "nuevo"
+    seguir.set()
+    hilo.join()
+    assert cache.obtener(None, "clave", lambda: "nuevo") == "nuevo"
+
+def test_hilos_con_invalidaciones():
+    lecturas = iter(range(10**9))
+    cache = CacheVersionada(max_entradas=8, leer_version=lambda cursor: next(lecturas) // 3)
+    errores = []
+
+    def trabajar(semilla):
+        try:
+            for i in range(5_000):
+                clave = (semilla * i) % 13
+                assert cache.obtener(None, clave, lambda: clave * 2) == clave * 2
+        except Exception as e:
+            errores.append(e)
+
+    hilos = [threading.Thread(target=trabajar, args=(semilla,)) for semilla in range(1, 9)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert errores == []
+    assert len(cache.entradas) <= cache.max_entradas
@@ -0,0 +1,80 @@
+"""
+Disponibilidad en vivo: qué cambios de reservas llegan a qué suscripciones
+"""
+import sqlite3
+from contextlib import closing
+from datetime import date, timedelta
+
+import hotel_booking_system
+from fechas import a_dia
+from suscripciones import IndiceSuscripciones, Suscripcion
+
+INICIO = date.today() + timedelta(days=20)
+
+def reservar(cliente, usuario, habitacion_id, inicio, noches):
+    respuesta = cliente.post("/reservar", headers=usuario, json={
+        "habitacion_id": habitacion_id, "fecha_inicio": str(inicio),
+        "fecha_fin": str(inicio + timedelta(days=noches)), "huespedes": 1,
+    })
+    assert respuesta.status_code == 200, respuesta.text
+    return respuesta.json()["reserva_id"]
+
+def ultimo_evento(base_datos) -> int:
+    with closing(sqlite3.connect(base_datos)) as conn:
+        return conn.execute("SELECT COALESCE(MAX(id), 0) FROM eventos").fetchone()[0]
+
+def modificar(base_datos, reserva_id, **columnas):
+    with closing(sqlite3.connect(base_datos)) as conn, conn:
+        asignaciones = ", ".join(f"{columna} = ?" for columna in columnas)
+        conn.execute(f"UPDATE reservas SET {asignaciones} WHERE id = ?", (*columnas.values(), reserva_id))
+
+def suscripciones_avisadas(desde, *rangos):
+    """Suscripciones (sin tipo) a cada rango de fechas que recibirían los cambios posteriores a `desde`"""
+    _, _, cambios, todas = hotel_booking_system.difusor_disponibilidad._leer_cambios(desde)
+    assert not todas
+    indice = IndiceSuscripciones()
+    suscripciones = [Suscripcion(a_dia(inicio), a_dia(fin), None, 1) for inicio, fin in rangos]
+    for suscripcion in suscripciones:
+        indice.agregar(suscripcion)
+    afectadas = indice.afectadas(cambios)
+    return [suscripcion in afectadas for suscripcion in suscripciones]
+
+def test_reserva_movida_avisa_las_noches_liberadas(cliente, usuario, base_datos):
+    reserva_id = reservar(cliente, usuario, 1, INICIO, 3)
+    desde = ultimo_evento(base_datos)
+    nuevo_inicio = INICIO + timedelta(days=10)
+    modificar(base_datos, reserva_id, fecha_inicio=a_dia(nuevo_inicio), fecha_fin=a_dia(nuevo_inicio) + 2)
+
+    liberadas = (INICIO, INICIO + timedelta(days=3))
+    ocupadas = (nuevo_inicio, nuevo_inicio + timedelta(days=2))
+    ajena = (INICIO + timedelta(days=40), INICIO + timedelta(days=41))
+    assert suscripciones_avisadas(desde, liberadas, ocupadas, ajena) == [True, True, False]
+
+def test_reserva_acortada_avisa_la_noche_liberada(cliente, usuario, base_datos):
+    reserva_id = reservar(cliente, usuario, 1, INICIO, 3)
+    desde = ultimo_evento(base_datos)
+    modificar(base_datos, reserva_id, fecha_fin=a_dia(INICIO) + 1)
+
+    ultima_noche = (INICIO + timedelta(days=2), INICIO + timedelta(days=3))
+    assert suscripciones_avisadas(desde, ultima_noche) == [True]
+
+def test_cambio_de_habitacion_avisa_el_tipo_anterior(cliente, usuario, base_datos):
+    tipos = {habitacion["id"]: habitacion["tipo"] for habitacion in cliente.post("/buscar", json={
+        "fecha_inicio": str(INICIO), "fecha_fin": str(INICIO + timedelta(days=1)), "huespedes": 1,
+    }).json()["habitaciones"]}
+    origen = next(iter(tipos))
+    destino = next(habitacion_id for habitacion_id, tipo in tipos.items() if tipo != tipos[origen])
+    reserva_id = reservar(cliente, usuario, origen, INICIO, 2)
+    desde = ultimo_evento(base_datos)
+    modificar(base_datos, reserva_id, habitacion_id=destino)
+
+    _, _, cambios, _ = hotel_booking_system.difusor_disponibilidad._leer_cambios(desde)
+    rango = (a_dia(INICIO), a_dia(INICIO) + 2)
+    assert {(inicio, fin, tipo) for inicio, fin, tipo in cambios} == {(*rango, tipos[origen]), (*rango, tipos[destino])}
+
+def test_cambio_de_estado_sin_intervalo_anterior(cliente, usuario, base_datos):
+    reserva_id = reservar(cliente, usuario, 1, INICIO, 2)
+    desde = ultimo_evento(base_datos)
+    modificar(base_datos, reserva_id, huespedes=2)
+    _, _, cambios, _ = hotel_booking_system.difusor_disponibilidad._leer_cambios(desde)
+    assert len(cambios) == 1
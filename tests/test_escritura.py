@@ -0,0 +1,86 @@
+"""
+Escrituras con el bloqueo de SQLite retenido por otro proceso
+
+La espera (busy timeout y reintentos) debe ocurrir fuera del event loop:
+mientras una escritura espera, el worker sigue atendiendo otras peticiones.
+"""
+import asyncio
+import sqlite3
+import time
+
+import httpx
+
+import hotel_booking_system
+
+def test_escritura_bloqueada_no_frena_el_event_loop(cliente, base_datos, monkeypatch):
+    monkeypatch.setattr(hotel_booking_system, "BUSY_TIMEOUT_SEGUNDOS", 0.2)
+    otro_worker = sqlite3.connect(base_datos, isolation_level=None)
+    otro_worker.execute("BEGIN IMMEDIATE")
+
+    async def escenario():
+        transporte = httpx.ASGITransport(app=hotel_booking_system.app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://pruebas") as cliente_asgi:
+            registro = asyncio.create_task(cliente_asgi.post("/register", json={
+                "email": "bloqueo@hotel.com", "password": "secreto1", "nombre": "Bloqueo", "apellido": "Prueba",
+                "telefono": "600000000",
+            }))
+            await asyncio.sleep(0.05)
+            inicio = time.perf_counter()
+            salud = await cliente_asgi.get("/healthz")
+            espera_salud = time.perf_counter() - inicio
+            assert not registro.done()
+
+            otro_worker.execute("ROLLBACK")
+            return salud, espera_salud, await registro
+
+    try:
+        salud, espera_salud, registro = asyncio.run(escenario())
+    finally:
+        otro_worker.close()
+    assert salud.status_code == 200
+    assert espera_salud < 0.1
+    assert registro.status_code == 200, registro.text
+
+def insertar_tarifa(cursor, precio):
+    cursor.execute("""
+        INSERT INTO tarifas (nombre, tipo, fecha_inicio, fecha_fin, precio_noche) VALUES ('Prueba', 'simple', 1, 2, ?)
+    """, (precio,))
+    return cursor.lastrowid
+
+def test_detener_aplica_lo_encolado(base_datos):
+    hotel_booking_system.init_database()
+    cola = hotel_booking_system.ColaEscritura(ventana_ms=20)
+
+    async def escenario():
+        envios = [asyncio.create_task(cola.enviar(insertar_tarifa, precio)) for precio in range(50, 60)]
+        await asyncio.sleep(0)
+        await cola.detener()
+        return envios
+
+    envios = asyncio.run(escenario())
+    assert all(envio.done() and not envio.exception() for envio in envios)
+    with sqlite3.connect(base_datos) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM tarifas").fetchone()[0] == 10
+
+def test_detener_no_deja_peticiones_colgadas(base_datos, monkeypatch):
+    hotel_booking_system.init_database()
+    monkeypatch.setattr(hotel_booking_system, "BUSY_TIMEOUT_SEGUNDOS", 5)
+    otro_worker = sqlite3.connect(base_datos, isolation_level=None)
+    otro_worker.execute("BEGIN IMMEDIATE")
+    cola = hotel_booking_system.ColaEscritura(ventana_ms=1)
+
+    async def escenario():
+        envios = [asyncio.create_task(cola.enviar(insertar_tarifa, precio)) for precio in range(50, 53)]
+        await asyncio.sleep(0.05)
+        # El lote en curso espera el bloqueo; llega otra petición detrás
+        envios.append(asyncio.create_task(cola.enviar(insertar_tarifa, 99)))
+        await asyncio.sleep(0)
+        await cola.detener(espera=0.05)
+        return await asyncio.gather(*envios, return_exceptions=True)
+
+    try:
+        resultados = asyncio.run(asyncio.wait_for(escenario(), 2))
+    finally:
+        otro_worker.execute("ROLLBACK")
+        otro_worker.close()
+    assert all(isinstance(r, RuntimeError) and "detenida" in str(r) for r in resultados)
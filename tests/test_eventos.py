@@ -0,0 +1,115 @@
+"""
+Registro de eventos y proyección del historial (/mis-reservas)
+
+Los triggers publican cada cambio en `eventos`; aplicar los eventos de forma
+incremental debe dejar `historial_reservas` igual que reconstruirlo desde
+las reservas.
+"""
+import json
+import sqlite3
+from contextlib import closing
+from datetime import date, timedelta
+
+import hotel_booking_system
+from proyecciones import hay_eventos_pendientes, historial_usuario, proyectar, reconstruir_historial
+
+INICIO = date.today() + timedelta(days=25)
+
+PAGO = {"metodo_pago": "tarjeta_credito", "numero_tarjeta": "4532123456789012", "cvv": "123",
+        "nombre_titular": "Ana Prueba"}
+
+def reservar(cliente, usuario, habitacion_id, desplazamiento=0, noches=2):
+    inicio = INICIO + timedelta(days=desplazamiento)
+    respuesta = cliente.post("/reservar", headers=usuario, json={
+        "habitacion_id": habitacion_id, "fecha_inicio": str(inicio),
+        "fecha_fin": str(inicio + timedelta(days=noches)), "huespedes": 1,
+    })
+    assert respuesta.status_code == 200, respuesta.text
+    return respuesta.json()["reserva_id"]
+
+def eventos(base_datos, desde=0):
+    with closing(sqlite3.connect(base_datos)) as conn:
+        return [(tipo, reserva_id, json.loads(datos)) for tipo, reserva_id, datos in conn.execute(
+            "SELECT tipo, reserva_id, datos FROM eventos WHERE id > ? ORDER BY id", (desde,))]
+
+def historial(conn):
+    return conn.execute("SELECT * FROM historial_reservas ORDER BY usuario_id, reserva_id").fetchall()
+
+def test_ciclo_de_una_reserva_publica_sus_eventos(cliente, usuario, base_datos):
+    reserva_id = reservar(cliente, usuario, 2)
+    assert cliente.post("/pagar", headers=usuario, json={"reserva_id": reserva_id, **PAGO}).status_code == 200
+    assert cliente.post(f"/reservas/{reserva_id}/cancelar", headers=usuario).status_code == 200
+
+    publicados = eventos(base_datos)
+    assert sorted(tipo for tipo, _, _ in publicados) == sorted(
+        ["reserva_creada", "pago_registrado", "reserva_confirmada", "reserva_cancelada"])
+    assert {reserva for _, reserva, _ in publicados} == {reserva_id}
+    creada = next(datos for tipo, _, datos in publicados if tipo == "reserva_creada")
+    assert creada["habitacion_id"] == 2 and creada["estado"] == "pendiente"
+    assert publicados[-1][0] == "reserva_cancelada"
+
+def test_cambio_de_habitacion_y_borrado(cliente, usuario, base_datos):
+    reserva_id = reservar(cliente, usuario, 4)
+    with closing(sqlite3.connect(base_datos)) as conn:
+        desde = conn.execute("SELECT MAX(id) FROM eventos").fetchone()[0]
+    with closing(sqlite3.connect(base_datos)) as conn, conn:
+        conn.execute("UPDATE habitaciones SET descripcion = 'Renovada' WHERE id = 4")
+        # Una actualización que no cambia nada visible no publica
+        conn.execute("UPDATE reservas SET huespedes = huespedes WHERE id = ?", (reserva_id,))
+        conn.execute("DELETE FROM reservas WHERE id = ?", (reserva_id,))
+    assert [tipo for tipo, _, _ in eventos(base_datos, desde)] == ["habitacion_modificada", "reserva_eliminada"]
+
+def test_proyeccion_incremental_igual_a_reconstruida(cliente, usuario, base_datos):
+    ids = [reservar(cliente, usuario, habitacion_id, desplazamiento) for habitacion_id, desplazamiento in
+           [(1, 0), (2, 0), (3, 5), (1, 10)]]
+    cliente.post("/pagar", headers=usuario, json={"reserva_id": ids[0], **PAGO})
+    cliente.post(f"/reservas/{ids[1]}/cancelar", headers=usuario)
+    with closing(sqlite3.connect(base_datos)) as conn, conn:
+        conn.execute("UPDATE habitaciones SET numero = '301-B' WHERE id = 6")
+        conn.execute("UPDATE habitaciones SET descripcion = 'Vista al mar' WHERE id = 3")
+        conn.execute("UPDATE reservas SET fecha_fin = fecha_fin + 1 WHERE id = ?", (ids[3],))
+        conn.execute("DELETE FROM reservas WHERE id = ?", (ids[2],))
+
+    hotel_booking_system.ejecutar_proyeccion()
+    with closing(sqlite3.connect(base_datos, isolation_level=None)) as conn:
+        incremental = historial(conn)
+        conn.execute("BEGIN IMMEDIATE")
+        reconstruir_historial(conn.cursor())
+        reconstruida = historial(conn)
+        conn.execute("ROLLBACK")
+    assert incremental == reconstruida
+    documentos = {fila[2]: json.loads(fila[4]) for fila in incremental}
+    assert set(documentos) == {ids[0], ids[1], ids[3]}
+    assert documentos[ids[0]]["estado"] == "confirmada"
+    assert documentos[ids[1]]["estado"] == "cancelada"
+    assert documentos[ids[3]]["fecha_fin"] == str(INICIO + timedelta(days=13))
+
+def test_historial_con_eventos_pendientes_igual_al_proyectado(base_datos):
+    # Sin lifespan no hay proyector en segundo plano: los eventos quedan pendientes
+    hotel_booking_system.init_database()
+    with closing(sqlite3.connect(base_datos, isolation_level=None)) as conn:
+        conn.execute("INSERT INTO usuarios (email, password_hash, nombre, apellido) VALUES ('h@hotel.com', 'x', 'H', 'P')")
+        for habitacion_id, inicio, estado in [(1, 20_100, "pendiente"), (3, 20_105, "confirmada"), (6, 20_110, "pendiente")]:
+            conn.execute("""
+                INSERT INTO reservas (usuario_id, habitacion_id, fecha_inicio, fecha_fin, huespedes, precio_total, estado,
+                                      fecha_reserva)
+                VALUES (1, ?, ?, ?, 1, 100, ?, ?)
+            """, (habitacion_id, inicio, inicio + 2, estado, f"2030-01-0{habitacion_id} 10:00:00"))
+        conn.execute("UPDATE reservas SET estado = 'cancelada' WHERE habitacion_id = 1")
+        conn.execute("UPDATE habitaciones SET descripcion = 'Vista al mar' WHERE id = 3")
+        conn.execute("DELETE FROM reservas WHERE habitacion_id = 6")
+
+        cursor = conn.cursor()
+        campos = ("id", "estado", "habitacion.descripcion")
+        pendiente = historial_usuario(cursor, 1), historial_usuario(cursor, 1, campos)
+        conn.execute("BEGIN IMMEDIATE")
+        proyectar(cursor)
+        conn.execute("COMMIT")
+        assert not hay_eventos_pendientes(cursor)
+        proyectado = historial_usuario(cursor, 1), historial_usuario(cursor, 1, campos)
+
+    assert pendiente == proyectado
+    assert [json.loads(documento) for documento in proyectado[1]] == [
+        {"id": 2, "estado": "confirmada", "habitacion": {"descripcion": "Vista al mar"}},
+        {"id": 1, "estado": "cancelada", "habitacion": {"descripcion": "Habitación individual con cama simple"}},
+    ]
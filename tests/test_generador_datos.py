@@ -0,0 +1,32 @@
+"""
+generador_datos: --forzar sobre una base que la API dejó en modo WAL
+"""
+import os
+import shutil
+import sqlite3
+from contextlib import closing
+
+from generador_datos import generar_base_datos
+
+def test_forzar_descarta_el_wal_de_la_base_reemplazada(tmp_path):
+    salida = str(tmp_path / "hotel.db")
+    generar_base_datos(salida, habitaciones=20, usuarios=10, sesiones=5, reservas=50, semilla=1)
+
+    # Páginas escritas en el WAL y sin pasar a la base, como tras un cierre abrupto de la API
+    conn = sqlite3.connect(salida)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA wal_autocheckpoint = 0")
+    with conn:
+        conn.execute("UPDATE habitaciones SET descripcion = 'vieja'")
+    for sufijo in ("-wal", "-shm"):
+        shutil.copy(salida + sufijo, str(tmp_path / ("copia" + sufijo)))
+    conn.close()
+    for sufijo in ("-wal", "-shm"):
+        shutil.copy(str(tmp_path / ("copia" + sufijo)), salida + sufijo)
+
+    generar_base_datos(salida, habitaciones=30, usuarios=10, sesiones=5, reservas=50, semilla=2, forzar=True)
+    assert not os.path.exists(salida + "-wal")
+    with closing(sqlite3.connect(salida)) as conn:
+        assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+        assert conn.execute("SELECT COUNT(*) FROM habitaciones WHERE descripcion = 'vieja'").fetchone()[0] == 0
+        assert conn.execute("SELECT COUNT(*) FROM habitaciones").fetchone()[0] == 30
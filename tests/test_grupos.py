@@ -0,0 +1,65 @@
+"""
+grupos.combinacion_optima frente a la búsqueda exhaustiva en instancias pequeñas
+"""
+import itertools
+import random
+
+import numpy as np
+import pytest
+
+from grupos import combinacion_optima, costos_combinacion
+
+def optimo_exhaustivo(capacidades, costos, huespedes):
+    """Costo mínimo entre todos los subconjuntos que cubren a los huéspedes (None si ninguno)"""
+    mejor = None
+    for cantidad in range(len(capacidades) + 1):
+        for subconjunto in itertools.combinations(range(len(capacidades)), cantidad):
+            if sum(capacidades[i] for i in subconjunto) >= huespedes:
+                costo = sum(costos[i] for i in subconjunto)
+                mejor = costo if mejor is None else min(mejor, costo)
+    return mejor
+
+@pytest.mark.parametrize("semilla", range(60))
+def test_igual_al_optimo_exhaustivo(semilla):
+    rng = random.Random(semilla)
+    n = rng.randint(1, 10)
+    # Pocas capacidades y precios distintos: muchas habitaciones intercambiables (clases con varias unidades)
+    capacidades = [rng.choice([1, 2, 2, 3, 4]) for _ in range(n)]
+    costos = [rng.choice([3, 5, 5, 8, 13]) for _ in range(n)]
+    huespedes = rng.randint(1, sum(capacidades) + 2)
+
+    elegidas = combinacion_optima(np.array(capacidades), np.array(costos), huespedes)
+    esperado = optimo_exhaustivo(capacidades, costos, huespedes)
+    if esperado is None:
+        assert elegidas is None
+        return
+    elegidas = elegidas.tolist()
+    assert len(set(elegidas)) == len(elegidas)
+    assert sum(capacidades[i] for i in elegidas) >= huespedes
+    assert sum(costos[i] for i in elegidas) == esperado
+
+def test_sin_huespedes_y_sin_capacidad_suficiente():
+    assert combinacion_optima(np.array([2, 2]), np.array([5, 5]), 0).tolist() == []
+    assert combinacion_optima(np.array([2, 2]), np.array([5, 5]), 5) is None
+
+def test_criterios():
+    # Una suite de 4 por 300 o dos dobles de 2 por 100 cada una
+    capacidades = np.array([4, 2, 2])
+    totales = np.array([30_000, 10_000, 10_000])
+    por_precio = combinacion_optima(capacidades, costos_combinacion(totales, "precio"), 4)
+    por_habitaciones = combinacion_optima(capacidades, costos_combinacion(totales, "habitaciones"), 4)
+    assert por_precio.tolist() == [1, 2]
+    assert por_habitaciones.tolist() == [0]
+
+def test_a_igual_precio_menos_habitaciones():
+    # Dos simples de 100 o una doble de 200: mismo total, gana la doble
+    capacidades = np.array([1, 1, 2])
+    totales = np.array([10_000, 10_000, 20_000])
+    assert combinacion_optima(capacidades, costos_combinacion(totales, "precio"), 2).tolist() == [2]
+
+def test_muchas_habitaciones_iguales():
+    capacidades = np.full(1000, 2)
+    costos = np.full(1000, 7)
+    elegidas = combinacion_optima(capacidades, costos, 51)
+    assert len(elegidas) == 26
+    assert elegidas.tolist() == list(range(26))
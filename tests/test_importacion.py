@@ -0,0 +1,82 @@
+"""
+importacion.LectorRegistros: los registros no dependen de cómo llegan partidos los bytes
+"""
+import csv
+import io
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+from importacion import LectorRegistros
+
+# Campos entre comillas con saltos de línea (también \r\n), comillas dobladas,
+# comas, acentos de varios bytes y BOM al principio
+CSV = (
+    '\ufeffnumero,tipo,capacidad,precio_noche,descripcion\r\n'
+    '101,simple,1,80,"Vista al patio"\r\n'
+    '102,doble,2,120,"Dos camas,\r\nbaño con ""ducha""\r\ny balcón"\r\n'
+    '103,suite,4,300,\n'
+    '104,doble,2,125,"Última planta\n\n(ascensor)"\n'
+    '105,simple,1,85,"""Económica"""'
+)
+
+def leer(texto: str, tamano: int, formato: str = "csv"):
+    datos = texto.encode("utf-8")
+    lector = LectorRegistros(formato)
+    registros = []
+    for inicio in range(0, len(datos), tamano):
+        registros += lector.alimentar(datos[inicio:inicio + tamano])
+    return registros + lector.terminar()
+
+def esperado():
+    # Los finales de línea \r\n quedan como \n, también dentro de un campo
+    filas = csv.DictReader(io.StringIO(CSV.lstrip("\ufeff").replace("\r\n", "\n"), newline=""))
+    return [{columna: valor for columna, valor in fila.items() if valor != ""} for fila in filas]
+
+@pytest.mark.parametrize("tamano", [1, 2, 3, 5, 7, 16, 64, 10_000])
+def test_csv_partido_en_fragmentos(tamano):
+    registros = leer(CSV, tamano)
+    assert [error for _, _, error in registros] == [None] * 5
+    assert [datos for _, datos, _ in registros] == esperado()
+    # Cada registro se informa por la línea física en la que empieza
+    assert [linea for linea, _, _ in registros] == [2, 3, 6, 7, 10]
+
+def test_todos_los_cortes_posibles():
+    completo = leer(CSV, 10_000)
+    for corte in range(1, len(CSV.encode("utf-8"))):
+        datos = CSV.encode("utf-8")
+        lector = LectorRegistros("csv")
+        registros = lector.alimentar(datos[:corte]) + lector.alimentar(datos[corte:]) + lector.terminar()
+        assert registros == completo, corte
+
+def test_comillas_sin_cerrar_y_columnas_de_mas():
+    registros = leer('numero,tipo\n1,"simple\n2,doble', 4)
+    assert registros == [(2, None, "Comillas sin cerrar")]
+    registros = leer('numero,tipo\n1,simple,x\n2,doble\n', 3)
+    assert registros == [(2, None, "Se esperaban 2 columnas y hay 3"), (3, {"numero": "2", "tipo": "doble"}, None)]
+
+def test_ndjson():
+    texto = '{"numero": "1", "tipo": "simple"}\n\n[1]\n{"numero": 2\n{"numero": "3", "tipo": "é"}'
+    assert leer(texto, 5, "ndjson") == [
+        (1, {"numero": "1", "tipo": "simple"}, None),
+        (3, None, "Se esperaba un objeto JSON"),
+        (4, None, "JSON inválido"),
+        (5, {"numero": "3", "tipo": "é"}, None),
+    ]
+
+def test_utf8_invalido():
+    with pytest.raises(UnicodeDecodeError):
+        LectorRegistros("csv").alimentar(b"numero\n\xff\n")
+
+def test_importar_habitaciones(cliente, admin, base_datos):
+    datos = CSV.encode("utf-8")
+    fragmentos = (datos[inicio:inicio + 7] for inicio in range(0, len(datos), 7))
+    respuesta = cliente.post("/admin/importar/habitaciones", headers=admin, content=fragmentos)
+    assert respuesta.status_code == 200, respuesta.text
+    assert respuesta.json()["filas"] == 5 and respuesta.json()["con_error"] == 0
+    with closing(sqlite3.connect(base_datos)) as conn:
+        descripciones = dict(conn.execute(
+            "SELECT numero, descripcion FROM habitaciones WHERE numero IN ('102', '104', '105')"))
+    assert descripciones == {"102": 'Dos camas,\nbaño con "ducha"\ny balcón', "104": "Última planta\n\n(ascensor)",
+                             "105": '"Económica"'}
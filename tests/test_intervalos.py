@@ -0,0 +1,100 @@
+"""
+R*Tree de intervalos de reservas (`reservas_intervalos`)
+
+Los triggers deben dejar el árbol igual a las reservas activas tras
+cualquier cambio, y las consultas de solapamiento sobre el árbol deben dar
+lo mismo que sobre la tabla.
+"""
+import random
+import sqlite3
+from contextlib import closing
+from datetime import date, timedelta
+
+import pytest
+
+import hotel_booking_system
+from conftest import RESERVAS_LEGADAS
+
+ESTADOS = ["pendiente", "confirmada", "cancelada"]
+
+def intervalos(conn):
+    return sorted(conn.execute("""
+        SELECT id, habitacion_min, habitacion_max, fecha_inicio, fecha_fin FROM reservas_intervalos
+    """).fetchall())
+
+def activas(conn):
+    return sorted(conn.execute("""
+        SELECT id, habitacion_id, habitacion_id, fecha_inicio, fecha_fin FROM reservas
+        WHERE estado IN ('pendiente', 'confirmada')
+    """).fetchall())
+
+def test_migracion_carga_las_reservas_activas(base_legada):
+    hotel_booking_system.init_database()
+    with closing(sqlite3.connect(base_legada)) as conn:
+        assert intervalos(conn) == activas(conn)
+        assert len(intervalos(conn)) == sum(estado != "cancelada" for *_, estado in RESERVAS_LEGADAS)
+
+@pytest.mark.parametrize("semilla", range(5))
+def test_triggers_mantienen_el_arbol(cliente, base_datos, semilla):
+    rng = random.Random(semilla)
+    with closing(sqlite3.connect(base_datos, isolation_level=None)) as conn:
+        for _ in range(300):
+            operacion = rng.random()
+            ids = [fila[0] for fila in conn.execute("SELECT id FROM reservas")]
+            if operacion < 0.4 or not ids:
+                inicio = 20_000 + rng.randint(0, 60)
+                conn.execute("""
+                    INSERT INTO reservas (usuario_id, habitacion_id, fecha_inicio, fecha_fin, huespedes, precio_total, estado)
+                    VALUES (1, ?, ?, ?, 1, 100, ?)
+                """, (rng.randint(1, 10), inicio, inicio + rng.randint(1, 7), rng.choice(ESTADOS)))
+            elif operacion < 0.6:
+                conn.execute("UPDATE reservas SET estado = ? WHERE id = ?", (rng.choice(ESTADOS), rng.choice(ids)))
+            elif operacion < 0.75:
+                conn.execute("UPDATE reservas SET habitacion_id = ? WHERE id = ?", (rng.randint(1, 10), rng.choice(ids)))
+            elif operacion < 0.9:
+                conn.execute("UPDATE reservas SET fecha_inicio = fecha_inicio + ?, fecha_fin = fecha_fin + ? WHERE id = ?",
+                             (*[rng.randint(-3, 3)] * 2, rng.choice(ids)))
+            else:
+                conn.execute("DELETE FROM reservas WHERE id = ?", (rng.choice(ids),))
+        assert intervalos(conn) == activas(conn)
+
+        # Habitaciones ocupadas en un rango: árbol frente a la tabla
+        for _ in range(100):
+            inicio = 20_000 + rng.randint(-5, 70)
+            fin = inicio + rng.randint(1, 10)
+            arbol = conn.execute("""
+                SELECT DISTINCT habitacion_min FROM reservas_intervalos WHERE fecha_inicio < ? AND fecha_fin > ?
+            """, (fin, inicio)).fetchall()
+            tabla = conn.execute("""
+                SELECT DISTINCT habitacion_id FROM reservas
+                WHERE estado IN ('pendiente', 'confirmada') AND fecha_inicio < ? AND fecha_fin > ?
+            """, (fin, inicio)).fetchall()
+            assert sorted(arbol) == sorted(tabla)
+
+def test_solapamiento_en_la_api(cliente, usuario):
+    inicio = date.today() + timedelta(days=15)
+
+    def reservar(desde, noches):
+        return cliente.post("/reservar", headers=usuario, json={
+            "habitacion_id": 3, "fecha_inicio": str(desde),
+            "fecha_fin": str(desde + timedelta(days=noches)), "huespedes": 1,
+        })
+
+    def libre(desde, noches):
+        habitaciones = cliente.post("/buscar", json={
+            "fecha_inicio": str(desde), "fecha_fin": str(desde + timedelta(days=noches)), "huespedes": 1,
+        }).json()["habitaciones"]
+        return 3 in {habitacion["id"] for habitacion in habitaciones}
+
+    reserva = reservar(inicio, 3)
+    assert reserva.status_code == 200
+    assert not libre(inicio + timedelta(days=2), 2)
+    assert reservar(inicio + timedelta(days=2), 2).status_code == 409
+    # El día de salida queda libre para la siguiente entrada
+    assert libre(inicio + timedelta(days=3), 1)
+    assert reservar(inicio + timedelta(days=3), 1).status_code == 200
+
+    # Cancelada, la habitación vuelve a estar libre
+    cancelacion = cliente.post(f"/reservas/{reserva.json()['reserva_id']}/cancelar", headers=usuario)
+    assert cancelacion.status_code == 200, cancelacion.text
+    assert libre(inicio, 3)
@@ -0,0 +1,44 @@
+"""
+Inventario por tipo: lo mantenido en cada reserva coincide con reconstruirlo
+"""
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+from inventario import reconstruir_inventario
+
+def vendidas(conn):
+    return conn.execute("""
+        SELECT tipo, fecha, vendidas FROM inventario_tipo WHERE vendidas != 0 ORDER BY tipo, fecha
+    """).fetchall()
+
+def test_incremental_igual_a_reconstruido(reservas_variadas, base_datos):
+    with closing(sqlite3.connect(base_datos, isolation_level=None)) as conn:
+        incremental = vendidas(conn)
+        conn.execute("BEGIN IMMEDIATE")
+        reconstruir_inventario(conn.cursor())
+        reconstruido = vendidas(conn)
+        conn.execute("ROLLBACK")
+    assert incremental and incremental == reconstruido
+
+def test_nunca_mas_vendidas_que_habitaciones(reservas_variadas, base_datos):
+    with closing(sqlite3.connect(base_datos)) as conn:
+        excedidas = conn.execute("""
+            SELECT i.tipo, i.fecha FROM inventario_tipo i
+            WHERE i.vendidas > (SELECT COUNT(*) FROM habitaciones h WHERE h.tipo = i.tipo AND h.disponible = 1)
+               OR i.vendidas < 0
+        """).fetchall()
+    assert excedidas == []
+
+@pytest.mark.parametrize("tipo", ["simple", "suite"])
+def test_tipo_agotado(cliente, usuario, tipo):
+    # Con todas las habitaciones del tipo vendidas, /reservar por tipo responde 409
+    fechas = {"fecha_inicio": "2031-05-01", "fecha_fin": "2031-05-03", "huespedes": 1}
+    disponibles = {entrada["tipo"]: entrada["disponibles"]
+                   for entrada in cliente.post("/disponibilidad-tipos", json=fechas).json()["tipos"]}
+    for _ in range(disponibles[tipo]):
+        assert cliente.post("/reservar", headers=usuario, json={"tipo_habitacion": tipo, **fechas}).status_code == 200
+    assert cliente.post("/reservar", headers=usuario, json={"tipo_habitacion": tipo, **fechas}).status_code == 409
+    tipos = cliente.post("/disponibilidad-tipos", json=fechas).json()["tipos"]
+    assert {entrada["tipo"]: entrada["disponibles"] for entrada in tipos}[tipo] == 0
@@ -0,0 +1,65 @@
+"""
+Migraciones: una base de datos con el esquema original (user_version 0) queda al día
+
+Cubre la conversión de fechas a números de día y de vencimientos a epoch,
+el relleno de las tablas derivadas y que volver a migrar no cambia nada.
+"""
+import sqlite3
+from contextlib import closing
+from datetime import date, datetime, timezone
+
+import hotel_booking_system
+from conftest import RESERVAS_LEGADAS
+from fechas import a_dia
+
+def consultar(ruta, sql, params=()):
+    with closing(sqlite3.connect(ruta)) as conn:
+        return conn.execute(sql, params).fetchall()
+
+def dia(texto: str) -> int:
+    return a_dia(date.fromisoformat(texto))
+
+def test_migra_desde_version_0(base_legada):
+    hotel_booking_system.init_database()
+
+    assert consultar(base_legada, "PRAGMA user_version")[0][0] == len(hotel_booking_system.MIGRACIONES)
+    reservas = consultar(base_legada, "SELECT habitacion_id, fecha_inicio, fecha_fin, estado FROM reservas ORDER BY id")
+    assert reservas == [(h, dia(inicio), dia(fin), estado) for h, inicio, fin, _, estado in RESERVAS_LEGADAS]
+    assert all(isinstance(inicio, int) and isinstance(fin, int) for _, inicio, fin, _ in reservas)
+
+    vence = datetime(2030, 1, 1, 12, tzinfo=timezone.utc)
+    assert consultar(base_legada, "SELECT fecha_expiracion FROM sesiones") == [(int(vence.timestamp()),)]
+    # Las habitaciones existentes no se duplican con las de ejemplo
+    assert consultar(base_legada, "SELECT COUNT(*) FROM habitaciones")[0][0] == 6
+
+def test_tablas_derivadas_rellenadas(base_legada):
+    hotel_booking_system.init_database()
+
+    # Habitación 1 (simple): 10..13 confirmada y 13..15 pendiente; la 3 está cancelada; la 6 (suite) cruza de mes
+    inventario = dict(((tipo, fecha), vendidas) for tipo, fecha, vendidas in
+                      consultar(base_legada, "SELECT tipo, fecha, vendidas FROM inventario_tipo WHERE vendidas > 0"))
+    esperado = {("simple", noche): 1 for noche in range(dia("2030-01-10"), dia("2030-01-15"))}
+    esperado.update({("suite", noche): 1 for noche in range(dia("2030-02-27"), dia("2030-03-02"))})
+    assert inventario == esperado
+
+    ocupacion = consultar(base_legada, """
+        SELECT tipo, SUM(vendidas), SUM(confirmadas), SUM(ingresos), SUM(ingresos_confirmados)
+        FROM ocupacion_diaria GROUP BY tipo ORDER BY tipo
+    """)
+    assert ocupacion == [("simple", 5, 3, 25_000, 15_000), ("suite", 3, 3, 45_000, 45_000)]
+
+    # Historial de /mis-reservas con las fechas de nuevo como texto
+    historial = consultar(base_legada, "SELECT documento ->> '$.fecha_inicio' FROM historial_reservas ORDER BY reserva_id")
+    assert [fila[0] for fila in historial] == [inicio for _, inicio, _, _, _ in RESERVAS_LEGADAS]
+
+def test_volver_a_migrar_no_cambia_nada(base_legada):
+    hotel_booking_system.init_database()
+    tablas = ("reservas", "sesiones", "inventario_tipo", "ocupacion_diaria", "reservas_intervalos",
+              "historial_reservas", "eventos")
+    antes = {tabla: consultar(base_legada, f"SELECT * FROM {tabla}") for tabla in tablas}
+    hotel_booking_system.init_database()
+    assert {tabla: consultar(base_legada, f"SELECT * FROM {tabla}") for tabla in tablas} == antes
+
+def test_base_nueva_arranca_en_la_ultima_version(cliente, base_datos):
+    assert consultar(base_datos, "PRAGMA user_version")[0][0] == len(hotel_booking_system.MIGRACIONES)
+    assert consultar(base_datos, "SELECT COUNT(*) FROM habitaciones")[0][0] == 10
@@ -0,0 +1,52 @@
+"""
+Agregado diario de ocupación: lo mantenido en cada reserva coincide con reconstruirlo
+"""
+import sqlite3
+from contextlib import closing
+
+import inventario
+import ocupacion
+from ocupacion import indicadores, reconstruir_ocupacion
+
+def agregado(conn):
+    return conn.execute("""
+        SELECT fecha, tipo, vendidas, confirmadas, ingresos, ingresos_confirmados FROM ocupacion_diaria
+        WHERE vendidas != 0 OR confirmadas != 0 OR ingresos != 0 OR ingresos_confirmados != 0
+        ORDER BY fecha, tipo
+    """).fetchall()
+
+def test_incremental_igual_a_reconstruido(reservas_variadas, base_datos):
+    with closing(sqlite3.connect(base_datos, isolation_level=None)) as conn:
+        incremental = agregado(conn)
+        conn.execute("BEGIN IMMEDIATE")
+        reconstruir_ocupacion(conn.cursor())
+        reconstruido = agregado(conn)
+        conn.execute("ROLLBACK")
+    assert incremental and incremental == reconstruido
+    # Hay días con reservas pagadas y otros con sólo pendientes
+    assert any(confirmadas for _, _, _, confirmadas, _, _ in incremental)
+    assert any(vendidas > confirmadas for _, _, vendidas, confirmadas, _, _ in incremental)
+
+def test_ingresos_suman_el_precio_de_las_reservas(reservas_variadas, base_datos):
+    # El reparto en centavos por noche no pierde ni inventa centavos
+    with closing(sqlite3.connect(base_datos)) as conn:
+        ingresos = conn.execute("SELECT SUM(ingresos), SUM(ingresos_confirmados) FROM ocupacion_diaria").fetchone()
+        precios = conn.execute("""
+            SELECT SUM(CAST(ROUND(precio_total * 100) AS INTEGER)),
+                   SUM(CASE WHEN estado = 'confirmada' THEN CAST(ROUND(precio_total * 100) AS INTEGER) ELSE 0 END)
+            FROM reservas WHERE estado IN ('pendiente', 'confirmada')
+        """).fetchone()
+    assert ingresos == precios
+
+def test_indicadores():
+    assert indicadores(4, 2, 30_000) == {"ocupacion": 50.0, "adr": 150.0, "revpar": 75.0}
+    assert indicadores(0, 0, 0) == {"ocupacion": 0.0, "adr": 0.0, "revpar": 0.0}
+
+def test_cli_reconstruye(reservas_variadas, base_datos, capsys):
+    with closing(sqlite3.connect(base_datos)) as conn:
+        antes = agregado(conn), conn.execute("SELECT * FROM inventario_tipo WHERE vendidas != 0 ORDER BY 1, 2").fetchall()
+    assert ocupacion.main(["--db", base_datos]) == 0
+    assert inventario.main(["--db", base_datos]) == 0
+    assert "Ocupación reconstruida" in capsys.readouterr().out
+    with closing(sqlite3.connect(base_datos)) as conn:
+        assert (agregado(conn), conn.execute("SELECT * FROM inventario_tipo ORDER BY 1, 2").fetchall()) == antes
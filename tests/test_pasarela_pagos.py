@@ -0,0 +1,63 @@
+"""
+Pasarela de pagos: interfaz y cliente con cortocircuito
+"""
+import asyncio
+
+import pytest
+
+import hotel_booking_system
+from pasarela_pagos import (CircuitoAbierto, ClientePasarela, ErrorPasarela, Pasarela, PasarelaInstantanea,
+                            PasarelaSimulada)
+
+def test_pasarela_incompleta_falla_al_crearse():
+    class SinCobro(Pasarela):
+        pass
+
+    with pytest.raises(TypeError):
+        SinCobro()
+
+def test_pasarela_instantanea_aprueba():
+    resultado = asyncio.run(PasarelaInstantanea().cobrar("R-1", 100.0, "9012"))
+    assert resultado.aprobado and resultado.codigo_transaccion.startswith("TXN-")
+
+def test_circuito_se_abre_tras_fallos_seguidos():
+    cliente = ClientePasarela(PasarelaSimulada(latencia_ms=1, dispersion=0, tasa_fallo=1.0), umbral_fallos=2,
+                              enfriamiento=60)
+
+    async def cobrar():
+        return await cliente.cobrar("R-1", 100.0, "9012")
+
+    for _ in range(2):
+        with pytest.raises(ErrorPasarela):
+            asyncio.run(cobrar())
+    assert cliente.estado == "abierto" and not cliente.admite_cobros()
+    with pytest.raises(CircuitoAbierto):
+        asyncio.run(cobrar())
+
+def test_cobro_lento_se_corta():
+    cliente = ClientePasarela(PasarelaSimulada(latencia_ms=500, dispersion=0), tiempo_maximo=0.01)
+    with pytest.raises(ErrorPasarela, match="a tiempo"):
+        asyncio.run(cliente.cobrar("R-1", 100.0, "9012"))
+    assert cliente.fallos_seguidos == 1
+
+def test_fallo_de_un_cobro_se_registra_y_la_cola_sigue(monkeypatch):
+    completados, registrados = [], []
+
+    async def completar_cobro(pago_id, monto, ultimos_4):
+        if pago_id == 1:
+            raise RuntimeError("sin conexión")
+        completados.append(pago_id)
+
+    monkeypatch.setattr(hotel_booking_system, "completar_cobro", completar_cobro)
+    monkeypatch.setattr(hotel_booking_system.registro, "exception",
+                        lambda mensaje, *args, **kwargs: registrados.append(mensaje % args))
+
+    async def escenario():
+        procesador = hotel_booking_system.ProcesadorPagos(trabajadores=1)
+        for pago_id in (1, 2):
+            procesador.encolar(pago_id, 100.0, "9012")
+        await procesador.detener()
+
+    asyncio.run(escenario())
+    assert registrados == ["Pago 1 sin completar"]
+    assert completados == [2]
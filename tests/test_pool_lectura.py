@@ -0,0 +1,54 @@
+"""
+PoolLectura agotado: el event loop no espera conexiones que tienen otros hilos
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+import hotel_booking_system
+from hotel_booking_system import PoolLectura
+
+@pytest.fixture
+def pool(base_datos, monkeypatch):
+    hotel_booking_system.init_database()
+    monkeypatch.setattr(hotel_booking_system, "BUSY_TIMEOUT_SEGUNDOS", 2)
+    pool = PoolLectura(base_datos, 1)
+    yield pool
+    pool.cerrar()
+
+def retener(pool, segundos):
+    """Ocupar la única conexión desde otro hilo, como una lectura en asyncio.to_thread"""
+    tomada = threading.Event()
+
+    def trabajo():
+        with pool.conexion():
+            tomada.set()
+            time.sleep(segundos)
+
+    hilo = threading.Thread(target=trabajo)
+    hilo.start()
+    tomada.wait(5)
+    return hilo
+
+def test_en_el_event_loop_responde_503_sin_esperar(pool):
+    hilo = retener(pool, 0.3)
+
+    async def leer():
+        inicio = time.perf_counter()
+        with pytest.raises(HTTPException) as error:
+            with pool.conexion():
+                pass
+        return error.value.status_code, time.perf_counter() - inicio
+
+    estado, espera = asyncio.run(leer())
+    hilo.join()
+    assert estado == 503 and espera < 0.1
+
+def test_fuera_del_event_loop_espera_la_conexion(pool):
+    hilo = retener(pool, 0.1)
+    with pool.conexion() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM habitaciones").fetchone()[0] == 10
+    hilo.join()
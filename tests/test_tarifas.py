@@ -0,0 +1,112 @@
+"""
+Calendario de tarifas: los totales por sumas prefijas frente a sumar noche a noche
+"""
+import random
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from fechas import a_dia
+from tarifas import CalendarioTarifas, a_centavos
+
+ORIGEN = date(2030, 1, 1)
+DIAS = 60
+
+def precio_noche(habitacion, reglas, dia):
+    """Precio en centavos de una noche: la regla aplicable más específica y, a igual nivel, de mayor prioridad"""
+    habitacion_id, tipo, precio = habitacion
+    base = a_centavos(precio)
+    aplicables = [r for r in reglas if r["fecha_inicio"] <= dia < r["fecha_fin"]
+                  and (r["habitacion_id"] == habitacion_id
+                       or (r["habitacion_id"] is None and r["tipo"] in (None, tipo)))]
+    if not aplicables:
+        return base
+    regla = max(aplicables, key=lambda r: (r["habitacion_id"] is not None, r["tipo"] is not None,
+                                           r["prioridad"], r["id"]))
+    if regla["precio_noche"] is not None:
+        return a_centavos(regla["precio_noche"])
+    return int(np.rint(base * regla["multiplicador"]))
+
+def total_noche_a_noche(habitacion, reglas, inicio, fin):
+    return sum(precio_noche(habitacion, reglas, dia) for dia in range(a_dia(inicio), a_dia(fin)))
+
+def reglas_aleatorias(rng, habitaciones, cantidad):
+    reglas = []
+    for regla_id in range(1, cantidad + 1):
+        # Empiezan o terminan antes, dentro o después del horizonte precalculado
+        inicio = a_dia(ORIGEN) + rng.randint(-20, DIAS + 10)
+        alcance = rng.random()
+        reglas.append({
+            "id": regla_id,
+            "habitacion_id": rng.choice(habitaciones)[0] if alcance < 0.3 else None,
+            "tipo": rng.choice(["simple", "doble", "suite"]) if 0.3 <= alcance < 0.7 else None,
+            "fecha_inicio": inicio,
+            "fecha_fin": inicio + rng.randint(1, 30),
+            "precio_noche": rng.choice([None, 55.5, 99.99, 120.0]),
+            "multiplicador": None,
+            "prioridad": rng.randint(0, 3),
+        })
+        if reglas[-1]["precio_noche"] is None:
+            reglas[-1]["multiplicador"] = rng.choice([0.85, 1.25, 1.333])
+    return reglas
+
+@pytest.mark.parametrize("semilla", range(30))
+def test_igual_a_sumar_noche_a_noche(semilla):
+    rng = random.Random(semilla)
+    habitaciones = [(habitacion_id, rng.choice(["simple", "doble", "suite"]), rng.choice([80.0, 80.0, 120.5, 300.0]))
+                    for habitacion_id in rng.sample(range(1, 200), rng.randint(1, 12))]
+    reglas = reglas_aleatorias(rng, habitaciones, rng.randint(0, 10))
+    calendario = CalendarioTarifas(habitaciones, reglas, ORIGEN, DIAS)
+    ids = [habitacion[0] for habitacion in habitaciones]
+
+    for _ in range(40):
+        # Estancias dentro del horizonte, que lo cruzan por cualquiera de los dos extremos o fuera de él
+        inicio = ORIGEN + timedelta(days=rng.randint(-15, DIAS + 5))
+        fin = inicio + timedelta(days=rng.randint(1, 25))
+        esperado = [total_noche_a_noche(habitacion, reglas, inicio, fin) for habitacion in habitaciones]
+        assert calendario.totales_centavos(ids, inicio, fin).tolist() == esperado, (inicio, fin)
+
+def test_bordes_del_horizonte():
+    habitaciones = [(1, "doble", 100.0)]
+    reglas = [{"id": 1, "habitacion_id": None, "tipo": "doble", "fecha_inicio": a_dia(ORIGEN) + DIAS - 1,
+               "fecha_fin": a_dia(ORIGEN) + DIAS + 1, "precio_noche": 150.0, "multiplicador": None, "prioridad": 0}]
+    calendario = CalendarioTarifas(habitaciones, reglas, ORIGEN, DIAS)
+    ultimo = ORIGEN + timedelta(days=DIAS)
+    for inicio, fin in [(ORIGEN, ultimo), (ultimo - timedelta(days=1), ultimo),
+                        (ultimo - timedelta(days=1), ultimo + timedelta(days=1)), (ultimo, ultimo + timedelta(days=2)),
+                        (ORIGEN - timedelta(days=1), ORIGEN + timedelta(days=1))]:
+        assert calendario.totales_centavos([1], inicio, fin)[0] == total_noche_a_noche(habitaciones[0], reglas,
+                                                                                        inicio, fin)
+
+def test_habitacion_desconocida():
+    calendario = CalendarioTarifas([(1, "simple", 80.0)], [], ORIGEN, DIAS)
+    with pytest.raises(KeyError):
+        calendario.totales_centavos([2], ORIGEN, ORIGEN + timedelta(days=1))
+
+def test_eliminar_una_tarifa_invalida_el_calendario(cliente, admin):
+    inicio = date.today() + timedelta(days=10)
+    estancia = {"fecha_inicio": str(inicio), "fecha_fin": str(inicio + timedelta(days=4)), "huespedes": 1}
+
+    def precios():
+        habitaciones = cliente.post("/buscar", json=estancia).json()["habitaciones"]
+        return {habitacion["id"]: habitacion["precio_total"] for habitacion in habitaciones}
+
+    antes = precios()
+    # Temporada que empieza a mitad de la estancia y termina después
+    creada = cliente.post("/admin/tarifas", headers=admin, json={
+        "nombre": "Alta", "tipo": "simple", "fecha_inicio": str(inicio + timedelta(days=2)),
+        "fecha_fin": str(inicio + timedelta(days=30)), "multiplicador": 1.5,
+    })
+    assert creada.status_code == 200, creada.text
+    con_tarifa = precios()
+    tipos = {h["id"]: h["tipo"] for h in cliente.post("/buscar", json=estancia).json()["habitaciones"]}
+    for habitacion_id, total in antes.items():
+        if tipos[habitacion_id] == "simple":
+            assert con_tarifa[habitacion_id] == pytest.approx(total / 4 * 2 + total / 4 * 2 * 1.5)
+        else:
+            assert con_tarifa[habitacion_id] == total
+
+    tarifa_id = cliente.get("/admin/tarifas", headers=admin).json()["tarifas"][0]["id"]
+    assert cliente.delete(f"/admin/tarifas/{tarifa_id}", headers=admin).status_code == 200
+    assert precios() == antes
@@ -0,0 +1,84 @@
+"""
+Tokens firmados: verificación sin estado y revocación (logout, usuario desactivado)
+"""
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+import hotel_booking_system
+from tokens_firmados import FirmadorTokens, RegistroRevocaciones, claves_revocacion
+
+CREDENCIALES = {"email": "huesped@hotel.com", "password": "secreto1"}
+
+@pytest.fixture
+def firmado(monkeypatch, cliente):
+    monkeypatch.setattr(hotel_booking_system, "MODO_TOKEN", "firmado")
+    # Sin espera entre refrescos: cada verificación ve las revocaciones de otros workers
+    monkeypatch.setattr(hotel_booking_system, "REFRESCO_REVOCACIONES_SEGUNDOS", 0)
+    monkeypatch.setattr(hotel_booking_system, "_revocaciones", None)
+    assert cliente.post("/register", json={**CREDENCIALES, "nombre": "Ana", "apellido": "Prueba",
+                                           "telefono": "600000000"}).status_code == 200
+    return cliente
+
+def iniciar_sesion(cliente):
+    respuesta = cliente.post("/login", json=CREDENCIALES)
+    assert respuesta.status_code == 200, respuesta.text
+    token = respuesta.json()["token"]
+    assert FirmadorTokens.es_firmado(token)
+    return {"Authorization": f"Bearer {token}"}
+
+def test_firma_y_vencimiento():
+    firmador = FirmadorTokens(b"secreto")
+    token = firmador.emitir(7, "a@hotel.com", "Ana", expira=1_000)
+    assert firmador.verificar(token, 999)["u"] == 7
+    assert firmador.verificar(token, 1_000) is None
+    assert FirmadorTokens(b"otro").verificar(token, 999) is None
+    carga, _, firma = token.partition(".")
+    assert firmador.verificar(carga[:-2] + "xx." + firma, 999) is None
+
+def test_registro_confirma_en_la_tabla():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE revocaciones (clave TEXT PRIMARY KEY, expira INTEGER NOT NULL)")
+    consultar = lambda funcion: funcion(conn.cursor())
+    registro = RegistroRevocaciones(intervalo_refresco=3600)
+    datos = {"u": 1, "j": "abc"}
+    assert not registro.revocado(claves_revocacion(datos), 100, consultar)
+
+    # Revocado en otro worker: no se ve hasta el siguiente refresco
+    conn.execute("INSERT INTO revocaciones VALUES ('usuario:1', 200)")
+    assert not registro.revocado(claves_revocacion(datos), 100, consultar)
+    registro.ultimo_refresco = float("-inf")
+    assert registro.revocado(claves_revocacion(datos), 100, consultar)
+    # Vencida la revocación el filtro aún la contiene, pero la tabla la descarta
+    assert not registro.revocado(claves_revocacion(datos), 200, consultar)
+
+def test_logout_revoca_solo_ese_token(firmado):
+    primero, segundo = iniciar_sesion(firmado), iniciar_sesion(firmado)
+    assert firmado.get("/mis-reservas", headers=primero).status_code == 200
+    assert firmado.post("/logout", headers=primero).status_code == 200
+    assert firmado.get("/mis-reservas", headers=primero).status_code == 401
+    assert firmado.get("/mis-reservas", headers=segundo).status_code == 200
+
+def test_logout_visto_por_otro_worker(firmado, base_datos):
+    cabeceras = iniciar_sesion(firmado)
+    assert firmado.post("/logout", headers=cabeceras).status_code == 200
+    # Otro worker arranca con el filtro vacío y lo llena desde la tabla
+    hotel_booking_system._revocaciones = None
+    assert firmado.get("/mis-reservas", headers=cabeceras).status_code == 401
+
+def test_desactivar_usuario_revoca_sus_tokens(firmado, base_datos):
+    cabeceras = iniciar_sesion(firmado)
+    with closing(sqlite3.connect(base_datos)) as conn, conn:
+        conn.execute("UPDATE usuarios SET activo = 0 WHERE email = ?", (CREDENCIALES["email"],))
+    assert firmado.get("/mis-reservas", headers=cabeceras).status_code == 401
+
+    # Reactivado, el token vuelve a valer (sólo queda el falso positivo del filtro)
+    with closing(sqlite3.connect(base_datos)) as conn, conn:
+        conn.execute("UPDATE usuarios SET activo = 1 WHERE email = ?", (CREDENCIALES["email"],))
+    assert firmado.get("/mis-reservas", headers=cabeceras).status_code == 200
+
+def test_token_de_sesion_sigue_valiendo(cliente, usuario, monkeypatch):
+    # Cambiar de modo no invalida las sesiones abiertas
+    monkeypatch.setattr(hotel_booking_system, "MODO_TOKEN", "firmado")
+    assert cliente.get("/mis-reservas", headers=usuario).status_code == 200
@@ -0,0 +1,195 @@
+"""
+Tokens de sesión firmados y revocación en memoria
+
+En el modo de sesiones cada petición autenticada consulta `sesiones`. Un
+token firmado lleva dentro lo que esa consulta devolvía y se verifica sólo
+con un HMAC:
+
+    base64url(json {u: usuario_id, e: email, n: nombre, x: expira, j: jti}) "." base64url(HMAC-SHA256)
+
+Para revocar (logout, usuario desactivado) la tabla `revocaciones` guarda
+claves `jti:<jti>` y `usuario:<id>` con su vencimiento, y cada worker tiene
+un filtro de Bloom con esas claves:
+
+- Si el filtro dice "no está", el token no está revocado: sin consulta.
+- Si dice "puede estar" (revocado o falso positivo), se confirma en la tabla.
+
+El filtro se pone al día leyendo sólo las filas nuevas (por rowid) como mucho
+una vez por `intervalo_refresco` segundos, así que una revocación hecha en
+otro worker tarda ese intervalo en verse; en el worker que la hace es
+inmediata.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import threading
+import time
+from typing import Callable, Iterable, Optional, Tuple
+
+def _b64(datos: bytes) -> str:
+    return base64.urlsafe_b64encode(datos).rstrip(b"=").decode()
+
+def _desde_b64(texto: str) -> bytes:
+    return base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4))
+
+class FirmadorTokens:
+    """Emite y verifica tokens firmados con HMAC-SHA256"""
+
+    def __init__(self, secreto: bytes):
+        self.secreto = secreto
+
+    def _firma(self, carga: str) -> str:
+        return _b64(hmac.new(self.secreto, carga.encode(), hashlib.sha256).digest())
+
+    def emitir(self, usuario_id: int, email: str, nombre: str, expira: int) -> str:
+        datos = {"u": usuario_id, "e": email, "n": nombre, "x": expira, "j": secrets.token_urlsafe(12)}
+        carga = _b64(json.dumps(datos, separators=(",", ":")).encode())
+        return f"{carga}.{self._firma(carga)}"
+
+    def verificar(self, token: str, ahora: int) -> Optional[dict]:
+        """Datos del token si la firma es válida y no ha vencido; None en otro caso"""
+        carga, _, firma = token.partition(".")
+        if not firma or not hmac.compare_digest(firma.encode(), self._firma(carga).encode()):
+            return None
+        try:
+            datos = json.loads(_desde_b64(carga))
+        except ValueError:
+            return None
+        if datos.get("x", 0) <= ahora:
+            return None
+        return datos
+
+    @staticmethod
+    def es_firmado(token: str) -> bool:
+        # Los tokens opacos de sesión (token_urlsafe) nunca contienen "."
+        return "." in token
+
+class FiltroBloom:
+    """
+    Conjunto aproximado sin falsos negativos
+
+    `bits` y `funciones` fijan la tasa de falsos positivos: con 2^20 bits y 7
+    funciones es ~1% a las 100.000 claves. Las k posiciones salen de un solo
+    BLAKE2b con doble hashing (h1 + i·h2).
+    """
+
+    def __init__(self, bits: int = 1 << 20, funciones: int = 7):
+        self.bits = bits
+        self.funciones = funciones
+        # bytearray y enteros de Python: con k = 7 posiciones por consulta
+        # numpy cuesta más en crear arreglos de lo que ahorra
+        self.arreglo = bytearray(bits // 8)
+        self.claves = 0
+
+    def _posiciones(self, clave: str):
+        resumen = hashlib.blake2b(clave.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(resumen[:8], "little")
+        h2 = int.from_bytes(resumen[8:], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.funciones)]
+
+    def agregar(self, clave: str):
+        for posicion in self._posiciones(clave):
+            self.arreglo[posicion >> 3] |= 1 << (posicion & 7)
+        self.claves += 1
+
+    def contiene(self, clave: str) -> bool:
+        arreglo = self.arreglo
+        return all(arreglo[posicion >> 3] & (1 << (posicion & 7)) for posicion in self._posiciones(clave))
+
+class RegistroRevocaciones:
+    """
+    Filtro de Bloom de un worker sincronizado con la tabla `revocaciones`
+
+    Los métodos que necesitan la base de datos reciben `consultar`, una
+    función que ejecuta otra función con un cursor de lectura; así la
+    conexión sólo se pide cuando hace falta.
+    """
+
+    def __init__(self, intervalo_refresco: float = 1.0, bits: int = 1 << 20, funciones: int = 7):
+        self.intervalo_refresco = intervalo_refresco
+        self.bits = bits
+        self.funciones = funciones
+        self.lock = threading.Lock()
+        self._reiniciar()
+
+    def _reiniciar(self):
+        self.filtro = FiltroBloom(self.bits, self.funciones)
+        self.ultimo_rowid = 0
+        self.ultimo_refresco = float("-inf")
+
+    def reiniciar(self):
+        with self.lock:
+            self._reiniciar()
+
+    def refrescar(self, cursor):
+        """Añadir al filtro las revocaciones nuevas de la tabla"""
+        cursor.execute("SELECT rowid, clave FROM revocaciones WHERE rowid > ? ORDER BY rowid",
+                       (self.ultimo_rowid,))
+        filas = cursor.fetchall()
+        with self.lock:
+            for rowid, clave in filas:
+                self.filtro.agregar(clave)
+                self.ultimo_rowid = max(self.ultimo_rowid, rowid)
+            # Demasiadas claves para el tamaño del filtro: se rehace sólo con las vigentes
+            if self.filtro.claves > self.bits // (self.funciones * 2):
+                self.filtro = FiltroBloom(self.bits, self.funciones)
+                cursor.execute("SELECT clave FROM revocaciones WHERE expira > ?", (int(time.time()),))
+                for (clave,) in cursor.fetchall():
+                    self.filtro.agregar(clave)
+            self.ultimo_refresco = time.monotonic()
+
+    def exportar(self) -> Tuple[dict, bytes]:
+        """Estado del filtro (parámetros, claves y último rowid leído) y sus bits"""
+        with self.lock:
+            datos = {"bits": self.bits, "funciones": self.funciones, "claves": self.filtro.claves,
+                     "ultimo_rowid": self.ultimo_rowid}
+            return datos, bytes(self.filtro.arreglo)
+
+    def restaurar(self, datos: dict, arreglo) -> bool:
+        """
+        Retomar el filtro guardado por `exportar`
+
+        `arreglo` puede ser cualquier buffer escribible (por ejemplo, un mapa
+        en memoria con copia al escribir). El siguiente `refrescar` lee sólo
+        las revocaciones posteriores a su último rowid.
+
+        Returns:
+            False (y nada cambia) si el filtro se creó con otros parámetros
+        """
+        if (datos["bits"], datos["funciones"]) != (self.bits, self.funciones):
+            return False
+        filtro = FiltroBloom(self.bits, self.funciones)
+        filtro.arreglo = arreglo
+        filtro.claves = datos["claves"]
+        with self.lock:
+            self.filtro = filtro
+            self.ultimo_rowid = datos["ultimo_rowid"]
+            self.ultimo_refresco = float("-inf")
+        return True
+
+    def agregar_local(self, clave: str):
+        """Reflejar en el filtro una revocación hecha por este worker"""
+        with self.lock:
+            self.filtro.agregar(clave)
+
+    def revocado(self, claves: Iterable[str], ahora: int, consultar: Callable) -> bool:
+        if time.monotonic() - self.ultimo_refresco >= self.intervalo_refresco:
+            consultar(self.refrescar)
+        if not self.filtro.claves:
+            return False
+        candidatas = [clave for clave in claves if self.filtro.contiene(clave)]
+        if not candidatas:
+            return False
+        return consultar(lambda cursor: _confirmar(cursor, candidatas, ahora))
+
+def _confirmar(cursor, claves, ahora: int) -> bool:
+    cursor.execute(f"""
+        SELECT 1 FROM revocaciones WHERE clave IN ({",".join("?" * len(claves))}) AND expira > ? LIMIT 1
+    """, (*claves, ahora))
+    return cursor.fetchone() is not None
+
+def claves_revocacion(datos: dict) -> tuple:
+    """Claves de `revocaciones` que invalidan un token: la suya y la de su usuario"""
+    return f"jti:{datos['j']}", f"usuario:{datos['u']}"